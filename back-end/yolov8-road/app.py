@@ -1,125 +1,493 @@
-import os
-import cv2
-import numpy as np
-from flask import Flask, request, jsonify, send_file
-from ultralytics import YOLO
+import base64
+import collections
 import io
-from PIL import Image
+import os
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Request, request, jsonify, Response
+import json
 from flask_cors import CORS
-import pillow_heif
+
+import inference
+from backends import BACKENDS
+from defect_store import DefectStore, create_blueprint
+from jobs import JobQueue, QueueFull
+from ingest import IMAGE_EXTS, decode_image
+from profiling import PROFILE_HEADER
+import metrics
+from metrics import ERRORS, STAGE_SECONDS
+from policy import DEFAULT_BUDGET_MS, PRESETS, batch_key, model_kwargs
+from render import render
+# 模型、检测选项和单张检测都在 inference.py（serve.py 的工作进程只导入那里）
+from inference import (
+    BATCH_MAX_SIZE, MODELS, collect_detections, decode_target, detect_bytes, detect_options, encode_image,
+    error_body, infer_batch, output_mimetype, ready, record_defects, registry, resolve_options, result_cache,
+    run_model, startup_info,
+)
+
+class UploadRequest(Request):
+    """
+    上传文件直接写入内存 BytesIO（默认超过 500KB 会写入临时文件再读回），
+    之后 getvalue() 返回的 bytes 与 BytesIO 共用同一块内存，解码时 BytesIO(bytes) 也不复制
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
+
+
+def upload_bytes(file):
+    """上传文件的内容（不额外复制）"""
+    if isinstance(file.stream, io.BytesIO):
+        return file.stream.getvalue()
+    return file.read()
+
 
 app = Flask(__name__)
+app.request_class = UploadRequest
+# 上传保存在内存中，限制单个请求的大小
+app.config['MAX_CONTENT_LENGTH'] = int(float(os.environ.get('MAX_UPLOAD_MB', '100')) * 1024 * 1024)
 CORS(app)
 
-pillow_heif.register_heif_opener()
-
-# ---------- 加载你的 YOLO 模型 ----------
-model = YOLO("./runs/detect/yolov8n_v8_200e/weights/best.pt")
-classNames = ['cracks', 'pothole']
-
-# ---------- 复用你原有的绘图函数 ----------
-font = cv2.FONT_HERSHEY_DUPLEX
-
-def add_text_with_background(image, text, position, font_face, font_scale,
-                             text_color, bg_color, thickness=1, padding=5):
-    (text_width, text_height), baseline = cv2.getTextSize(
-        text, font_face, font_scale, thickness)
-    box_width = text_width + 2 * padding
-    box_height = text_height + 2 * padding + baseline
-    x, y = position
-    x = max(0, min(x, image.shape[1] - box_width))
-    y = max(box_height, min(y, image.shape[0]))
-    cv2.rectangle(image, (x, y - box_height), (x + box_width, y), bg_color, -1)
-    text_position = (x + padding, y - padding - baseline)
-    cv2.putText(image, text, text_position, font_face, font_scale, text_color, thickness)
-
-def predict(img_array):
-    """输入 numpy 数组 (BGR), 返回检测后的图像数组"""
-    img = img_array.copy()
-    img_height, img_width = img.shape[:2]
-    results = model(img, stream=False)
-
-    for r in results:
-        boxes = r.boxes
-        for box in boxes:
-            x1, y1, x2, y2 = box.xyxy[0]
-            x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-            w, h = x2 - x1, y2 - y1
-            conf = round(float(box.conf[0]), 2)
-            cls = int(box.cls[0])
-            name = classNames[cls]
-
-            thick = 1 if w < 210 else 2
-            cv2.rectangle(img, (x1, y1), (x2, y2), (0, 0, 255), 2)
-
-            # 根据图像尺寸动态调整字体大小（可简化）
-            if img_height < 600 or img_width < 600:
-                font_scale = 0.5
-            else:
-                font_scale = 0.7
+# 热切换只接受该目录下的权重文件
+MODEL_ROOT = os.path.abspath(os.environ.get('MODEL_ROOT', './runs'))
+
+
+# ---------- 缺陷位置库（环境变量）----------
+# 带 GPS 的检测结果写入 DEFECT_DB；设置为空字符串时关闭
+DEFECT_DB = os.environ.get('DEFECT_DB', 'defects.db')
+defect_store = DefectStore(DEFECT_DB) if DEFECT_DB else None
+if defect_store is not None:
+    app.register_blueprint(create_blueprint(defect_store))
+defect_recorder = defect_store.add_detections if defect_store is not None else None
+
+
+def wants_json():
+    """通过 ?format=json 或 Accept: application/json 选择 JSON 响应"""
+    fmt = request.args.get('format', '').lower()
+    if fmt:
+        return fmt == 'json'
+    best = request.accept_mimetypes.best_match(['image/png', 'application/json'])
+    return best == 'application/json'
+
+# 流式返回时每次写出的字节数
+STREAM_CHUNK = 256 * 1024
+
+def body_response(status, mimetype, body):
+    """
+    bytes 直接返回；memoryview（编码后的图片）按块流式写出，
+    WSGI 只接受 bytes，每次只复制一块，不为整张图片再复制一份
+    """
+    if not isinstance(body, memoryview):
+        return app.response_class(body, status=status, mimetype=mimetype)
+
+    def chunks():
+        for i in range(0, body.nbytes, STREAM_CHUNK):
+            yield bytes(body[i:i + STREAM_CHUNK])
+
+    resp = app.response_class(chunks(), status=status, mimetype=mimetype)
+    resp.content_length = body.nbytes
+    return resp
+
+# ---------- 多图批量检测（环境变量）----------
+# POST /detect/batch 一次上传多张图片（多个 file 字段，或 zip 压缩包）：解码线程池并行解码，
+# 每 MULTI_BATCH_SIZE 张做一次前向推理，每批完成后立即以 NDJSON 流式返回各图片的结果
+MULTI_BATCH_SIZE = int(os.environ.get('MULTI_BATCH_SIZE', '16'))
+MULTI_MAX_FILES = int(os.environ.get('MULTI_MAX_FILES', '500'))
+MULTI_DECODE_WORKERS = int(os.environ.get('MULTI_DECODE_WORKERS', str(os.cpu_count() or 4)))
+decode_pool = ThreadPoolExecutor(MULTI_DECODE_WORKERS, thread_name_prefix='decode')
+
+
+def upload_sources(files):
+    """
+    上传文件 → [(文件名, read_fn)]；.zip 展开为其中的图片（解码线程按需读取成员，不一次解压全部）
+    zip 无效、成员过大或图片数超过 MULTI_MAX_FILES 时抛出 ValueError
+    """
+    sources = []
+    for f in files:
+        buf = upload_bytes(f)
+        if not f.filename.lower().endswith('.zip'):
+            sources.append((f.filename, lambda buf=buf: buf))
+            continue
+        try:
+            zf = zipfile.ZipFile(io.BytesIO(buf))
+        except zipfile.BadZipFile:
+            raise ValueError(f'Invalid zip file: {f.filename}') from None
+        for info in sorted(zf.infolist(), key=lambda i: i.filename):
+            if info.is_dir() or not info.filename.lower().endswith(IMAGE_EXTS):
+                continue
+            if info.file_size > app.config['MAX_CONTENT_LENGTH']:
+                raise ValueError(f'Image too large in zip: {info.filename}')
+            sources.append((info.filename, lambda zf=zf, info=info: zf.read(info)))
+    if len(sources) > MULTI_MAX_FILES:
+        raise ValueError(f'Too many images ({len(sources)}), max {MULTI_MAX_FILES}')
+    return sources
+
+def prepare_item(entry, index, name, read_fn, options, images):
+    """解码线程：读取字节、确定推理参数（imgsz=auto）并解码，返回 (index, name, 字节, 选项, DecodedImage, 错误)"""
+    try:
+        buf = read_fn()
+    except Exception as e:
+        return index, name, None, None, None, f'Cannot read file: {e}'
+    options = resolve_options(buf, options, entry)
+    decoded = decode_image(buf, decode_target(not images, options))
+    if decoded is None:
+        return index, name, None, None, None, 'Invalid image file - cannot decode with both PIL and OpenCV'
+    return index, name, buf, options, decoded, None
+
+def batch_record(entry, index, name, buf, options, decoded, r, kwargs, images):
+    """一张图片的 NDJSON 记录；images=True 时附带 base64 编码的标注图片"""
+    dets, detections = collect_detections(entry, decoded, r, kwargs, options['tiled'])
+    width, height = decoded.original_size
+    record = {
+        'index': index, 'file': name, 'code': 200, 'width': width, 'height': height,
+        'gps': record_defects(buf, detections, name, defect_recorder), 'policy': kwargs, 'detections': detections,
+    }
+    if images:
+        with STAGE_SECONDS.time(stage='render'):
+            result_img = render(decoded.image, dets, entry.names)
+        with STAGE_SECONDS.time(stage='encode'):
+            encoded = encode_image(result_img, options)
+        record['mimetype'] = output_mimetype(options)
+        record['image'] = base64.b64encode(encoded).decode('ascii')
+    return record
+
+def failed_record(item, error):
+    """推理或后处理失败的图片的 NDJSON 记录（item 见 prepare_item）"""
+    return {'index': item[0], 'file': item[1], 'code': 500, 'error': f'Detection failed: {error}'}
+
+def detect_many(sources, options, images=False):
+    """
+    生成器：预取解码、按批推理，每张图片产出一行 NDJSON（bytes），顺序为完成顺序（见 index）；
+    最后一行为汇总 {"summary": {...}}，包含图片数、失败数、耗时和吞吐量
+    整个批次使用同一个模型版本（期间的热切换等本批次结束后才释放旧版本）
+    """
+    with registry.acquire(options['model']) as entry:
+        yield from _detect_many(entry, sources, options, images)
+
+def _detect_many(entry, sources, options, images):
+    start = time.perf_counter()
+    todo = iter(enumerate(sources))
+    inflight = collections.deque()
+    done = failed = 0
+
+    def fill():
+        # 最多预取两批，解码与推理重叠
+        while len(inflight) < 2 * MULTI_BATCH_SIZE:
+            item = next(todo, None)
+            if item is None:
+                return
+            index, (name, read_fn) = item
+            inflight.append(decode_pool.submit(prepare_item, entry, index, name, read_fn, options, images))
+
+    fill()
+    while inflight:
+        lines, groups = [], {}
+        while inflight and sum(len(g[1]) for g in groups.values()) + len(lines) < MULTI_BATCH_SIZE:
+            index, name, buf, opts, decoded, err = inflight.popleft().result()
+            if err:
+                lines.append({'index': index, 'file': name, 'code': 400, 'error': err})
+                continue
+            # 推理参数相同的图片合并为一次前向推理（imgsz=auto 时按尺寸分组）
+            kwargs = model_kwargs(opts['policy'], entry.half)
+            groups.setdefault(batch_key(kwargs), (kwargs, []))[1].append((index, name, buf, opts, decoded))
+        fill()
+
+        for kwargs, items in groups.values():
+            try:
+                with STAGE_SECONDS.time(stage='model'):
+                    if options['tiled']:
+                        results = [run_model(entry, item[4].image, True, kwargs) for item in items]
+                    else:
+                        results = infer_batch(entry, [item[4].image for item in items], **kwargs)
+            except Exception as e:
+                print(f"YOLO 批量检测失败: {e}")
+                ERRORS.inc(type='inference')
+                lines.extend(failed_record(item, e) for item in items)
+                continue
+            # 逐张生成记录：一张图片后处理失败只影响它自己，每个 index 只输出一行
+            for item, r in zip(items, results):
+                try:
+                    lines.append(batch_record(entry, *item, r, kwargs, images))
+                except Exception as e:
+                    print(f"YOLO 批量检测失败 ({item[1]}): {e}")
+                    ERRORS.inc(type='inference')
+                    lines.append(failed_record(item, e))
+
+        for line in lines:
+            done += 1
+            failed += line['code'] != 200
+            yield json.dumps(line).encode() + b'\n'
+
+    elapsed = time.perf_counter() - start
+    yield json.dumps({'summary': {
+        'images': done, 'failed': failed, 'seconds': round(elapsed, 3),
+        'images_per_s': round(done / elapsed, 2) if elapsed > 0 else None,
+    }}).encode() + b'\n'
 
-            add_text_with_background(
-                img, f"{name} {conf}", (x1, y1),
-                font, font_scale, (255, 255, 255), (0, 0, 255),
-                thick, 5
-            )
-    return img
+# ---------- 异步任务队列（环境变量）----------
+# JOB_WORKERS 个后台线程处理任务（推理仍经过动态批处理）；
+# 排队图片超过 JOB_QUEUE_SIZE 或单个客户端超过 JOB_MAX_PER_CLIENT 时返回 429
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', '64'))
+JOB_MAX_PER_CLIENT = int(os.environ.get('JOB_MAX_PER_CLIENT', '16'))
+JOB_TTL = float(os.environ.get('JOB_TTL', '600'))
+# 已完成任务的结果（标注图片）最多占用的内存，超过时提前清理最早完成的任务
+JOB_RESULT_MB = float(os.environ.get('JOB_RESULT_MB', '256'))
+
+
+def process_job_item(filename, img_bytes, options):
+    # 启动期间提交的任务先排队，等模型就绪后再处理
+    while not ready.wait(1.0):
+        if startup_info['state'] == 'failed':
+            return 503, 'application/json', error_body(f"Model failed to load: {startup_info['error']}")
+    return detect_bytes(img_bytes, filename, options['json'], options, defect_recorder)
+
+
+job_queue = JobQueue(process_job_item, JOB_WORKERS, JOB_QUEUE_SIZE, JOB_MAX_PER_CLIENT, JOB_TTL,
+                     int(JOB_RESULT_MB * 1024 * 1024))
+
+# 模型在后台线程中加载并预热，HTTP 服务立即可用，/ready 报告是否就绪
+startup_thread = inference.start()
+
+# ---------- 指标（Prometheus 格式，GET /metrics）----------
+metrics.BATCH_MAX.set(max(1, BATCH_MAX_SIZE))
+metrics.QUEUE_DEPTH.set_function(lambda: job_queue.metrics()['queued_images'], queue='jobs')
+metrics.QUEUE_DEPTH.set_function(lambda: job_queue.metrics()['running_images'], queue='jobs_running')
+if BATCH_MAX_SIZE > 1:
+    metrics.QUEUE_DEPTH.set_function(
+        lambda: sum(e.batcher.qsize() for e in registry.entries() if e.batcher is not None), queue='batcher')
+metrics.instrument(app)
 
 # ---------- Test --------
 @app.route('/ping')
 def ping():
     return 'pong'
 
+@app.route('/ready')
+def ready_check():
+    """就绪检查：模型加载并预热完成前返回 503（/ping 只表示进程存活）"""
+    return jsonify({'ready': ready.is_set(), **startup_info}), 200 if ready.is_set() else 503
+
+@app.route('/policy')
+def policy_info():
+    """推理策略预设、auto 模式的默认延迟预算和该模型（?model=，默认第一个）各输入尺寸的实测耗时（毫秒）"""
+    name = request.args.get('model') or MODELS[0][0]
+    entry = registry.get(name) if name in registry else None
+    return jsonify({
+        'presets': PRESETS,
+        'default_budget_ms': DEFAULT_BUDGET_MS,
+        'model': name,
+        'half_supported': entry.half if entry is not None else False,
+        'latency_ms': entry.latency.snapshot() if entry is not None else {},
+    })
+
+@app.route('/cache/stats')
+def cache_stats():
+    if result_cache is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **result_cache.stats()})
+
 # ---------- 定义 API 路由 ----------
+def not_ready_response():
+    ERRORS.inc(type='not_ready')
+    resp = jsonify({'error': 'Model is loading, try again later', **startup_info})
+    resp.status_code = 503
+    resp.headers['Retry-After'] = '1'
+    return resp
+
 @app.route('/detect', methods=['POST'])
 def detect():
     print("收到检测请求")
+    if not ready.is_set():
+        return not_ready_response()
     if 'file' not in request.files:
+        ERRORS.inc(type='no_file')
         return jsonify({'error': 'No file uploaded'}), 400
 
     file = request.files['file']
     if file.filename == '':
+        ERRORS.inc(type='empty_filename')
         return jsonify({'error': 'Empty filename'}), 400
 
+    try:
+        options = detect_options(request.args)
+    except ValueError as e:
+        ERRORS.inc(type='bad_policy')
+        return jsonify({'error': str(e)}), 400
+
     # 读取原始字节
-    img_bytes = file.read()
+    with STAGE_SECONDS.time(stage='read'):
+        img_bytes = upload_bytes(file)
     if len(img_bytes) == 0:
+        ERRORS.inc(type='empty_file')
         return jsonify({'error': 'Empty file content'}), 400
 
-    # ---------- 图像解码（万能方案）----------
+    # 按 PROFILE_SAMPLE 抽样或 X-Profile 请求头剖析本次检测（见 inference.detect_bytes）
+    profiled = {'header': request.headers.get(PROFILE_HEADER)}
+    status, mimetype, body = detect_bytes(img_bytes, file.filename, wants_json(), options, defect_recorder, profiled)
+
+    # ---------- 返回处理后的结果 ----------
+    resp = body_response(status, mimetype, body)
+    if 'path' in profiled:
+        resp.headers['X-Profile-Path'] = os.path.basename(profiled['path'])
+    return resp
+
+@app.route('/detect/batch', methods=['POST'])
+def detect_batch():
+    """
+    多图检测：字段 file 可重复，也可以是 zip 压缩包；查询参数同 /detect，另有 images=1 附带标注图片
+    返回 application/x-ndjson，每张图片一行，每批推理完成后立即发送，最后一行为汇总
+    """
+    if not ready.is_set():
+        return not_ready_response()
+    files = [f for f in request.files.getlist('file') if f.filename]
+    if not files:
+        ERRORS.inc(type='no_file')
+        return jsonify({'error': 'No file uploaded'}), 400
     try:
-        # 1. 用 PIL 打开（自动识别格式）
-        pil_image = Image.open(io.BytesIO(img_bytes))
+        options = detect_options(request.args)
+        sources = upload_sources(files)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not sources:
+        return jsonify({'error': 'No images found'}), 400
 
-        # 2. 统一转换为 RGB 模式（避免后续 OpenCV 处理异常）
-        if pil_image.mode != 'RGB':
-            pil_image = pil_image.convert('RGB')
+    images = request.args.get('images', '0').lower() in ('1', 'true', 'yes')
+    resp = Response(detect_many(sources, options, images), mimetype='application/x-ndjson')
+    resp.headers['X-Image-Count'] = str(len(sources))
+    return resp
 
-        # 3. PIL Image → numpy array (RGB)
-        img = np.array(pil_image)
+# ---------- 模型注册表 API ----------
+# GET  /models         已加载的模型（版本、类别、内存增量、加载/预热耗时、延迟统计）和最近一次切换的状态
+# POST /models/<name>  {"weights": "...", "backend": "onnx"}：后台加载并预热后热切换（名称不存在时新增），返回 202
+@app.route('/models')
+def list_models():
+    return jsonify(registry.info())
 
-    except Exception as e:
-        print(f"PIL 解码失败: {e}")
-        # 回退方案：直接使用 OpenCV 的 imdecode
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        if img is None:
-            # 此时图片彻底无法解析
-            return jsonify({'error': 'Invalid image file - cannot decode with both PIL and OpenCV'}), 400
-    # ---------- 执行 YOLO 检测 ----------
+@app.route('/models/<name>', methods=['POST'])
+def swap_model(name):
+    if not ready.is_set():
+        return not_ready_response()
+    body = request.get_json(silent=True) or {}
+    weights = body.get('weights') or request.args.get('weights')
+    backend = body.get('backend') or request.args.get('backend') or None
+    if not weights:
+        return jsonify({'error': 'Missing weights'}), 400
+    path = os.path.abspath(weights)
+    if os.path.commonpath([path, MODEL_ROOT]) != MODEL_ROOT or not os.path.isfile(path):
+        return jsonify({'error': f'Weights must be an existing file under {MODEL_ROOT}'}), 400
+    if backend is not None and backend not in BACKENDS:
+        return jsonify({'error': f"Unknown backend: {backend}"}), 400
     try:
-        result_img = predict(img)
-    except Exception as e:
-        print(f"YOLO 检测失败: {e}")
-        return jsonify({'error': f'Detection failed: {str(e)}'}), 500
+        status = registry.swap(name, weights, backend)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    resp = jsonify({'model': name, **status})
+    resp.status_code = 202
+    resp.headers['Location'] = '/models'
+    return resp
+
+# ---------- 异步任务 API ----------
+# POST /jobs                   上传一张或多张图片（字段名 file，可重复），立即返回 202 和任务 id
+# GET  /jobs/<id>              任务状态和进度
+# GET  /jobs/<id>/events       状态推送（Server-Sent Events），任务完成后结束
+# GET  /jobs/<id>/results/<i>  第 i 张图片的结果（PNG 或 JSON）
+# GET  /jobs/<id>/results      JSON 模式下所有图片的结果
+# GET  /jobs/metrics           队列深度、等待时间等指标
+def job_status(job):
+    info = job.to_dict()
+    if job.status == 'queued':
+        info['queue_position'] = job_queue.position(job)
+    for i, item in enumerate(info['items']):
+        if item['status'] != 'pending':
+            item['url'] = f'/jobs/{job.id}/results/{i}'
+    return info
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    files = [f for f in request.files.getlist('file') if f.filename]
+    if not files:
+        return jsonify({'error': 'No file uploaded'}), 400
+    items = [(f.filename, upload_bytes(f)) for f in files]
+    if any(len(buf) == 0 for _, buf in items):
+        return jsonify({'error': 'Empty file content'}), 400
+
+    try:
+        options = {'json': wants_json(), **detect_options(request.args)}
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    client = request.headers.get('X-Client-Id') or request.remote_addr
+    try:
+        job = job_queue.submit(client, items, options)
+    except QueueFull:
+        ERRORS.inc(type='queue_full')
+        resp = jsonify({'error': 'Too many queued images, try again later', **job_queue.metrics()})
+        resp.status_code = 429
+        resp.headers['Retry-After'] = '2'
+        return resp
+
+    resp = jsonify(job_status(job))
+    resp.status_code = 202
+    resp.headers['Location'] = f'/jobs/{job.id}'
+    return resp
+
+@app.route('/jobs/metrics')
+def job_metrics():
+    return jsonify(job_queue.metrics())
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job_status(job))
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+
+    def stream():
+        version = -1
+        while True:
+            if job.version != version:
+                version = job.version
+                yield f"data: {json.dumps(job_status(job))}\n\n"
+                if job.status == 'done':
+                    return
+            else:
+                # 心跳，防止代理断开空闲连接
+                yield ": keep-alive\n\n"
+            job_queue.wait_update(job, version)
+
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/jobs/<job_id>/results/<int:index>')
+def job_result(job_id, index):
+    job = job_queue.get(job_id)
+    if job is None or not 0 <= index < len(job.results):
+        return jsonify({'error': 'Unknown job'}), 404
+    result = job.results[index]
+    if result is None:
+        return jsonify({'error': 'Not finished', 'status': job.status}), 409
+    status, mimetype, body = result
+    return body_response(status, mimetype, body)
 
-    # ---------- 返回处理后的图片 ----------
-    _, encoded_img = cv2.imencode('.png', result_img)
-    return send_file(
-        io.BytesIO(encoded_img.tobytes()),
-        mimetype='image/png',
-        as_attachment=False
-    )
+@app.route('/jobs/<job_id>/results')
+def job_results(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job.status != 'done':
+        return jsonify({'error': 'Not finished', 'status': job.status}), 409
+    if not job.options['json']:
+        return jsonify({'error': 'PNG job, fetch /jobs/<id>/results/<index>'}), 400
+    # 各图片结果已是 JSON 字节，直接拼接，不重新解析
+    parts = [b'{"file": %s, "code": %d, "result": %s}' % (json.dumps(name).encode(), status, body)
+             for name, (status, _, body) in zip(job.files, job.results)]
+    return app.response_class(b'{"results": [' + b', '.join(parts) + b']}', mimetype='application/json')
 
 if __name__ == '__main__':
-    app.run(host='127.0.0.1', port=5001, debug=True)
\ No newline at end of file
+    app.run(host='127.0.0.1', port=5001, debug=True, threaded=True)
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""
+推理后端选择：PyTorch / ONNX Runtime / OpenVINO（FP32 与 INT8）
+
+导出的模型文件缓存在 best.pt 同一目录下，首次使用时自动导出一次，
+best.pt 重新训练（修改时间更新）后自动重新导出。
+通过环境变量 YOLO_BACKEND 选择后端，例如：
+  YOLO_BACKEND=openvino-int8 python app.py
+
+手动导出: python backends.py --backend onnx-int8
+"""
+import argparse
+import os
+
+DEFAULT_WEIGHTS = "./runs/detect/yolov8n_v8_200e/weights/best.pt"
+DEFAULT_DATA = "./data/data.yaml"
+IMGSZ = 416
+
+BACKENDS = ('pytorch', 'onnx', 'onnx-int8', 'openvino', 'openvino-int8')
+
+
+def artifact_path(weights, backend):
+    """导出文件在磁盘上的位置（与 best.pt 同目录）"""
+    stem, _ = os.path.splitext(weights)
+    if backend == 'pytorch':
+        return weights
+    if backend == 'onnx':
+        return f"{stem}.onnx"
+    if backend == 'onnx-int8':
+        return f"{stem}_int8.onnx"
+    if backend == 'openvino':
+        return f"{stem}_openvino_model"
+    if backend == 'openvino-int8':
+        return f"{stem}_int8_openvino_model"
+    raise ValueError(f"未知后端: {backend}，可选: {', '.join(BACKENDS)}")
+
+
+def is_stale(weights, target):
+    """导出文件不存在或比权重旧（重新训练过）时返回 True"""
+    if not os.path.exists(target):
+        return True
+    try:
+        return os.path.getmtime(weights) > os.path.getmtime(target)
+    except OSError:
+        # 只有导出文件、没有权重时照常使用导出文件
+        return False
+
+
+def export(weights=DEFAULT_WEIGHTS, backend='onnx', imgsz=IMGSZ, data=DEFAULT_DATA, force=False):
+    """导出并缓存指定后端的模型，返回导出文件路径；权重比缓存的导出文件新时重新导出"""
+    target = artifact_path(weights, backend)
+    if backend == 'pytorch' or not (force or is_stale(weights, target)):
+        return target
+    if os.path.exists(target):
+        print(f"{weights} 比 {target} 新，重新导出 {backend} 模型")
+
+    if backend == 'onnx-int8':
+        # ONNX Runtime 动态量化：权重 INT8，无需校准数据（FP32 ONNX 同样按修改时间检查）
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        fp32 = export(weights, 'onnx', imgsz, data, force)
+        quantize_dynamic(fp32, target, weight_type=QuantType.QUInt8)
+    else:
+        from ultralytics import YOLO
+
+        model = YOLO(weights)
+        if backend == 'onnx':
+            # dynamic=True 以支持动态批处理
+            model.export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+        elif backend == 'openvino':
+            model.export(format='openvino', imgsz=imgsz, dynamic=True)
+        elif backend == 'openvino-int8':
+            # NNCF 训练后量化，用数据集做校准
+            model.export(format='openvino', imgsz=imgsz, dynamic=True, int8=True, data=os.path.abspath(data))
+
+    if not os.path.exists(target):
+        raise RuntimeError(f"导出失败，未找到 {target}")
+    # OpenVINO 导出的是目录，覆盖其中的文件不会更新目录的修改时间
+    os.utime(target)
+    print(f"已导出 {backend} 模型: {target}")
+    return target
+
+
+def model_version(weights=DEFAULT_WEIGHTS, backend=None):
+    """模型版本标识（权重路径 + 后端 + 文件修改时间/大小），用于结果缓存等"""
+    backend = backend or os.environ.get('YOLO_BACKEND', 'pytorch')
+    try:
+        st = os.stat(weights)
+        stamp = f"{int(st.st_mtime)}-{st.st_size}"
+    except OSError:
+        stamp = 'missing'
+    return f"{os.path.abspath(weights)}:{backend}:{stamp}"
+
+
+def class_names(model):
+    """
+    模型的类别名称列表（按类别编号）：ultralytics 检查点保存了训练时 data.yaml 的 names，
+    导出的 ONNX / OpenVINO 模型保存在元数据中
+    """
+    names = model.names
+    if isinstance(names, dict):
+        return [str(names[i]) for i in sorted(names)]
+    return [str(n) for n in names]
+
+
+def supports_half(backend=None):
+    """半精度推理是否可用：只有 PyTorch 后端在 CUDA 上支持（导出的后端精度在导出时已固定）"""
+    backend = backend or os.environ.get('YOLO_BACKEND', 'pytorch')
+    if backend != 'pytorch':
+        return False
+    import torch
+
+    return torch.cuda.is_available()
+
+
+def load_model(weights=DEFAULT_WEIGHTS, backend=None):
+    """按后端加载模型；backend 为空时读取环境变量 YOLO_BACKEND（默认 pytorch）"""
+    backend = backend or os.environ.get('YOLO_BACKEND', 'pytorch')
+    if backend not in BACKENDS:
+        raise ValueError(f"未知后端: {backend}，可选: {', '.join(BACKENDS)}")
+    path = export(weights, backend)
+    print(f"推理后端: {backend} ({path})")
+    # 导入 ultralytics（连带 torch）需要数秒，推迟到真正加载模型时
+    from ultralytics import YOLO
+
+    return YOLO(path, task='detect')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="导出推理后端模型")
+    parser.add_argument('--weights', default=DEFAULT_WEIGHTS)
+    parser.add_argument('--backend', choices=BACKENDS, default='onnx')
+    parser.add_argument('--imgsz', type=int, default=IMGSZ)
+    parser.add_argument('--data', default=DEFAULT_DATA)
+    parser.add_argument('--force', action='store_true', help='忽略缓存重新导出')
+    args = parser.parse_args()
+    export(args.weights, args.backend, args.imgsz, args.data, args.force)
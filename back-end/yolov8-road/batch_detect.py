@@ -0,0 +1,295 @@
+"""
+批量检测：处理整个目录或 zip 压缩包
+
+- 解码线程池预取图片（内存中最多保留 --prefetch 张）
+- 批量推理
+- 标注图片由写入线程池并行保存
+- 每张图片一行写入 detections.jsonl（可选 detections.csv），包含 GPS 坐标
+- 中断后再次运行会跳过 detections.jsonl 中已处理的图片（续写前截掉写了一半的最后一行，
+  并删除 CSV 中没有对应 jsonl 记录的行，这些图片会重新处理）；解码失败的图片下次重试
+- 每个批次先把 CSV 落盘（fsync），再写入并落盘该批次的 jsonl 记录：jsonl 记为已完成的图片，
+  其 CSV 行一定已在磁盘上
+- 标注图片保存为 images/<相对路径>.jpg（保留原扩展名，a.png 与 a.jpg 不会互相覆盖）；
+  等待写入的图片超过写入线程数的 2 倍时暂停推理，避免全分辨率图片堆积在内存中
+- --db 时把带 GPS 的检测结果写入缺陷位置库（见 defect_store.py）
+- 推理策略参数（--policy / --imgsz / --conf 等）与 API 相同，见 policy.py；
+  --imgsz auto 时每张图片按原图尺寸选择输入尺寸，批次内按尺寸分组推理
+
+用法:
+  python batch_detect.py ./survey_photos --out ./survey_results --save-images
+  python batch_detect.py ./road_defect_detection_UNI.v14-yolo.yolov8.zip --out ./results --csv
+  python batch_detect.py ./survey_photos --db ./defects.db
+  python batch_detect.py ./survey_photos --imgsz auto --budget-ms 300 --classes pothole
+"""
+import argparse
+import csv
+import json
+import os
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from backends import DEFAULT_WEIGHTS, load_model, supports_half
+from defect_store import DefectStore
+from ingest import IMAGE_EXTS, MODEL_IMGSZ, decode_image, scale_to_original
+from location import get_gps_from_bytes
+from policy import MAX_IMGSZ, LatencyTracker, add_policy_arguments, batch_key, model_kwargs, parse_policy, resolve
+from render import render, result_to_numpy
+
+
+def list_sources(path):
+    """返回 [(key, read_fn)]，key 为目录内相对路径或 zip 内成员名"""
+    if zipfile.is_zipfile(path):
+        zf = zipfile.ZipFile(path)
+        names = sorted(n for n in zf.namelist() if n.lower().endswith(IMAGE_EXTS))
+        return [(n, (lambda n=n: zf.read(n))) for n in names]
+
+    sources = []
+    for root, _, files in os.walk(path):
+        for name in files:
+            if name.lower().endswith(IMAGE_EXTS):
+                full = os.path.join(root, name)
+                sources.append((os.path.relpath(full, path), full))
+    sources.sort()
+
+    def reader(full):
+        with open(full, 'rb') as f:
+            return f.read()
+
+    return [(key, (lambda full=full: reader(full))) for key, full in sources]
+
+
+def truncate_partial(path, chunk=65536):
+    """中断时最后一行可能只写了一半：把文件截断到最后一个换行符之后，续写的记录从新行开始"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        pos = f.seek(0, os.SEEK_END)
+        while pos > 0:
+            step = min(chunk, pos)
+            f.seek(pos - step)
+            i = f.read(step).rfind(b'\n')
+            if i >= 0:
+                f.truncate(pos - step + i + 1)
+                return
+            pos -= step
+        f.truncate(0)
+
+
+def prune_csv(csv_path, done):
+    """
+    删除 CSV 中不属于已完成图片的行（CSV 先于 jsonl 落盘的部分），避免重新处理时重复
+    只保留表头和 file 在 done 中的行；返回删除的行数
+    """
+    if not os.path.exists(csv_path):
+        return 0
+    with open(csv_path, newline='') as f:
+        rows = list(csv.reader(f))
+    keep = rows[:1] + [row for row in rows[1:] if row and row[0] in done]
+    if len(keep) == len(rows):
+        return 0
+    tmp = csv_path + '.tmp'
+    with open(tmp, 'w', newline='') as f:
+        csv.writer(f).writerows(keep)
+    os.replace(tmp, csv_path)
+    return len(rows) - len(keep)
+
+
+def load_done(jsonl_path):
+    """
+    读取已处理的图片（中断时最后一行可能不完整，直接忽略；续写前由 truncate_partial 截掉）
+    带 error 的记录（读取或解码失败）不算完成，再次运行时重试
+    """
+    done = set()
+    if not os.path.exists(jsonl_path):
+        return done
+    with open(jsonl_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                if 'error' not in record:
+                    done.add(record['file'])
+            except (ValueError, KeyError, TypeError):
+                continue
+    return done
+
+
+def prepare(key, read_fn, target_size):
+    """解码线程：读取字节、解码、提取 GPS"""
+    try:
+        buf = read_fn()
+    except OSError as e:
+        return key, None, None, str(e)
+    decoded = decode_image(buf, target_size)
+    if decoded is None:
+        return key, None, None, 'cannot decode'
+    gps = get_gps_from_bytes(buf)
+    return key, decoded, gps, None
+
+
+def infer_grouped(model, batch, policy, tracker, half):
+    """按每张图片确定的推理参数分组推理，返回与 batch 一一对应的 Results"""
+    groups = {}
+    for i, (_, decoded, _) in enumerate(batch):
+        kwargs = model_kwargs(resolve(policy, decoded.original_size, tracker), half)
+        groups.setdefault(batch_key(kwargs), (kwargs, []))[1].append(i)
+    results = [None] * len(batch)
+    for kwargs, indexes in groups.values():
+        for i, r in zip(indexes, model([batch[i][1].image for i in indexes], verbose=False, **kwargs)):
+            results[i] = r
+            speed = [r.speed.get(k) for k in ('preprocess', 'inference', 'postprocess')]
+            if None not in speed:
+                tracker.observe(kwargs.get('imgsz', MODEL_IMGSZ), sum(speed))
+    return results
+
+
+def save_image(path, img):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cv2.imwrite(path, img)
+
+
+def sync(f):
+    """把缓冲区写入磁盘（flush + fsync）"""
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量检测目录或 zip 压缩包中的图片")
+    parser.add_argument('source', help='图片目录或 zip 文件')
+    parser.add_argument('--out', default='./batch_results')
+    parser.add_argument('--weights', default=DEFAULT_WEIGHTS)
+    parser.add_argument('--batch', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='解码线程数')
+    parser.add_argument('--prefetch', type=int, default=64, help='预取图片数上限')
+    parser.add_argument('--save-images', action='store_true', help='保存全分辨率标注图片')
+    parser.add_argument('--csv', action='store_true', help='同时输出每个检测框一行的 CSV')
+    parser.add_argument('--db', default=None, help='缺陷位置库路径（SQLite），记录带 GPS 的检测结果')
+    add_policy_arguments(parser)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    jsonl_path = os.path.join(args.out, 'detections.jsonl')
+    csv_path = os.path.join(args.out, 'detections.csv')
+    truncate_partial(jsonl_path)
+    done = load_done(jsonl_path)
+    if args.csv:
+        truncate_partial(csv_path)
+        prune_csv(csv_path, done)
+    sources = [(k, fn) for k, fn in list_sources(args.source) if k not in done]
+    print(f"待处理 {len(sources)} 张（已完成 {len(done)} 张）")
+    if not sources:
+        return
+
+    model = load_model(args.weights)
+    names = model.names
+    try:
+        policy = parse_policy(vars(args), list(names.values()))
+    except ValueError as e:
+        raise SystemExit(str(e))
+    tracker = LatencyTracker()
+    half = bool(policy.get('half')) and supports_half()
+    # 不保存标注图片时按模型输入尺寸缩小解码（auto 时尺寸因图而异，按最大尺寸解码）
+    imgsz = policy.get('imgsz', MODEL_IMGSZ)
+    target_size = None if args.save_images else (MAX_IMGSZ if imgsz == 'auto' else imgsz)
+
+    jsonl = open(jsonl_path, 'a')
+    csv_file = None
+    if args.csv:
+        new_csv = not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0
+        csv_file = open(csv_path, 'a', newline='')
+        csv_writer = csv.writer(csv_file)
+        if new_csv:
+            csv_writer.writerow(['file', 'class', 'confidence', 'x1', 'y1', 'x2', 'y2', 'latitude', 'longitude'])
+    store = DefectStore(args.db) if args.db else None
+
+    decode_pool = ThreadPoolExecutor(args.workers, thread_name_prefix='decode')
+    writers = max(1, args.workers // 2)
+    write_pool = ThreadPoolExecutor(writers, thread_name_prefix='write')
+    pending_writes = deque()
+    todo = iter(sources)
+    inflight = deque()
+    processed = failed = 0
+    start = last_report = time.perf_counter()
+
+    def fill():
+        while len(inflight) < args.prefetch:
+            item = next(todo, None)
+            if item is None:
+                return
+            inflight.append(decode_pool.submit(prepare, item[0], item[1], target_size))
+
+    try:
+        fill()
+        while inflight:
+            batch = []
+            # 本批次的 jsonl 记录，CSV 落盘之后再写入
+            records = []
+            while inflight and len(batch) < args.batch:
+                key, decoded, gps, err = inflight.popleft().result()
+                if err:
+                    failed += 1
+                    records.append({'file': key, 'error': err})
+                else:
+                    batch.append((key, decoded, gps))
+            fill()
+
+            results = infer_grouped(model, batch, policy, tracker, half) if batch else []
+            for (key, decoded, gps), r in zip(batch, results):
+                dets = result_to_numpy(r)
+                sx, sy = scale_to_original(decoded)
+                width, height = decoded.original_size
+                detections = [
+                    {'class': names[int(c)], 'confidence': round(float(conf), 3),
+                     'box': [round(float(x1) * sx, 1), round(float(y1) * sy, 1),
+                             round(float(x2) * sx, 1), round(float(y2) * sy, 1)]}
+                    for x1, y1, x2, y2, conf, c in dets
+                ]
+                record = {'file': key, 'width': width, 'height': height,
+                          'gps': list(gps) if gps else None, 'detections': detections}
+                records.append(record)
+                if csv_file:
+                    lat, lon = gps if gps else ('', '')
+                    for d in detections:
+                        csv_writer.writerow([key, d['class'], d['confidence'], *d['box'], lat, lon])
+                if store is not None and gps and detections:
+                    store.add_detections(gps, detections, key)
+                if args.save_images:
+                    out_path = os.path.join(args.out, 'images', key + '.jpg')
+                    img = render(decoded.image, dets, names)
+                    pending_writes.append(write_pool.submit(save_image, out_path, img))
+                    while len(pending_writes) > 2 * writers:
+                        pending_writes.popleft().result()
+                processed += 1
+
+            # 每个批次落盘一次，中断时最多丢失一个批次；CSV 先落盘，jsonl 才记为已完成
+            if csv_file:
+                sync(csv_file)
+            for record in records:
+                jsonl.write(json.dumps(record, ensure_ascii=False) + '\n')
+            sync(jsonl)
+            while pending_writes and pending_writes[0].done():
+                pending_writes.popleft().result()
+
+            now = time.perf_counter()
+            if now - last_report >= 5:
+                print(f"已处理 {processed}/{len(sources)}  {processed / (now - start):.1f} 张/秒")
+                last_report = now
+    finally:
+        decode_pool.shutdown(wait=False, cancel_futures=True)
+        write_pool.shutdown(wait=True)
+        jsonl.close()
+        if csv_file:
+            csv_file.close()
+        if store is not None:
+            store.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"完成: {processed} 张，失败 {failed} 张，耗时 {elapsed:.1f}s，{processed / elapsed:.1f} 张/秒")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    动态批处理调度器：
+    把并发请求在 max_wait_ms 内聚合成一个批次（最多 max_batch_size 张），
+    一次送入模型推理，再把结果分发回各个等待的请求。
+    推理参数（key）不同的请求不会合并：先暂存，之后按到达顺序组成各自的批次。
+    """
+
+    def __init__(self, infer_fn, max_batch_size=8, max_wait_ms=5.0):
+        # infer_fn(imgs, **kwargs): 接收图像列表和推理参数，返回与之一一对应的结果列表
+        self.infer_fn = infer_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        # 与当前批次参数不同、暂存待处理的请求（只由调度线程访问）
+        self._deferred = collections.deque()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._loop, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    @property
+    def thread_id(self):
+        """调度线程的 ident（推理在该线程中执行，剖析时一并采样）"""
+        return self._thread.ident
+
+    def qsize(self):
+        """排队中（尚未组成批次）的请求数"""
+        return self._queue.qsize()
+
+    def submit(self, img, key=()):
+        """
+        提交一张图像，返回 Future
+        key: 推理参数，((名称, 值), ...) 形式的可哈希元组，展开后传给 infer_fn
+        """
+        if self._stopped:
+            raise RuntimeError("MicroBatcher 已停止")
+        fut = Future()
+        self._queue.put((img, key, fut))
+        return fut
+
+    def predict(self, img, timeout=None, key=()):
+        """同步接口：提交并等待该图像的推理结果"""
+        return self.submit(img, key).result(timeout=timeout)
+
+    def close(self):
+        """停止调度线程（已入队的请求会先处理完）"""
+        if not self._stopped:
+            self._stopped = True
+            self._queue.put(None)
+            self._thread.join()
+
+    def _collect(self, first):
+        # 以第一个请求为起点，在等待窗口内尽量凑满一个参数相同的批次
+        key = first[1]
+        batch = [first]
+        # 先取暂存中参数相同的请求
+        rest = collections.deque()
+        while self._deferred:
+            item = self._deferred.popleft()
+            if item[1] == key and len(batch) < self.max_batch_size:
+                batch.append(item)
+            else:
+                rest.append(item)
+        self._deferred = rest
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # 停止信号放回队列，处理完当前批次后退出
+                self._queue.put(None)
+                break
+            if item[1] != key:
+                self._deferred.append(item)
+                continue
+            batch.append(item)
+        return batch
+
+    def _loop(self):
+        while True:
+            first = self._deferred.popleft() if self._deferred else self._queue.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+            imgs = [img for img, _, _ in batch]
+            try:
+                results = self.infer_fn(imgs, **dict(first[1]))
+            except Exception as e:
+                for _, _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            results = list(results)
+            if len(results) != len(batch):
+                err = RuntimeError(f"批量推理返回 {len(results)} 个结果，期望 {len(batch)} 个")
+                for _, _, fut in batch:
+                    fut.set_exception(err)
+                continue
+            for (_, _, fut), res in zip(batch, results):
+                fut.set_result(res)
@@ -0,0 +1,93 @@
+"""
+推理后端对比：在 data/test 上检查精度一致性（与 PyTorch 结果逐框比对 + mAP），并比较单张延迟
+
+用法: python bench_backends.py --backends pytorch,onnx,onnx-int8,openvino,openvino-int8
+"""
+import argparse
+import glob
+import os
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+from backends import BACKENDS, DEFAULT_DATA, DEFAULT_WEIGHTS, IMGSZ, load_model
+
+
+def box_iou(a, b):
+    """a: (N,4), b: (M,4) xyxy → (N,M) IoU"""
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def match_count(ref, cand, iou_thr=0.5):
+    """按类别贪心匹配，返回匹配上的框数量"""
+    matched = 0
+    for c in np.unique(ref[:, 5]):
+        r = ref[ref[:, 5] == c]
+        k = cand[cand[:, 5] == c]
+        if not len(k):
+            continue
+        iou = box_iou(r[:, :4], k[:, :4])
+        used = np.zeros(len(k), dtype=bool)
+        for i in np.argsort(-r[:, 4]):
+            ious = np.where(used, -1.0, iou[i])
+            j = int(np.argmax(ious))
+            if ious[j] >= iou_thr:
+                used[j] = True
+                matched += 1
+    return matched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="推理后端精度与延迟对比")
+    parser.add_argument('--weights', default=DEFAULT_WEIGHTS)
+    parser.add_argument('--data', default=DEFAULT_DATA)
+    parser.add_argument('--images', default='./data/test/images/*.jpg')
+    parser.add_argument('--backends', default=','.join(BACKENDS))
+    parser.add_argument('--imgsz', type=int, default=IMGSZ)
+    parser.add_argument('--no-val', action='store_true', help='跳过 mAP 评估')
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(args.images))
+    imgs = [cv2.imread(p) for p in paths]
+    print(f"测试图片: {len(imgs)} 张")
+
+    reference = None
+    for backend in [b.strip() for b in args.backends.split(',') if b.strip()]:
+        model = load_model(args.weights, backend)
+        model(imgs[0], imgsz=args.imgsz, verbose=False)  # 预热
+
+        preds, times = [], []
+        for img in imgs:
+            t0 = time.perf_counter()
+            r = model(img, imgsz=args.imgsz, verbose=False)[0]
+            times.append((time.perf_counter() - t0) * 1000)
+            preds.append(r.boxes.data.cpu().numpy())
+
+        if reference is None:
+            reference = preds
+        n_ref = sum(len(p) for p in reference)
+        n_cand = sum(len(p) for p in preds)
+        matched = sum(match_count(r, p) for r, p in zip(reference, preds))
+        agree_recall = matched / n_ref if n_ref else 1.0
+        agree_precision = matched / n_cand if n_cand else 1.0
+
+        line = (f"{backend:<14} mean {statistics.mean(times):7.1f} ms   "
+                f"p95 {sorted(times)[int(0.95 * (len(times) - 1))]:7.1f} ms   "
+                f"与首个后端一致率 "
+                f"R {agree_recall:.3f} / P {agree_precision:.3f}")
+        if not args.no_val:
+            metrics = model.val(data=os.path.abspath(args.data), split='test', imgsz=args.imgsz,
+                                batch=1, plots=False, verbose=False)
+            line += f"   mAP50 {metrics.box.map50:.3f}   mAP50-95 {metrics.box.map:.3f}"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+动态批处理基准测试：对比逐请求推理与 MicroBatcher 的吞吐量和延迟
+
+用法: python bench_batching.py --clients 8 --requests 20 --max-batch 8 --max-wait-ms 5
+"""
+import argparse
+import glob
+import statistics
+import threading
+import time
+
+import cv2
+
+from batcher import MicroBatcher
+
+
+def load_images(pattern, limit):
+    paths = sorted(glob.glob(pattern))[:limit]
+    imgs = [cv2.imread(p) for p in paths]
+    return [img for img in imgs if img is not None]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+def run_clients(call, imgs, clients, requests_per_client):
+    """模拟 clients 个并发客户端，每个依次发送 requests_per_client 次请求"""
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(cid):
+        local = []
+        for i in range(requests_per_client):
+            img = imgs[(cid * requests_per_client + i) % len(imgs)]
+            t0 = time.perf_counter()
+            call(img)
+            local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(c,)) for c in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return elapsed, latencies
+
+
+def report(name, elapsed, latencies):
+    n = len(latencies)
+    ms = [x * 1000 for x in latencies]
+    print(f"{name:<12} {n / elapsed:8.2f} req/s   "
+          f"mean {statistics.mean(ms):7.1f} ms   p50 {percentile(ms, 50):7.1f} ms   "
+          f"p95 {percentile(ms, 95):7.1f} ms   p99 {percentile(ms, 99):7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="逐请求推理 vs 动态批处理")
+    parser.add_argument('--weights', default='./runs/detect/yolov8n_v8_200e/weights/best.pt')
+    parser.add_argument('--images', default='./data/test/images/*.jpg')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=20, help='每个客户端的请求数')
+    parser.add_argument('--max-batch', type=int, default=8)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+    model = YOLO(args.weights)
+
+    imgs = load_images(args.images, 64)
+    if not imgs:
+        print(f"没有找到测试图片: {args.images}")
+        return
+
+    # 预热，避免首次推理的初始化开销影响结果
+    model(imgs[0], verbose=False)
+
+    # 当前路径：每个请求各自调用一次 model(img)（与 app.py 原有实现一致）
+    lock = threading.Lock()
+
+    def per_request(img):
+        with lock:
+            return model(img, verbose=False)[0]
+
+    elapsed, lat = run_clients(per_request, imgs, args.clients, args.requests)
+    report('per-request', elapsed, lat)
+
+    batcher = MicroBatcher(lambda batch: model(batch, verbose=False),
+                           args.max_batch, args.max_wait_ms)
+    elapsed, lat = run_clients(batcher.predict, imgs, args.clients, args.requests)
+    batcher.close()
+    report('batched', elapsed, lat)
+
+
+if __name__ == '__main__':
+    main()
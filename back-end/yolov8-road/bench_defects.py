@@ -0,0 +1,82 @@
+"""
+缺陷位置库基准：R-tree 查询 vs 全表扫描
+
+在爱尔兰范围内随机生成 --points 个缺陷，测量矩形查询（约 1km 范围）、
+半径查询（100 米）和网格统计的延迟，并与不走索引的全表扫描对比。
+
+用法: python bench_defects.py --points 1000000 --queries 200
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from defect_store import DefectStore, meters_to_degrees
+
+# 爱尔兰大致范围
+LAT_RANGE = (51.4, 55.4)
+LON_RANGE = (-10.5, -6.0)
+CLASSES = ('cracks', 'pothole')
+
+
+def timed(fn, args_list):
+    times = []
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(*args)
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times), max(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="缺陷位置库查询基准")
+    parser.add_argument('--points', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--db', default=None, help='数据库路径（默认使用临时文件）')
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'bench_defects.db')
+    store = DefectStore(path)
+    rng = random.Random(0)
+
+    existing = store.count()
+    if existing < args.points:
+        t0 = time.perf_counter()
+        chunk = 100_000
+        for start in range(existing, args.points, chunk):
+            n = min(chunk, args.points - start)
+            store.bulk_insert(((rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE),
+                                rng.choice(CLASSES), rng.random()) for _ in range(n)), source='bench')
+        print(f"写入 {args.points - existing} 条，耗时 {time.perf_counter() - t0:.1f}s")
+    print(f"库中共 {store.count()} 条缺陷")
+
+    centers = [(rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)) for _ in range(args.queries)]
+    bboxes = []
+    for lat, lon in centers:
+        dlat, dlon = meters_to_degrees(500, lat)
+        bboxes.append((lat - dlat, lon - dlon, lat + dlat, lon + dlon))
+
+    def scan_bbox(min_lat, min_lon, max_lat, max_lon):
+        # 对照组：不走 R-tree，直接扫描 defects 表
+        with store._lock:
+            return store._conn.execute(
+                "SELECT * FROM defects WHERE lat BETWEEN ? AND ? AND lon BETWEEN ? AND ?",
+                (min_lat, max_lat, min_lon, max_lon)).fetchall()
+
+    n_scan = max(1, args.queries // 20)
+    rows = [
+        ('bbox 1km (R-tree)', *timed(store.query_bbox, bboxes)),
+        ('bbox 1km (全表扫描)', *timed(scan_bbox, bboxes[:n_scan])),
+        ('radius 100m', *timed(lambda lat, lon: store.query_radius(lat, lon, 100), centers)),
+        ('grid 1km / 100m 网格', *timed(store.grid_counts, bboxes)),
+    ]
+    print(f"{'查询':<22}{'中位数 ms':>12}{'最大 ms':>12}")
+    for name, median, worst in rows:
+        print(f"{name:<22}{median:>12.2f}{worst:>12.2f}")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
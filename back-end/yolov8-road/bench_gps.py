@@ -0,0 +1,74 @@
+"""
+GPS 提取基准：原 get_gps_coordinates（exifread 解析全部标签）vs 只解析 GPS IFD 的新实现
+
+用法: python bench_gps.py --count 2000 [--dir 已有照片目录]
+不指定 --dir 时生成带 GPS 和常见 EXIF 标签的合成 JPEG。
+"""
+import argparse
+import glob
+import os
+import tempfile
+import time
+
+from PIL import Image
+
+from location import get_gps_batch, get_gps_coordinates, get_gps_from_file
+
+
+def synth_photos(directory, count):
+    """生成带 EXIF（相机信息、拍摄参数、GPS、UserComment）的 JPEG"""
+    img = Image.new('RGB', (1600, 1200), (90, 90, 90))
+    paths = []
+    for i in range(count):
+        exif = Image.Exif()
+        exif[0x010F] = 'Apple'
+        exif[0x0110] = 'iPhone 13'
+        exif[0x0132] = '2024:05:01 10:00:00'
+        sub = exif.get_ifd(0x8769)
+        sub[0x829A] = 1 / 120
+        sub[0x8827] = 100
+        sub[0x9286] = b'ASCII\0\0\0' + b'x' * 20000
+        gps = exif.get_ifd(0x8825)
+        gps[1], gps[2] = 'N', (52.0, 50.0, float(i % 60))
+        gps[3], gps[4] = 'W', (6.0, 55.0, float(i % 60))
+        path = os.path.join(directory, f'{i:05d}.jpg')
+        img.save(path, 'JPEG', exif=exif, quality=85)
+        paths.append(path)
+    return paths
+
+
+def timed(label, fn, n):
+    t0 = time.perf_counter()
+    out = fn()
+    dt = time.perf_counter() - t0
+    print(f"{label:<28} {dt:7.2f} s   {n / dt:8.0f} 张/秒")
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GPS 提取速度对比")
+    parser.add_argument('--dir', default=None)
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.dir:
+            paths = sorted(glob.glob(os.path.join(args.dir, '*')))[:args.count]
+        else:
+            paths = synth_photos(tmp, args.count)
+        n = len(paths)
+
+        old = timed('get_gps_coordinates', lambda: [get_gps_coordinates(p, verbose=False) for p in paths], n)
+        new = timed('get_gps_from_file', lambda: [get_gps_from_file(p) for p in paths], n)
+        batch = timed('get_gps_batch (并行)', lambda: get_gps_batch(paths, args.workers), n)
+
+        def same(a, b):
+            return (a is None and b is None) or (a and b and abs(a[0] - b[0]) < 1e-6 and abs(a[1] - b[1]) < 1e-6)
+
+        mismatched = sum(not (same(a, b) and same(a, c)) for a, b, c in zip(old, new, batch))
+        print(f"结果不一致: {mismatched} / {n}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+解码基准测试：每张 12MP 手机照片的解码时间和峰值内存（原有路径 vs ingest 模块）
+
+用法: python bench_ingest.py [--image photo.jpg] [--repeat 10]
+不指定 --image 时生成一张 4000x3000 的合成 JPEG。峰值内存通过 /proc/self 统计（仅 Linux）。
+"""
+import argparse
+import io
+import multiprocessing as mp
+import statistics
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from ingest import MODEL_IMGSZ, decode_image
+
+
+def old_server_path(buf):
+    # 原 app.py: PIL 全分辨率解码 → np.array（RGB）
+    pil_image = Image.open(io.BytesIO(buf))
+    if pil_image.mode != 'RGB':
+        pil_image = pil_image.convert('RGB')
+    return np.array(pil_image)
+
+
+def old_gui_path(buf):
+    # 原 gui.py: OpenCV 全分辨率解码
+    return cv2.imdecode(np.frombuffer(buf, np.uint8), cv2.IMREAD_COLOR)
+
+
+def ingest_model_size(buf):
+    return decode_image(buf, MODEL_IMGSZ).image
+
+
+def ingest_full(buf):
+    return decode_image(buf).image
+
+
+METHODS = {
+    'old-server(PIL)': old_server_path,
+    'old-gui(cv2)': old_gui_path,
+    'ingest@416': ingest_model_size,
+    'ingest@full': ingest_full,
+}
+
+
+def synth_jpeg(width=4000, height=3000):
+    """生成一张带纹理的合成照片（噪声 + 渐变，接近真实照片的压缩率）"""
+    rng = np.random.default_rng(0)
+    small = rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8)
+    img = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    img = cv2.add(img, rng.integers(0, 40, img.shape, dtype=np.uint8))
+    ok, enc = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 92])
+    return enc.tobytes()
+
+
+def _status_kb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return 0
+
+
+def _measure(name, buf, repeat, out):
+    fn = METHODS[name]
+    fn(buf)  # 预热（加载解码库等）
+    # 重置进程的峰值 RSS（VmHWM），只统计解码期间的增长
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+    base = _status_kb('VmRSS')
+    times = []
+    shape = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        img = fn(buf)
+        times.append((time.perf_counter() - t0) * 1000)
+        shape = img.shape
+        del img
+    peak = _status_kb('VmHWM')
+    out.put((statistics.median(times), (peak - base) / 1024, shape))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="解码时间与内存对比")
+    parser.add_argument('--image', default=None)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, 'rb') as f:
+            buf = f.read()
+    else:
+        buf = synth_jpeg()
+    print(f"输入: {len(buf) / 1e6:.1f} MB")
+
+    # 每种方法在独立进程中运行，峰值内存互不影响
+    ctx = mp.get_context('spawn')
+    for name in METHODS:
+        out = ctx.Queue()
+        p = ctx.Process(target=_measure, args=(name, buf, args.repeat, out))
+        p.start()
+        median_ms, peak_mb, shape = out.get()
+        p.join()
+        print(f"{name:<16} {median_ms:8.1f} ms   峰值内存 +{peak_mb:7.1f} MB   输出 {shape[1]}x{shape[0]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+多图检测基准：同一组图片分别用
+- 逐张调用 /detect?format=json（顺序请求，前端原来的方式）
+- 一次 /detect/batch（多个 file 字段）
+- 一次 /detect/batch（zip 压缩包）
+测量总耗时和吞吐量（张/秒），以及批量接口返回第一条结果的时间。
+
+用法: python bench_multi.py --images './data/test/images/*.jpg' --limit 200
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+import zipfile
+
+from bench_startup import SERVER, poll
+from loadtest import encode_multipart
+
+
+def encode_files(files):
+    """多个 file 字段的 multipart/form-data 请求体；files: [(文件名, 字节)]"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, data in files:
+        parts.append((
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="file"; filename="{name}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'
+        ).encode() + data + b'\r\n')
+    return b''.join(parts) + f'--{boundary}--\r\n'.encode(), f'multipart/form-data; boundary={boundary}'
+
+
+def sequential(url, files):
+    t0 = time.perf_counter()
+    for name, data in files:
+        body, content_type = encode_multipart(name, data)
+        req = urllib.request.Request(f'{url}/detect?format=json', data=body, headers={'Content-Type': content_type})
+        with urllib.request.urlopen(req, timeout=120) as resp:
+            resp.read()
+    return time.perf_counter() - t0, None, len(files)
+
+
+def batched(url, body, content_type, query=''):
+    """返回 (总耗时, 第一条结果的时间, 成功图片数)"""
+    req = urllib.request.Request(f'{url}/detect/batch{query}', data=body, headers={'Content-Type': content_type})
+    t0 = time.perf_counter()
+    first = None
+    ok = 0
+    with urllib.request.urlopen(req, timeout=600) as resp:
+        for line in resp:
+            record = json.loads(line)
+            if 'summary' in record:
+                continue
+            if first is None:
+                first = time.perf_counter() - t0
+            ok += record['code'] == 200
+    return time.perf_counter() - t0, first, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多图批量检测与逐张请求的吞吐量对比")
+    parser.add_argument('--images', default='./data/test/images/*.jpg')
+    parser.add_argument('--limit', type=int, default=200)
+    parser.add_argument('--port', type=int, default=5097)
+    parser.add_argument('--batch', type=int, default=16, help='服务端 MULTI_BATCH_SIZE')
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(args.images))[:args.limit]
+    if not paths:
+        raise SystemExit(f"没有找到测试图片: {args.images}")
+    files = []
+    for p in paths:
+        with open(p, 'rb') as f:
+            files.append((os.path.basename(p), f.read()))
+    multipart = encode_files(files)
+    zbuf = io.BytesIO()
+    with zipfile.ZipFile(zbuf, 'w', zipfile.ZIP_STORED) as zf:
+        for name, data in files:
+            zf.writestr(name, data)
+    zipped = encode_files([('survey.zip', zbuf.getvalue())])
+
+    env = dict(os.environ, RESULT_CACHE_MB='0', DEFECT_DB='', MULTI_BATCH_SIZE=str(args.batch))
+    url = f'http://127.0.0.1:{args.port}'
+    proc = subprocess.Popen([sys.executable, '-c', SERVER.format(port=args.port)], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not poll(f'{url}/ready', time.perf_counter() + args.timeout):
+            raise SystemExit("服务启动超时")
+        sequential(url, files[:5])  # 预热
+        runs = [
+            ('逐张 /detect', sequential(url, files)),
+            ('/detect/batch 多文件', batched(url, *multipart)),
+            ('/detect/batch zip', batched(url, *zipped)),
+            ('/detect/batch +图片', batched(url, *multipart, query='?images=1&output=jpeg')),
+        ]
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    print(f"{len(files)} 张图片，MULTI_BATCH_SIZE={args.batch}")
+    print(f"{'':<22}{'总耗时 s':>10}{'张/秒':>10}{'首条结果 s':>12}{'成功':>6}")
+    base = runs[0][1][0]
+    for label, (elapsed, first, ok) in runs:
+        first_s = f"{first:.2f}" if first is not None else '-'
+        print(f"{label:<22}{elapsed:>10.2f}{len(files) / elapsed:>10.1f}{first_s:>12}{ok:>6}"
+              f"  ({base / elapsed:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
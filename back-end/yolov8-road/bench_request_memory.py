@@ -0,0 +1,81 @@
+"""
+单个大图请求的服务端内存基准：启动服务进程，对 12MP / 48MP 照片分别请求
+PNG / JPEG / WebP 标注结果，测量
+- 请求期间服务进程的峰值内存增量（VmHWM - 请求前 VmRSS，需要 Linux /proc）
+- 响应大小和请求延迟
+
+每次请求前向 /proc/<pid>/clear_refs 写入 5，把峰值重置为当前 RSS。
+
+用法: python bench_request_memory.py --sizes 4000x3000,8000x6000 --formats png,jpeg,webp
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+from bench_ingest import synth_jpeg
+from bench_startup import SERVER, poll
+from loadtest import encode_multipart
+
+
+def proc_kb(pid, field):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return 0
+
+
+def post(url, body, content_type):
+    req = urllib.request.Request(url, data=body, headers={'Content-Type': content_type})
+    t0 = time.perf_counter()
+    with urllib.request.urlopen(req, timeout=300) as resp:
+        size = len(resp.read())
+    return size, (time.perf_counter() - t0) * 1000
+
+
+def measure(pid, url, body, content_type):
+    """返回 (峰值内存增量 MB, 响应字节数, 延迟 ms)"""
+    with open(f'/proc/{pid}/clear_refs', 'w') as f:
+        f.write('5')
+    base = proc_kb(pid, 'VmRSS')
+    size, ms = post(url, body, content_type)
+    return (proc_kb(pid, 'VmHWM') - base) / 1024, size, ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大图请求的服务端峰值内存基准")
+    parser.add_argument('--sizes', default='4000x3000,8000x6000', help='逗号分隔的 宽x高')
+    parser.add_argument('--formats', default='png,jpeg,webp')
+    parser.add_argument('--resolution', default='full', help='标注图片分辨率 full|reduced')
+    parser.add_argument('--port', type=int, default=5098)
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    env = dict(os.environ, RESULT_CACHE_MB='0', DEFECT_DB='', BATCH_MAX_SIZE='1')
+    base_url = f'http://127.0.0.1:{args.port}'
+    proc = subprocess.Popen([sys.executable, '-c', SERVER.format(port=args.port)], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not poll(f'{base_url}/ready', time.perf_counter() + args.timeout):
+            raise SystemExit("服务启动超时")
+        print(f"{'尺寸':<12}{'MP':>5}{'上传 MB':>9}{'格式':>6}{'峰值增量 MB':>13}{'响应 MB':>9}{'延迟 ms':>10}")
+        for spec in args.sizes.split(','):
+            w, h = (int(v) for v in spec.lower().split('x'))
+            data = synth_jpeg(w, h)
+            body, content_type = encode_multipart(f'{spec}.jpg', data)
+            for fmt in args.formats.split(','):
+                url = f'{base_url}/detect?format=image&output={fmt}&resolution={args.resolution}'
+                post(url, body, content_type)  # 预热：该尺寸的分配器和编码器
+                peak, size, ms = measure(proc.pid, url, body, content_type)
+                print(f"{spec:<12}{w * h / 1e6:>5.0f}{len(data) / 2**20:>9.1f}{fmt:>6}{peak:>13.1f}"
+                      f"{size / 2**20:>9.2f}{ms:>10.0f}")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+冷启动基准：启动服务进程，测量
+- 进程启动到 /ping 可用的时间
+- 启动到 /ready（模型加载 + 预热完成）的时间
+- 就绪后第一个 /detect 请求的延迟，与稳定状态（之后请求的中位数）对比
+
+分别在开启和关闭预热（WARMUP_RUNS=0）时各测一次。
+
+用法: python bench_startup.py --image ./data/test/images/xxx.jpg --requests 10
+"""
+import argparse
+import glob
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from loadtest import encode_multipart
+
+SERVER = "import app; app.app.run(host='127.0.0.1', port={port}, threaded=True)"
+
+
+def poll(url, deadline):
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=2) as resp:
+                if resp.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.05)
+    return False
+
+
+def detect(url, image_path):
+    with open(image_path, 'rb') as f:
+        body, content_type = encode_multipart(os.path.basename(image_path), f.read())
+    req = urllib.request.Request(f'{url}/detect?format=json', data=body, headers={'Content-Type': content_type})
+    t0 = time.perf_counter()
+    with urllib.request.urlopen(req, timeout=120) as resp:
+        resp.read()
+    return (time.perf_counter() - t0) * 1000
+
+
+def measure(image_path, port, n_requests, warmup_runs, timeout=300):
+    env = dict(os.environ, WARMUP_RUNS=str(warmup_runs), RESULT_CACHE_MB='0', DEFECT_DB='')
+    url = f'http://127.0.0.1:{port}'
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-c', SERVER.format(port=port)], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = start + timeout
+        if not poll(f'{url}/ping', deadline):
+            raise RuntimeError("服务启动超时")
+        t_ping = time.perf_counter() - start
+        if not poll(f'{url}/ready', deadline):
+            raise RuntimeError("模型加载超时")
+        t_ready = time.perf_counter() - start
+        latencies = [detect(url, image_path) for _ in range(n_requests)]
+    finally:
+        proc.terminate()
+        proc.wait()
+    return {
+        'ping_s': t_ping,
+        'ready_s': t_ready,
+        'first_ms': latencies[0],
+        'steady_ms': statistics.median(latencies[1:]) if len(latencies) > 1 else latencies[0],
+        'first_fast_s': t_ready + latencies[0] / 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="服务冷启动基准")
+    parser.add_argument('--image', default=None, help='测试图片（默认取 data/test 中第一张）')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--requests', type=int, default=10)
+    parser.add_argument('--warmup-runs', type=int, default=2)
+    args = parser.parse_args()
+
+    image = args.image or sorted(glob.glob('./data/test/images/*.jpg'))[0]
+    print(f"{'':<12}{'/ping s':>10}{'/ready s':>10}{'首个请求 ms':>14}{'稳定 ms':>10}{'首个快速响应 s':>16}")
+    for label, runs in (('不预热', 0), (f'预热 x{args.warmup_runs}', args.warmup_runs)):
+        r = measure(image, args.port, args.requests, runs)
+        print(f"{label:<12}{r['ping_s']:>10.2f}{r['ready_s']:>10.2f}{r['first_ms']:>14.1f}"
+              f"{r['steady_ms']:>10.1f}{r['first_fast_s']:>16.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+"""
+推理基准套件（CPU、离线）
+
+对每个 (后端, 输入尺寸, 线程数) 组合，在 data/test 上测量：
+- 端到端延迟及各阶段耗时：解码 / 预处理 / 推理 / NMS / 绘制 / PNG 编码
+- 不同批量下的吞吐量（张/秒）
+- 进程峰值内存（VmHWM）
+- data/test 上的 mAP50 / mAP50-95（每个后端和尺寸只评估一次，使用最大线程数的那一组）
+
+每个组合在独立进程中运行（线程数、峰值内存互不影响）。结果连同机器信息、依赖版本、
+git 提交写入 bench_results/<时间>_<提交>.json，用 --compare 对比两次运行。
+
+用法:
+  python bench_suite.py --backends pytorch,onnx --imgsz 320,416,640 --batch 1,4,8 --threads 1,2,4
+  python bench_suite.py --compare bench_results/a.json bench_results/b.json
+"""
+import argparse
+import glob
+import json
+import multiprocessing as mp
+import os
+import platform
+import queue
+import socket
+import statistics
+import subprocess
+import time
+
+from backends import BACKENDS, DEFAULT_DATA, DEFAULT_WEIGHTS, IMGSZ
+
+RESULTS_DIR = './bench_results'
+PACKAGES = ('torch', 'ultralytics', 'onnxruntime', 'openvino', 'opencv-python', 'opencv-python-headless',
+            'numpy', 'pillow')
+
+
+def summary(values):
+    """毫秒列表 → {mean, p50, p95}"""
+    if not values:
+        return None
+    values = sorted(values)
+    return {
+        'mean': round(statistics.mean(values), 2),
+        'p50': round(values[len(values) // 2], 2),
+        'p95': round(values[min(len(values) - 1, int(len(values) * 0.95))], 2),
+    }
+
+
+def environment():
+    """机器和软件版本信息，便于跨提交、跨机器对比"""
+    from importlib import metadata
+
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], capture_output=True, text=True, timeout=10).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ''
+
+    cpu = platform.processor()
+    try:
+        with open('/proc/cpuinfo') as f:
+            cpu = next((line.split(':', 1)[1].strip() for line in f if line.startswith('model name')), cpu)
+    except OSError:
+        pass
+    versions = {}
+    for pkg in PACKAGES:
+        try:
+            versions[pkg] = metadata.version(pkg)
+        except metadata.PackageNotFoundError:
+            continue
+    return {
+        'commit': git('rev-parse', '--short', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'host': socket.gethostname(),
+        'platform': platform.platform(),
+        'cpu': cpu,
+        'cpus': len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count(),
+        'python': platform.python_version(),
+        'packages': versions,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def _peak_rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_config(cfg, out):
+    """子进程：测量一个 (后端, 尺寸, 线程数) 组合"""
+    try:
+        out.put(_run_config(cfg))
+    except Exception as e:
+        out.put({**{k: cfg[k] for k in ('backend', 'imgsz', 'threads')}, 'error': str(e)})
+
+
+def wait_result(p, out, cfg, timeout):
+    """
+    等待子进程的结果：子进程没有写出结果就退出（段错误、OOM 被杀等）或超过 timeout 秒时，
+    返回带 error 的结果，不会一直阻塞
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return out.get(timeout=1.0)
+        except queue.Empty:
+            pass
+        if not p.is_alive():
+            p.join()
+            try:
+                # 退出前刚写出的结果
+                return out.get(timeout=1.0)
+            except queue.Empty:
+                error = f"子进程异常退出 (exitcode={p.exitcode})"
+                break
+        if time.monotonic() > deadline:
+            p.terminate()
+            p.join()
+            error = f"超时 ({timeout:.0f}s)"
+            break
+    return {**{k: cfg[k] for k in ('backend', 'imgsz', 'threads')}, 'error': error}
+
+
+def _run_config(cfg):
+    # 线程数必须在导入 torch 之前设置
+    os.environ['OMP_NUM_THREADS'] = str(cfg['threads'])
+    import cv2
+    import torch
+
+    from backends import class_names, load_model
+    from ingest import decode_image
+    from render import render, result_to_numpy
+
+    torch.set_num_threads(cfg['threads'])
+    imgsz = cfg['imgsz']
+
+    t0 = time.perf_counter()
+    model = load_model(cfg['weights'], cfg['backend'])
+    load_s = time.perf_counter() - t0
+    names = class_names(model)
+
+    bufs = []
+    for p in cfg['paths']:
+        with open(p, 'rb') as f:
+            bufs.append(f.read())
+    first = decode_image(bufs[0]).image
+    for _ in range(3):
+        model(first, imgsz=imgsz, verbose=False)  # 预热
+
+    # ---------- 端到端（单张）及各阶段耗时 ----------
+    stages = {k: [] for k in ('decode', 'preprocess', 'inference', 'nms', 'render', 'encode', 'total')}
+    decoded = []
+    for buf in bufs:
+        t0 = time.perf_counter()
+        img = decode_image(buf).image
+        t1 = time.perf_counter()
+        r = model(img, imgsz=imgsz, verbose=False)[0]
+        t2 = time.perf_counter()
+        # 与 /detect 相同：编码的是标注后的图片（img 之后还用于吞吐量测试，在副本上绘制）
+        annotated = render(img.copy(), result_to_numpy(r), names)
+        t3 = time.perf_counter()
+        cv2.imencode('.png', annotated)
+        t4 = time.perf_counter()
+        stages['decode'].append((t1 - t0) * 1000)
+        for key, stage in (('preprocess', 'preprocess'), ('inference', 'inference'), ('postprocess', 'nms')):
+            if r.speed.get(key) is not None:
+                stages[stage].append(r.speed[key])
+        stages['render'].append((t3 - t2) * 1000)
+        stages['encode'].append((t4 - t3) * 1000)
+        stages['total'].append((t4 - t0) * 1000)
+        decoded.append(img)
+
+    # ---------- 各批量下的吞吐量（已解码图片，只计模型调用）----------
+    throughput = {}
+    for b in cfg['batches']:
+        model(decoded[:b], imgsz=imgsz, verbose=False)  # 该批量形状预热
+        n = 0
+        t0 = time.perf_counter()
+        for i in range(0, len(decoded), b):
+            chunk = decoded[i:i + b]
+            model(chunk, imgsz=imgsz, verbose=False)
+            n += len(chunk)
+        throughput[str(b)] = round(n / (time.perf_counter() - t0), 2)
+
+    result = {
+        'backend': cfg['backend'],
+        'imgsz': imgsz,
+        'threads': cfg['threads'],
+        'images': len(bufs),
+        'load_s': round(load_s, 2),
+        'latency_ms': {k: summary(v) for k, v in stages.items()},
+        'throughput_ips': throughput,
+    }
+
+    if cfg['val']:
+        try:
+            m = model.val(data=os.path.abspath(cfg['data']), split='test', imgsz=imgsz, batch=max(cfg['batches']),
+                          plots=False, verbose=False)
+            result['map50'] = round(float(m.box.map50), 4)
+            result['map50_95'] = round(float(m.box.map), 4)
+        except Exception as e:
+            # 评估失败时保留延迟结果
+            result['val_error'] = str(e)
+
+    result['peak_rss_mb'] = round(_peak_rss_mb(), 1)
+    return result
+
+
+def print_table(results):
+    print(f"{'backend':<14}{'imgsz':>6}{'thr':>4}{'e2e p50':>9}{'p95':>8}{'infer':>8}"
+          f"{'  吞吐 (批量:张/秒)':<24}{'RSS MB':>8}{'mAP50':>7}{'mAP':>7}")
+    for r in results:
+        if 'error' in r:
+            print(f"{r['backend']:<14}{r['imgsz']:>6}{r['threads']:>4}  失败: {r['error']}")
+            continue
+        lat = r['latency_ms']
+        tput = ' '.join(f"{b}:{v}" for b, v in r['throughput_ips'].items())
+        infer = lat['inference']['p50'] if lat['inference'] else float('nan')
+        print(f"{r['backend']:<14}{r['imgsz']:>6}{r['threads']:>4}{lat['total']['p50']:>9.1f}{lat['total']['p95']:>8.1f}"
+              f"{infer:>8.1f}  {tput:<22}{r['peak_rss_mb']:>8.0f}"
+              f"{r.get('map50', float('nan')):>7.3f}{r.get('map50_95', float('nan')):>7.3f}")
+
+
+def change(new, old):
+    """相对变化百分比；基线缺失或为 0 时返回 n/a"""
+    if not old or new is None:
+        return 'n/a'
+    return f"{(new / old - 1) * 100:+.1f}%"
+
+
+def compare(path_a, path_b):
+    """对比两次运行中相同 (后端, 尺寸, 线程数) 的结果"""
+    with open(path_a) as f:
+        a = json.load(f)
+    with open(path_b) as f:
+        b = json.load(f)
+    print(f"A: {a['env']['commit']} @ {a['env']['host']} ({a['env']['time']})")
+    print(f"B: {b['env']['commit']} @ {b['env']['host']} ({b['env']['time']})")
+    key = lambda r: (r['backend'], r['imgsz'], r['threads'])
+    base = {key(r): r for r in a['results'] if 'error' not in r}
+    for r in b['results']:
+        old = base.get(key(r))
+        if old is None or 'error' in r:
+            continue
+        e2e_a = ((old.get('latency_ms') or {}).get('total') or {}).get('p50')
+        e2e_b = ((r.get('latency_ms') or {}).get('total') or {}).get('p50')
+        fmt = lambda v: 'n/a' if v is None else f"{v:.1f}"
+        line = (f"{r['backend']:<14}{r['imgsz']:>6}{r['threads']:>4}  "
+                f"e2e p50 {fmt(e2e_a)} → {fmt(e2e_b)} ms ({change(e2e_b, e2e_a)})")
+        for bs, v in r.get('throughput_ips', {}).items():
+            if bs in old.get('throughput_ips', {}):
+                line += f"  b{bs} {change(v, old['throughput_ips'][bs])}"
+        if 'map50_95' in r and 'map50_95' in old:
+            line += f"  mAP {r['map50_95'] - old['map50_95']:+.4f}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="推理基准套件")
+    parser.add_argument('--weights', default=DEFAULT_WEIGHTS)
+    parser.add_argument('--data', default=DEFAULT_DATA)
+    parser.add_argument('--images', default='./data/test/images/*.jpg')
+    parser.add_argument('--limit', type=int, default=200, help='延迟/吞吐测试使用的图片数（mAP 使用完整 test 集）')
+    parser.add_argument('--backends', default='pytorch', help=f"逗号分隔，可选: {','.join(BACKENDS)}")
+    parser.add_argument('--imgsz', default=str(IMGSZ), help='逗号分隔的输入尺寸')
+    parser.add_argument('--batch', default='1,4,8', help='逗号分隔的批量')
+    parser.add_argument('--threads', default=None, help='逗号分隔的线程数（默认 1 和全部核心）')
+    parser.add_argument('--no-val', action='store_true', help='跳过 mAP 评估')
+    parser.add_argument('--timeout', type=float, default=3600, help='每个组合的最长运行时间（秒），超时记为失败')
+    parser.add_argument('--out', default=None, help='结果文件路径（默认 bench_results/<时间>_<提交>.json）')
+    parser.add_argument('--compare', nargs=2, metavar=('A', 'B'), help='对比两个结果文件')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    env = environment()
+    paths = sorted(glob.glob(args.images))[:args.limit or None]
+    if not paths:
+        raise SystemExit(f"没有找到测试图片: {args.images}")
+    threads = [int(t) for t in args.threads.split(',')] if args.threads else sorted({1, env['cpus']})
+    batches = [int(b) for b in args.batch.split(',')]
+    print(f"{env['cpu']} × {env['cpus']}，提交 {env['commit']}{' (有未提交修改)' if env['dirty'] else ''}，"
+          f"{len(paths)} 张图片")
+
+    ctx = mp.get_context('spawn')
+    results = []
+    for backend in [b.strip() for b in args.backends.split(',') if b.strip()]:
+        for imgsz in [int(s) for s in args.imgsz.split(',')]:
+            for t in threads:
+                cfg = {'backend': backend, 'imgsz': imgsz, 'threads': t, 'weights': args.weights,
+                       'data': args.data, 'paths': paths, 'batches': batches,
+                       'val': not args.no_val and t == max(threads)}
+                out = ctx.Queue()
+                p = ctx.Process(target=run_config, args=(cfg, out))
+                p.start()
+                results.append(wait_result(p, out, cfg, args.timeout))
+                p.join()
+                r = results[-1]
+                print(f"  {backend} imgsz={imgsz} threads={t}: "
+                      + (f"失败 {r['error']}" if 'error' in r else f"e2e p50 {r['latency_ms']['total']['p50']:.1f} ms"))
+
+    out_path = args.out
+    if out_path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out_path = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}_{env['commit'] or 'nogit'}.json")
+    with open(out_path, 'w') as f:
+        json.dump({'env': env, 'args': {k: v for k, v in vars(args).items() if k != 'compare'}, 'results': results},
+                  f, indent=2, ensure_ascii=False)
+
+    print()
+    print_table(results)
+    print(f"\n结果已写入 {out_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+切片推理基准：召回率与延迟对比（整图推理 vs 切片推理）
+
+data/test 中的图片都是 416x416，这里把 k×k 张拼成一张高分辨率图（k=8 时约 3300px），
+每个缺陷在整图中所占比例与手机原图中的细裂缝相当，标签同步拼接。
+
+用法: python bench_tiling.py --grid 8 --mosaics 10 --tile 416
+"""
+import argparse
+import glob
+import os
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+from backends import DEFAULT_WEIGHTS, load_model
+from bench_backends import match_count
+from tiling import DEFAULT_OVERLAP, DEFAULT_TILE, tiled_predict
+
+
+def read_labels(label_path, width, height, dx, dy):
+    """YOLO 格式标签 → 像素坐标 [x1, y1, x2, y2, 1, cls]"""
+    if not os.path.exists(label_path):
+        return np.zeros((0, 6))
+    rows = []
+    with open(label_path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) != 5:
+                continue
+            c, cx, cy, w, h = map(float, parts)
+            rows.append([(cx - w / 2) * width + dx, (cy - h / 2) * height + dy,
+                         (cx + w / 2) * width + dx, (cy + h / 2) * height + dy, 1.0, c])
+    return np.array(rows).reshape(-1, 6)
+
+
+def build_mosaic(paths, grid):
+    """把 grid×grid 张图片拼成一张，返回图像和拼接后的标签"""
+    tiles, labels = [], []
+    size = None
+    for i, p in enumerate(paths):
+        img = cv2.imread(p)
+        if size is None:
+            size = img.shape[:2]
+        img = cv2.resize(img, (size[1], size[0]))
+        tiles.append(img)
+        label_path = p.replace(os.sep + 'images' + os.sep, os.sep + 'labels' + os.sep).rsplit('.', 1)[0] + '.txt'
+        labels.append(read_labels(label_path, size[1], size[0], (i % grid) * size[1], (i // grid) * size[0]))
+    rows = [np.hstack(tiles[r * grid:(r + 1) * grid]) for r in range(grid)]
+    return np.vstack(rows), np.concatenate(labels)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="整图推理 vs 切片推理")
+    parser.add_argument('--weights', default=DEFAULT_WEIGHTS)
+    parser.add_argument('--images', default='./data/test/images/*.jpg')
+    parser.add_argument('--grid', type=int, default=8)
+    parser.add_argument('--mosaics', type=int, default=10)
+    parser.add_argument('--tile', type=int, default=DEFAULT_TILE)
+    parser.add_argument('--overlap', type=float, default=DEFAULT_OVERLAP)
+    parser.add_argument('--conf', type=float, default=0.25)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(args.images))
+    per = args.grid * args.grid
+    model = load_model(args.weights)
+
+    stats = {'full': {'tp': 0, 'pred': 0, 'ms': []}, 'tiled': {'tp': 0, 'pred': 0, 'ms': []}}
+    n_gt = 0
+    for m in range(min(args.mosaics, len(paths) // per)):
+        img, gt = build_mosaic(paths[m * per:(m + 1) * per], args.grid)
+        n_gt += len(gt)
+        if m == 0:
+            print(f"拼接图尺寸: {img.shape[1]}x{img.shape[0]}")
+            model(img, verbose=False)  # 预热
+
+        for mode in ('full', 'tiled'):
+            t0 = time.perf_counter()
+            if mode == 'full':
+                r = model(img, conf=args.conf, verbose=False)[0]
+            else:
+                r = tiled_predict(model, img, args.tile, args.overlap, conf=args.conf)
+            stats[mode]['ms'].append((time.perf_counter() - t0) * 1000)
+            pred = r.boxes.data.cpu().numpy()
+            stats[mode]['tp'] += match_count(gt, pred)
+            stats[mode]['pred'] += len(pred)
+
+    for mode, s in stats.items():
+        if not s['ms']:
+            print("图片数量不足，无法拼接")
+            return
+        recall = s['tp'] / n_gt if n_gt else 0.0
+        precision = s['tp'] / s['pred'] if s['pred'] else 0.0
+        print(f"{mode:<6} recall {recall:.3f}   precision {precision:.3f}   "
+              f"mean {statistics.mean(s['ms']):8.1f} ms/图")
+
+
+if __name__ == '__main__':
+    main()
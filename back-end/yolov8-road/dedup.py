@@ -0,0 +1,314 @@
+"""
+训练数据集近重复检测与裁剪
+
+Roboflow 导出的数据集中同一张原始照片有多个增强副本（如 173_png_jpg.rf.0ed585... 和
+173_png_jpg.rf.5fa954...），而且可能同时出现在 train / valid / test 中，验证指标因此偏高。
+
+- 感知哈希（pHash）：灰度 32x32 的 DCT 取左上 8x8 系数，按中位数二值化为 64 位。
+  同时保存翻转 / 旋转 90° 后的 8 个哈希——水平翻转相当于奇数列系数取反、垂直翻转相当于奇数行取反、
+  转置相当于系数矩阵转置，直接由同一组 DCT 系数得到，不用重新解码
+- 线程池并行计算（JPEG 按 64px 缩小解码），哈希按 (路径, 大小, 修改时间) 缓存在 JSON 文件中，
+  数据集不变时第二次运行不再解码
+- 所有图片两两比较（按块向量化的 XOR + popcount，取 8 个变换中的最小距离），
+  距离 <= threshold 的并入同一个簇；默认同时按 Roboflow 文件名中 .rf. 之前的原始文件名合并
+- 跨 split 的簇整体归入优先级最高的 split（test > val > train）：簇内其他 split 的图片去掉，
+  所以 test 保持不变，val 只去掉与 test 重复的图片；--keep 只限制 train 中每个簇保留的张数
+  （评估集内部的近重复不裁剪），输出图片列表和新的 data.yaml（train.py --data 使用）
+
+用法:
+  python dedup.py                                   # 只报告
+  python dedup.py --out ./data/dedup --keep 1       # 生成 ./data/dedup/data.yaml
+  python train.py --data ./data/dedup/data.yaml
+"""
+import argparse
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import yaml
+
+from ingest import IMAGE_EXTS, decode_file
+
+DEFAULT_DATA = './data/data.yaml'
+DEFAULT_CACHE = os.environ.get('DEDUP_CACHE', './data/.dedup_cache.json')
+# 缓存格式版本：哈希算法变化时递增，旧缓存自动失效
+HASH_VERSION = 'phash-dct8-d8'
+# 64 位 pHash 的汉明距离阈值
+DEFAULT_THRESHOLD = 10
+# 跨 split 的簇归入的 split（靠前的优先）
+SPLIT_PRIORITY = ('test', 'val', 'train')
+
+_RF_SUFFIX = re.compile(r'\.rf\.[0-9a-f]+$')
+# DCT-II：信号翻转后第 k 个系数乘以 (-1)^k
+_FLIP = np.where(np.arange(8) % 2, -1.0, 1.0).astype(np.float32)
+
+
+def _variants(block):
+    """8x8 DCT 系数 → 8 个二面体变换（翻转 / 转置组合）对应的系数，形状 (8, 64)"""
+    out = []
+    for b in (block, block.T):
+        for rows in (1.0, _FLIP[:, None]):
+            for cols in (1.0, _FLIP[None, :]):
+                out.append((b * rows * cols).reshape(-1))
+    return np.stack(out)
+
+
+def phash(path):
+    """图片 → 8 个 64 位感知哈希（uint64，第 0 个为原图）；无法解码时返回 None"""
+    decoded = decode_file(path, 64)
+    if decoded is None:
+        return None
+    gray = cv2.cvtColor(decoded.image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    coeffs = _variants(cv2.dct(small)[:8, :8])
+    # 中位数不含直流分量（只反映整体亮度）
+    bits = coeffs > np.median(coeffs[:, 1:], axis=1, keepdims=True)
+    return np.packbits(bits, axis=1).view('>u8').astype(np.uint64).reshape(-1)
+
+
+def _stat(path):
+    st = os.stat(path)
+    return st.st_size, int(st.st_mtime)
+
+
+def load_hashes(paths, cache_path=DEFAULT_CACHE, workers=None):
+    """
+    所有图片的哈希，形状 (N, 8)；缓存命中的直接读取，其余并行计算后写回缓存
+    无法解码的图片从结果中去掉，返回 (保留的路径, 哈希)
+    """
+    cache = {}
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path) as f:
+            data = json.load(f)
+        if data.get('version') == HASH_VERSION:
+            cache = data['files']
+
+    hashes = [None] * len(paths)
+    todo = []
+    for i, p in enumerate(paths):
+        entry = cache.get(os.path.abspath(p))
+        if entry is not None and tuple(entry[:2]) == _stat(p):
+            hashes[i] = np.array([int(h, 16) for h in entry[2]], dtype=np.uint64)
+        else:
+            todo.append(i)
+
+    if todo:
+        t0 = time.perf_counter()
+        # cv2 / PIL 解码时释放 GIL，线程池即可并行
+        with ThreadPoolExecutor(workers or os.cpu_count() or 4) as pool:
+            for i, h in zip(todo, pool.map(lambda i: phash(paths[i]), todo)):
+                hashes[i] = h
+                if h is not None:
+                    size, mtime = _stat(paths[i])
+                    cache[os.path.abspath(paths[i])] = [size, mtime, [f'{int(v):016x}' for v in h]]
+        print(f"计算哈希: {len(todo)} 张图片，耗时 {time.perf_counter() - t0:.1f}s"
+              f"（缓存命中 {len(paths) - len(todo)} 张）")
+        if cache_path:
+            os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+            with open(cache_path + '.tmp', 'w') as f:
+                json.dump({'version': HASH_VERSION, 'files': cache}, f)
+            os.replace(cache_path + '.tmp', cache_path)
+
+    ok = [i for i, h in enumerate(hashes) if h is not None]
+    if len(ok) < len(paths):
+        print(f"跳过无法解码的图片 {len(paths) - len(ok)} 张")
+    return [paths[i] for i in ok], np.stack([hashes[i] for i in ok]) if ok else np.zeros((0, 8), np.uint64)
+
+
+def near_pairs(hashes, threshold=DEFAULT_THRESHOLD, chunk=256):
+    """
+    两两比较，返回距离 <= threshold 的 (i, j) 数组（i < j）
+    距离：i 的原图哈希与 j 的 8 个变换哈希之间汉明距离的最小值
+    """
+    base = hashes[:, 0]
+    pairs = []
+    for start in range(0, len(base), chunk):
+        q = base[start:start + chunk, None]
+        dist = np.full((len(q), len(base)), 64, dtype=np.uint8)
+        for v in range(hashes.shape[1]):
+            np.minimum(dist, np.bitwise_count(q ^ hashes[None, :, v]), out=dist)
+        ii, jj = np.nonzero(dist <= threshold)
+        ii += start
+        pairs.append(np.stack([np.minimum(ii, jj), np.maximum(ii, jj)], axis=1)[ii != jj])
+    if not pairs:
+        return np.zeros((0, 2), dtype=np.int64)
+    return np.unique(np.concatenate(pairs), axis=0)
+
+
+def source_name(path):
+    """Roboflow 文件名中的原始文件名（去掉 .rf.<hash> 后缀）；不是 Roboflow 文件名时返回 None"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem[:m.start()] if (m := _RF_SUFFIX.search(stem)) else None
+
+
+def clusters(n, pairs, names=None):
+    """并查集：按相似图片对（以及相同的原始文件名）合并，返回每张图片的簇编号"""
+    parent = np.arange(n)
+
+    def find(x):
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(a, b):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+
+    for a, b in pairs.tolist():
+        union(a, b)
+    if names is not None:
+        first = {}
+        for i, name in enumerate(names):
+            if name is not None:
+                union(first.setdefault(name, i), i)
+    return np.array([find(i) for i in range(n)])
+
+
+def split_images(data_yaml):
+    """data.yaml → ({split: [图片路径]}, data.yaml 内容)；相对路径的解析方式与 ultralytics 相同"""
+    with open(data_yaml) as f:
+        data = yaml.safe_load(f)
+    root = os.path.dirname(os.path.abspath(data_yaml))
+    if data.get('path'):
+        root = os.path.join(root, data['path'])
+    splits = {}
+    for split in ('train', 'val', 'test'):
+        if not data.get(split):
+            continue
+        paths = []
+        for d in data[split] if isinstance(data[split], list) else [data[split]]:
+            full = os.path.normpath(os.path.join(root, d))
+            # Roboflow 导出的 data.yaml 写的是 ../train/images
+            if not os.path.exists(full) and d.startswith('../'):
+                full = os.path.normpath(os.path.join(root, d[3:]))
+            if os.path.isfile(full) and full.endswith('.txt'):
+                with open(full) as f:
+                    paths.extend(line.strip() for line in f if line.strip())
+            elif os.path.isdir(full):
+                paths.extend(os.path.join(full, name) for name in sorted(os.listdir(full))
+                             if name.lower().endswith(IMAGE_EXTS))
+            else:
+                raise SystemExit(f"找不到 {split} 数据: {full}")
+        splits[split] = paths
+    return splits, data
+
+
+def prune(split_of, cluster_ids, paths, keep=1):
+    """
+    返回保留的图片下标：跨 split 的簇只保留在 SPLIT_PRIORITY 中最靠前的 split；
+    该 split 为 train 时簇内按文件名排序保留前 keep 张（keep=0 时不限制，只消除跨 split 重复），
+    为 test / val 时全部保留，评估集只会因为跨 split 泄漏而减少
+    """
+    members = {}
+    for i, c in enumerate(cluster_ids.tolist()):
+        members.setdefault(c, []).append(i)
+    kept = []
+    for idx in members.values():
+        owner = min((split_of[i] for i in idx), key=SPLIT_PRIORITY.index)
+        mine = sorted((i for i in idx if split_of[i] == owner), key=lambda i: os.path.basename(paths[i]))
+        kept.extend(mine[:keep] if keep > 0 and owner == 'train' else mine)
+    return sorted(kept)
+
+
+def report(paths, split_of, cluster_ids, kept, threshold):
+    """
+    统计各 split 的图片数、簇内重复数、跨 split 的簇数（泄漏）、因泄漏去掉的图片数
+    （归入更高优先级 split 的簇成员，val 只会因此减少）和保留数
+    """
+    members = {}
+    for i, c in enumerate(cluster_ids.tolist()):
+        members.setdefault(c, []).append(i)
+    groups = [idx for idx in members.values() if len(idx) > 1]
+    splits = [s for s in SPLIT_PRIORITY[::-1] if s in split_of]
+    duplicates = {s: 0 for s in splits}
+    leaked = {s: 0 for s in splits}
+    leakage = {}
+    for idx in groups:
+        present = sorted({split_of[i] for i in idx}, key=splits.index)
+        for s in present:
+            duplicates[s] += sum(split_of[i] == s for i in idx) - 1
+            if s != present[-1]:
+                leaked[s] += sum(split_of[i] == s for i in idx)
+        for a in range(len(present)):
+            for b in range(a + 1, len(present)):
+                key = f'{present[a]}/{present[b]}'
+                leakage[key] = leakage.get(key, 0) + 1
+    return {
+        'threshold': threshold,
+        'images': {s: split_of.count(s) for s in splits},
+        'kept': {s: sum(split_of[i] == s for i in kept) for s in splits},
+        'clusters': len(groups),
+        'duplicates': duplicates,
+        'leaked': leaked,
+        'leakage_clusters': leakage,
+        'groups': [[{'split': split_of[i], 'file': os.path.basename(paths[i])} for i in idx] for idx in groups],
+    }
+
+
+def write_split(out_dir, data, paths, split_of, kept, summary):
+    """写出各 split 的图片列表（绝对路径，标签按 images→labels 对应）、data.yaml 和报告"""
+    os.makedirs(out_dir, exist_ok=True)
+    new = {k: v for k, v in data.items() if k not in ('path', 'train', 'val', 'test')}
+    for split in summary['images']:
+        list_path = os.path.abspath(os.path.join(out_dir, f'{split}.txt'))
+        with open(list_path, 'w') as f:
+            f.writelines(os.path.abspath(paths[i]) + '\n' for i in kept if split_of[i] == split)
+        new[split] = list_path
+    with open(os.path.join(out_dir, 'data.yaml'), 'w') as f:
+        yaml.safe_dump(new, f, allow_unicode=True, sort_keys=False)
+    with open(os.path.join(out_dir, 'report.json'), 'w') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=1)
+    return os.path.join(out_dir, 'data.yaml')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="训练数据集近重复检测与裁剪")
+    parser.add_argument('--data', default=DEFAULT_DATA)
+    parser.add_argument('--threshold', type=int, default=DEFAULT_THRESHOLD, help='64 位 pHash 的汉明距离阈值')
+    parser.add_argument('--ignore-names', action='store_true', help='不按 Roboflow 原始文件名合并，只看图像内容')
+    parser.add_argument('--keep', type=int, default=1, help='train 中每个簇最多保留的图片数（0 = 只消除跨 split 重复）')
+    parser.add_argument('--out', default=None, help='输出去重后的 data.yaml 和图片列表的目录')
+    parser.add_argument('--report', default=None, help='另外把报告写到该 JSON 文件')
+    parser.add_argument('--cache', default=DEFAULT_CACHE, help='哈希缓存文件（空字符串关闭）')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    splits, data = split_images(args.data)
+    all_paths = [p for s in splits for p in splits[s]]
+    paths, hashes = load_hashes(all_paths, args.cache or None, args.workers)
+    split_by_path = {p: s for s in splits for p in splits[s]}
+    split_of = [split_by_path[p] for p in paths]
+
+    t0 = time.perf_counter()
+    pairs = near_pairs(hashes, args.threshold)
+    names = None if args.ignore_names else [source_name(p) for p in paths]
+    cluster_ids = clusters(len(paths), pairs, names)
+    kept = prune(split_of, cluster_ids, paths, args.keep)
+    summary = report(paths, split_of, cluster_ids, kept, args.threshold)
+    print(f"比较 {len(paths)} 张图片：{len(pairs)} 对相似，耗时 {time.perf_counter() - t0:.1f}s")
+
+    print(f"{'split':<8}{'图片':>8}{'簇内重复':>10}{'泄漏去掉':>10}{'保留':>8}")
+    for s in summary['images']:
+        print(f"{s:<8}{summary['images'][s]:>8}{summary['duplicates'][s]:>10}{summary['leaked'][s]:>10}"
+              f"{summary['kept'][s]:>8}")
+    print(f"重复簇 {summary['clusters']} 个；跨 split 的簇: "
+          + ('，'.join(f'{k} {v}' for k, v in summary['leakage_clusters'].items()) or '无'))
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=1)
+    if args.out:
+        path = write_split(args.out, data, paths, split_of, kept, summary)
+        print(f"去重后的数据集: {path}（python train.py --data {path}）")
+
+
+if __name__ == '__main__':
+    main()
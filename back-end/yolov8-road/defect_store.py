@@ -0,0 +1,231 @@
+"""
+缺陷位置库：SQLite + R-tree 空间索引
+
+- 服务端和批量工具把带 GPS 的检测结果写入这里
+- 同一类别、相距 DEDUPE_METERS 以内的报告合并为同一个缺陷（report_count 累加）
+- 支持矩形范围查询、半径查询、按网格统计数量
+"""
+import math
+import sqlite3
+import threading
+import time
+
+EARTH_RADIUS_M = 6371000.0
+# 同一个坑洞在不同照片中的 GPS 误差范围
+DEDUPE_METERS = 8.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS defects (
+    id INTEGER PRIMARY KEY,
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    class TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    report_count INTEGER NOT NULL DEFAULT 1,
+    source TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS defects_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+"""
+
+# R-tree 以 float32 存储（向外取整）的外包矩形，只能用相交条件做预筛选：
+# 用包含条件时，落在查询边界上或与边界相差不到 float32 精度的点会被漏掉。
+# 精确的边界判断在 defects 表的 lat / lon（双精度）上做
+RTREE_OVERLAP = "r.max_lat >= {} AND r.min_lat <= {} AND r.max_lon >= {} AND r.min_lon <= {}"
+EXACT_BBOX = "d.lat BETWEEN {} AND {} AND d.lon BETWEEN {} AND {}"
+
+
+def meters_to_degrees(meters, lat):
+    """把距离换算成纬度、经度方向的度数（用于 R-tree 预筛选的外包矩形）"""
+    dlat = meters / 111320.0
+    dlon = meters / (111320.0 * max(math.cos(math.radians(lat)), 1e-6))
+    return dlat, dlon
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """两点间球面距离（米）"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class DefectStore:
+    """线程安全的缺陷位置库（单连接 + 锁，WAL 模式）"""
+
+    def __init__(self, path='defects.db', dedupe_meters=DEDUPE_METERS):
+        self.path = path
+        self.dedupe_meters = dedupe_meters
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ---------- 写入 ----------
+
+    def _insert(self, lat, lon, cls, conf, source, now):
+        cur = self._conn.execute(
+            "INSERT INTO defects (lat, lon, class, confidence, source, first_seen, last_seen) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", (lat, lon, cls, conf, source, now, now))
+        self._conn.execute("INSERT INTO defects_rtree VALUES (?, ?, ?, ?, ?)",
+                           (cur.lastrowid, lat, lat, lon, lon))
+        return cur.lastrowid
+
+    def _find_duplicate(self, lat, lon, cls):
+        dlat, dlon = meters_to_degrees(self.dedupe_meters, lat)
+        rows = self._conn.execute(
+            "SELECT d.id, d.lat, d.lon FROM defects_rtree r JOIN defects d ON d.id = r.id "
+            "WHERE " + RTREE_OVERLAP.format('?', '?', '?', '?') + " AND d.class = ?",
+            (lat - dlat, lat + dlat, lon - dlon, lon + dlon, cls)).fetchall()
+        best = None
+        for row in rows:
+            dist = haversine(lat, lon, row['lat'], row['lon'])
+            if dist <= self.dedupe_meters and (best is None or dist < best[0]):
+                best = (dist, row['id'])
+        return best[1] if best else None
+
+    def add_report(self, lat, lon, cls, confidence, source=None):
+        """记录一次缺陷报告；附近已有同类缺陷时合并，返回缺陷 id"""
+        now = time.time()
+        with self._lock, self._conn:
+            dup = self._find_duplicate(lat, lon, cls)
+            if dup is not None:
+                self._conn.execute(
+                    "UPDATE defects SET report_count = report_count + 1, "
+                    "confidence = MAX(confidence, ?), last_seen = ? WHERE id = ?",
+                    (confidence, now, dup))
+                return dup
+            return self._insert(lat, lon, cls, confidence, source, now)
+
+    def add_detections(self, gps, detections, source=None):
+        """一张照片的检测结果：每个类别取最高置信度，按照片 GPS 记录"""
+        best = {}
+        for d in detections:
+            best[d['class']] = max(best.get(d['class'], 0.0), d['confidence'])
+        lat, lon = gps
+        return [self.add_report(lat, lon, cls, conf, source) for cls, conf in best.items()]
+
+    def bulk_insert(self, rows, source=None):
+        """批量导入 [(lat, lon, class, confidence), ...]，不做去重（用于导入/基准测试）"""
+        now = time.time()
+        with self._lock, self._conn:
+            for lat, lon, cls, conf in rows:
+                self._insert(lat, lon, cls, conf, source, now)
+
+    # ---------- 查询 ----------
+
+    def query_bbox(self, min_lat, min_lon, max_lat, max_lon, cls=None, limit=1000):
+        """矩形范围查询（含边界）：R-tree 相交预筛选，再按精确坐标过滤"""
+        sql = ("SELECT d.* FROM defects_rtree r JOIN defects d ON d.id = r.id WHERE "
+               + RTREE_OVERLAP.format('?', '?', '?', '?') + " AND " + EXACT_BBOX.format('?', '?', '?', '?'))
+        params = [min_lat, max_lat, min_lon, max_lon] * 2
+        if cls:
+            sql += " AND d.class = ?"
+            params.append(cls)
+        sql += " LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def query_radius(self, lat, lon, radius_m, cls=None, limit=1000):
+        """半径查询：R-tree 外包矩形预筛选，再按球面距离过滤，按距离排序"""
+        dlat, dlon = meters_to_degrees(radius_m, lat)
+        candidates = self.query_bbox(lat - dlat, lon - dlon, lat + dlat, lon + dlon, cls, limit=-1)
+        out = []
+        for row in candidates:
+            dist = haversine(lat, lon, row['lat'], row['lon'])
+            if dist <= radius_m:
+                row['distance_m'] = round(dist, 1)
+                out.append(row)
+        out.sort(key=lambda r: r['distance_m'])
+        return out[:limit]
+
+    def grid_counts(self, min_lat, min_lon, max_lat, max_lon, cell_deg=0.001, cls=None):
+        """按 cell_deg 大小的经纬度网格统计缺陷数量（0.001° 约 100 米）"""
+        sql = ("SELECT CAST((d.lat + 90) / :cell AS INTEGER) AS gy, CAST((d.lon + 180) / :cell AS INTEGER) AS gx, "
+               "d.class AS class, COUNT(*) AS defects, SUM(d.report_count) AS reports "
+               "FROM defects_rtree r JOIN defects d ON d.id = r.id WHERE "
+               + RTREE_OVERLAP.format(':min_lat', ':max_lat', ':min_lon', ':max_lon') + " AND "
+               + EXACT_BBOX.format(':min_lat', ':max_lat', ':min_lon', ':max_lon'))
+        params = {'cell': cell_deg, 'min_lat': min_lat, 'max_lat': max_lat, 'min_lon': min_lon, 'max_lon': max_lon}
+        if cls:
+            sql += " AND d.class = :cls"
+            params['cls'] = cls
+        sql += " GROUP BY gy, gx, d.class"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{
+            'cell_min_lat': round(row['gy'] * cell_deg - 90, 7),
+            'cell_min_lon': round(row['gx'] * cell_deg - 180, 7),
+            'cell_deg': cell_deg,
+            'class': row['class'],
+            'defects': row['defects'],
+            'reports': row['reports'],
+        } for row in rows]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM defects").fetchone()[0]
+
+
+# ---------- HTTP 查询接口（app.py / serve.py 共用）----------
+
+def _parse_bbox(value):
+    min_lat, min_lon, max_lat, max_lon = (float(v) for v in value.split(','))
+    return min_lat, min_lon, max_lat, max_lon
+
+
+def create_blueprint(store):
+    """
+    GET /defects?bbox=min_lat,min_lon,max_lat,max_lon[&class=pothole][&limit=1000]
+    GET /defects/near?lat=..&lon=..[&radius=50][&class=..]
+    GET /defects/grid?bbox=...[&cell=0.001][&class=..]
+    """
+    from flask import Blueprint, jsonify, request
+
+    bp = Blueprint('defects', __name__)
+
+    @bp.route('/defects')
+    def defects_bbox():
+        try:
+            bbox = _parse_bbox(request.args['bbox'])
+            limit = min(int(request.args.get('limit', 1000)), 10000)
+        except (KeyError, ValueError):
+            return jsonify({'error': 'bbox=min_lat,min_lon,max_lat,max_lon is required'}), 400
+        rows = store.query_bbox(*bbox, cls=request.args.get('class'), limit=limit)
+        return jsonify({'count': len(rows), 'defects': rows})
+
+    @bp.route('/defects/near')
+    def defects_near():
+        try:
+            lat = float(request.args['lat'])
+            lon = float(request.args['lon'])
+            radius = float(request.args.get('radius', 50))
+            limit = min(int(request.args.get('limit', 1000)), 10000)
+        except (KeyError, ValueError):
+            return jsonify({'error': 'lat and lon are required'}), 400
+        rows = store.query_radius(lat, lon, radius, cls=request.args.get('class'), limit=limit)
+        return jsonify({'count': len(rows), 'defects': rows})
+
+    @bp.route('/defects/grid')
+    def defects_grid():
+        try:
+            bbox = _parse_bbox(request.args['bbox'])
+            cell = float(request.args.get('cell', 0.001))
+        except (KeyError, ValueError):
+            return jsonify({'error': 'bbox=min_lat,min_lon,max_lat,max_lon is required'}), 400
+        if cell <= 0:
+            return jsonify({'error': 'cell must be positive'}), 400
+        cells = store.grid_counts(*bbox, cell_deg=cell, cls=request.args.get('class'))
+        return jsonify({'cells': cells})
+
+    return bp
@@ -0,0 +1,384 @@
+"""
+离线评估：推理一次、缓存原始预测，之后任意阈值下的指标都只需几秒
+
+- 预测阶段：对 data.yaml 中的一个 split 推理一次（低置信度下限 0.001、max_det 300，与 ultralytics val 相同），
+  所有图片的预测框和标注框拼接成 NumPy 数组（按图片的偏移量切分），压缩保存到 runs/eval/*.npz；
+  权重、推理参数和图片列表不变时直接读取缓存
+- 匹配阶段：每张图片按置信度从高到低贪心匹配（COCO 方式），一次得到 IoU 0.50:0.95 共 10 个阈值下
+  每个预测是否为 TP、每个标注框被匹配到的最高置信度。匹配顺序与置信度阈值无关，
+  所以任意置信度阈值下的结果都是同一组数组的前缀，不用重新匹配
+- 指标：各类别 AP50 / AP50-95（101 点插值）、PR 曲线、置信度网格上的 P / R / F1（向量化）、
+  F1 最优或达到目标精度的置信度阈值（线上 cracks / pothole 阈值的依据）、
+  混淆矩阵（不区分类别匹配，最后一行 / 列为背景）、按标注框面积（COCO small / medium / large）统计的召回率
+- NMS 的 IoU 在预测阶段固定（--nms-iou），改变它会生成新的预测缓存
+
+用法:
+  python evaluate.py --split test
+  python evaluate.py --split val --conf-grid 0.05:0.95:0.05 --target-precision 0.8 --out eval_val.json
+  python evaluate.py --data ./data/dedup/data.yaml --split test   # 去重后的数据集（见 dedup.py）
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from backends import DEFAULT_WEIGHTS, class_names, load_model, model_version
+from dedup import split_images
+from ingest import MODEL_IMGSZ, decode_file
+from render import result_to_numpy
+
+DEFAULT_EVAL_DIR = os.environ.get('EVAL_DIR', './runs/eval')
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+# COCO 面积分档（原图像素）
+SIZE_BUCKETS = (('small', 0, 32 ** 2), ('medium', 32 ** 2, 96 ** 2), ('large', 96 ** 2, np.inf))
+
+
+def label_path(image_path):
+    """.../images/x.jpg → .../labels/x.txt（与 ultralytics 相同）"""
+    sa, sb = f'{os.sep}images{os.sep}', f'{os.sep}labels{os.sep}'
+    return sb.join(image_path.rsplit(sa, 1)).rsplit('.', 1)[0] + '.txt'
+
+
+def read_labels(image_path, width, height):
+    """YOLO 标注 → (K,5) [cls, x1, y1, x2, y2]（原图像素）；多边形标注取外接框"""
+    boxes = []
+    path = label_path(image_path)
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                v = [float(x) for x in line.split()]
+                if len(v) == 5:
+                    cx, cy, w, h = v[1:]
+                    x1, y1, x2, y2 = cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2
+                elif len(v) > 5:
+                    xs, ys = v[1::2], v[2::2]
+                    x1, y1, x2, y2 = min(xs), min(ys), max(xs), max(ys)
+                else:
+                    continue
+                boxes.append((v[0], x1 * width, y1 * height, x2 * width, y2 * height))
+    return np.array(boxes, dtype=np.float32).reshape(-1, 5)
+
+
+class Predictions:
+    """
+    一个 split 的原始预测和标注
+    pred: (M,6) [x1, y1, x2, y2, conf, cls]，gt: (K,5) [cls, x1, y1, x2, y2]，
+    第 i 张图片为 pred[pred_off[i]:pred_off[i + 1]]，gt 同理
+    """
+
+    def __init__(self, files, sizes, pred, pred_off, gt, gt_off, names, meta):
+        self.files = list(files)
+        self.sizes = sizes
+        self.pred, self.pred_off = pred, pred_off
+        self.gt, self.gt_off = gt, gt_off
+        self.names = list(names)
+        self.meta = meta
+
+    def __len__(self):
+        return len(self.files)
+
+    def image(self, i):
+        return self.pred[self.pred_off[i]:self.pred_off[i + 1]], self.gt[self.gt_off[i]:self.gt_off[i + 1]]
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez_compressed(path + '.tmp.npz', files=np.array(self.files), sizes=self.sizes, pred=self.pred,
+                            pred_off=self.pred_off, gt=self.gt, gt_off=self.gt_off, names=np.array(self.names),
+                            meta=np.array(json.dumps(self.meta)))
+        os.replace(path + '.tmp.npz', path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            return cls(z['files'].tolist(), z['sizes'], z['pred'], z['pred_off'], z['gt'], z['gt_off'],
+                       z['names'].tolist(), json.loads(str(z['meta'])))
+
+
+def cache_path(weights, backend, split, files, params, eval_dir=DEFAULT_EVAL_DIR):
+    """按 (模型版本, 推理参数, 图片列表) 生成预测缓存文件名"""
+    h = hashlib.sha256(f"{model_version(weights, backend)}\0{json.dumps(params, sort_keys=True)}\0".encode())
+    for f in files:
+        h.update(f"{os.path.abspath(f)}\0".encode())
+    run = os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(weights))))
+    return os.path.join(eval_dir, f"{run}_{split}_{h.hexdigest()[:12]}.npz")
+
+
+def predict_split(model, files, params, batch=16, workers=None):
+    """推理整个 split，返回 Predictions（解码线程池预取，批量推理）"""
+    preds, gts, sizes = [], [], []
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(workers or os.cpu_count() or 4) as pool:
+        for start in range(0, len(files), batch):
+            chunk = files[start:start + batch]
+            decoded = list(pool.map(decode_file, chunk))
+            for path, d in zip(chunk, decoded):
+                if d is None:
+                    raise RuntimeError(f"无法解码评估图片: {path}")
+            results = model([d.image for d in decoded], stream=False, verbose=False, **params)
+            for path, d, r in zip(chunk, decoded, results):
+                preds.append(result_to_numpy(r).astype(np.float32))
+                gts.append(read_labels(path, *d.original_size))
+                sizes.append(d.original_size)
+            print(f"\r推理 {min(start + batch, len(files))}/{len(files)}", end='', flush=True)
+    print(f"\r推理 {len(files)} 张图片，耗时 {time.perf_counter() - t0:.1f}s")
+
+    def offsets(arrays):
+        return np.concatenate([[0], np.cumsum([len(a) for a in arrays])]).astype(np.int64)
+
+    return Predictions(files, np.array(sizes, dtype=np.int32).reshape(-1, 2),
+                       np.concatenate(preds).reshape(-1, 6) if preds else np.zeros((0, 6), np.float32), offsets(preds),
+                       np.concatenate(gts).reshape(-1, 5) if gts else np.zeros((0, 5), np.float32), offsets(gts),
+                       class_names(model), params)
+
+
+def iou_matrix(a, b):
+    """(n,4) × (k,4) xyxy → (n,k) IoU"""
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def match(preds, thresholds=IOU_THRESHOLDS):
+    """
+    每张图片按置信度从高到低，把预测匹配到同类别、IoU 最大且尚未匹配的标注框
+    返回 dict：tp (M,T) 每个预测在各 IoU 阈值下是否为 TP；gt_conf (T,K) 各标注框被匹配到的最高置信度（未匹配为 0）
+    """
+    T = len(thresholds)
+    tp = np.zeros((len(preds.pred), T), dtype=bool)
+    gt_conf = np.zeros((T, len(preds.gt)), dtype=np.float32)
+    rows = np.arange(T)
+    for i in range(len(preds)):
+        p, g = preds.image(i)
+        if not len(p) or not len(g):
+            continue
+        p0, g0 = preds.pred_off[i], preds.gt_off[i]
+        iou = iou_matrix(p[:, :4], g[:, 1:]) * (p[:, 5, None] == g[None, :, 0])
+        # 与任何同类标注框的 IoU 都低于最小阈值的预测在所有阈值下都是 FP，不进入循环
+        candidates = np.nonzero(iou.max(axis=1) >= thresholds[0])[0]
+        available = np.ones((T, len(g)), dtype=bool)
+        for j in candidates[np.argsort(-p[candidates, 4], kind='stable')]:
+            ok = (iou[j][None, :] >= thresholds[:, None]) & available
+            best = np.where(ok, iou[j][None, :], -1.0).argmax(axis=1)
+            hit = ok[rows, best]
+            tp[p0 + j, hit] = True
+            available[rows[hit], best[hit]] = False
+            # 按置信度降序匹配，第一次匹配到的就是最高置信度
+            gt_conf[rows[hit], g0 + best[hit]] = p[j, 4]
+    return {'tp': tp, 'gt_conf': gt_conf}
+
+
+def ap_per_class(preds, matched, nc):
+    """
+    返回 (ap (nc,T), curves)：101 点插值 AP；curves[c] 为 IoU=0.5 下的 (置信度, 精度, 召回率) 曲线
+    """
+    conf, cls = preds.pred[:, 4], preds.pred[:, 5].astype(int)
+    gt_cls = preds.gt[:, 0].astype(int)
+    points = np.linspace(0, 1, 101)
+    ap = np.zeros((nc, matched['tp'].shape[1]))
+    curves = []
+    for c in range(nc):
+        sel = np.nonzero(cls == c)[0]
+        n_gt = int((gt_cls == c).sum())
+        order = sel[np.argsort(-conf[sel], kind='stable')]
+        tpc = np.cumsum(matched['tp'][order], axis=0)
+        fpc = np.cumsum(~matched['tp'][order], axis=0)
+        recall = tpc / max(n_gt, 1)
+        precision = tpc / np.maximum(tpc + fpc, 1)
+        # 精度包络：每个召回率处取其后的最大精度
+        envelope = np.maximum.accumulate(precision[::-1], axis=0)[::-1]
+        for t in range(ap.shape[1]):
+            idx = np.searchsorted(recall[:, t], points, side='left')
+            ap[c, t] = np.where(idx < len(order), envelope[np.minimum(idx, len(order) - 1), t], 0.0).mean() \
+                if len(order) and n_gt else 0.0
+        curves.append((conf[order], precision[:, 0], recall[:, 0]))
+    return ap, curves
+
+
+def sweep(preds, matched, nc, grid, t=0):
+    """
+    置信度网格上各类别的 (precision, recall, f1)，形状均为 (nc, len(grid))，IoU 阈值为 IOU_THRESHOLDS[t]
+    置信度 >= g 的预测是按置信度排序后的前缀，直接用累计 TP 数计算
+    """
+    conf, cls = preds.pred[:, 4], preds.pred[:, 5].astype(int)
+    gt_cls = preds.gt[:, 0].astype(int)
+    grid = np.asarray(grid)
+    P, R = np.zeros((nc, len(grid))), np.zeros((nc, len(grid)))
+    for c in range(nc):
+        sel = np.nonzero(cls == c)[0]
+        order = sel[np.argsort(-conf[sel], kind='stable')]
+        tpc = np.concatenate([[0], np.cumsum(matched['tp'][order, t])])
+        n = np.searchsorted(-conf[order], -grid, side='right')
+        P[c] = np.where(n > 0, tpc[n] / np.maximum(n, 1), 0.0)
+        R[c] = tpc[n] / max(int((gt_cls == c).sum()), 1)
+    F1 = 2 * P * R / np.maximum(P + R, 1e-9)
+    return P, R, F1
+
+
+def size_recall(preds, matched, nc, conf, t=0):
+    """按标注框面积分档的召回率（置信度 >= conf，IoU 阈值 IOU_THRESHOLDS[t]），返回 {分档: (各类召回率, 各类标注数)}"""
+    gt_cls = preds.gt[:, 0].astype(int)
+    area = (preds.gt[:, 3] - preds.gt[:, 1]) * (preds.gt[:, 4] - preds.gt[:, 2])
+    found = matched['gt_conf'][t] >= max(conf, 1e-9)
+    out = {}
+    for name, lo, hi in SIZE_BUCKETS:
+        in_bucket = (area >= lo) & (area < hi)
+        counts = np.bincount(gt_cls[in_bucket], minlength=nc)
+        hits = np.bincount(gt_cls[in_bucket & found], minlength=nc)
+        out[name] = (hits / np.maximum(counts, 1), counts)
+    return out
+
+
+def confusion_matrix(preds, nc, conf=0.25, iou=0.5):
+    """
+    (nc+1, nc+1) 混淆矩阵：行为预测类别，列为真实类别，最后一行 / 列为背景
+    不区分类别匹配（与 ultralytics ConfusionMatrix 相同：按 IoU 从高到低，每个预测和标注框只匹配一次）
+    """
+    matrix = np.zeros((nc + 1, nc + 1), dtype=np.int64)
+    for i in range(len(preds)):
+        p, g = preds.image(i)
+        p = p[p[:, 4] >= conf]
+        pc, gc = p[:, 5].astype(int), g[:, 0].astype(int)
+        if not len(p) or not len(g):
+            np.add.at(matrix, (pc, nc), 1)
+            np.add.at(matrix, (nc, gc), 1)
+            continue
+        ious = iou_matrix(p[:, :4], g[:, 1:])
+        pi, gi = np.nonzero(ious > iou)
+        order = np.argsort(-ious[pi, gi], kind='stable')
+        pi, gi = pi[order], gi[order]
+        _, first = np.unique(pi, return_index=True)
+        pi, gi = pi[first], gi[first]
+        order = np.argsort(-ious[pi, gi], kind='stable')
+        _, first = np.unique(gi[order], return_index=True)
+        pi, gi = pi[order][first], gi[order][first]
+        np.add.at(matrix, (pc[pi], gc[gi]), 1)
+        np.add.at(matrix, (np.delete(pc, pi), nc), 1)
+        np.add.at(matrix, (nc, np.delete(gc, gi)), 1)
+    return matrix
+
+
+def parse_grid(spec):
+    """'0.05:0.95:0.05' 或 '0.25,0.4,0.5' → 数组"""
+    if ':' in spec:
+        start, stop, step = (float(v) for v in spec.split(':'))
+        return np.round(np.arange(start, stop + step / 2, step), 6)
+    return np.array([float(v) for v in spec.split(',')])
+
+
+def choose_thresholds(grid, P, R, F1, target_precision=None):
+    """各类别推荐的置信度阈值：F1 最大处；指定 target_precision 时取精度达标的最低阈值（召回率最高）"""
+    chosen = []
+    for c in range(P.shape[0]):
+        i = int(F1[c].argmax())
+        if target_precision is not None:
+            ok = np.nonzero(P[c] >= target_precision)[0]
+            i = int(ok[0]) if len(ok) else i
+        chosen.append(i)
+    return chosen
+
+
+def evaluate(preds, grid, eval_conf=None, target_precision=None):
+    """所有指标 → 报告 dict（eval_conf 为空时混淆矩阵和分档召回率使用各类推荐阈值的最小值）"""
+    nc = len(preds.names)
+    matched = match(preds)
+    ap, curves = ap_per_class(preds, matched, nc)
+    P, R, F1 = sweep(preds, matched, nc, grid)
+    chosen = choose_thresholds(grid, P, R, F1, target_precision)
+    if eval_conf is None:
+        eval_conf = float(min(grid[i] for i in chosen))
+    gt_cls = preds.gt[:, 0].astype(int)
+    classes = {}
+    for c, name in enumerate(preds.names):
+        i = chosen[c]
+        classes[name] = {
+            'instances': int((gt_cls == c).sum()),
+            'ap50': round(float(ap[c, 0]), 4), 'ap50_95': round(float(ap[c].mean()), 4),
+            'conf': float(grid[i]), 'precision': round(float(P[c, i]), 4), 'recall': round(float(R[c, i]), 4),
+            'f1': round(float(F1[c, i]), 4),
+            'sweep': {'conf': grid.tolist(), 'precision': P[c].round(4).tolist(), 'recall': R[c].round(4).tolist(),
+                      'f1': F1[c].round(4).tolist()},
+            # PR 曲线按 ~200 个点抽样，避免报告过大
+            'pr_curve': {k: v[::max(1, len(v) // 200)].round(4).tolist()
+                         for k, v in zip(('conf', 'precision', 'recall'), curves[c])},
+        }
+    buckets = size_recall(preds, matched, nc, eval_conf)
+    return {
+        'images': len(preds), 'predictions': len(preds.pred), 'meta': preds.meta,
+        'map50': round(float(ap[:, 0].mean()), 4), 'map50_95': round(float(ap.mean()), 4),
+        'classes': classes,
+        'eval_conf': eval_conf,
+        'size_recall': {b: {'recall': dict(zip(preds.names, r.round(4).tolist())),
+                            'instances': dict(zip(preds.names, n.tolist()))} for b, (r, n) in buckets.items()},
+        'confusion_matrix': {'labels': preds.names + ['background'],
+                             'matrix': confusion_matrix(preds, nc, eval_conf).tolist()},
+    }
+
+
+def print_report(report):
+    names = list(report['classes'])
+    print(f"{report['images']} 张图片，{report['predictions']} 个原始预测；"
+          f"mAP50 {report['map50']:.3f}，mAP50-95 {report['map50_95']:.3f}")
+    print(f"{'类别':<10}{'标注':>7}{'AP50':>8}{'AP50-95':>9}{'阈值':>7}{'P':>7}{'R':>7}{'F1':>7}")
+    for name, c in report['classes'].items():
+        print(f"{name:<10}{c['instances']:>7}{c['ap50']:>8.3f}{c['ap50_95']:>9.3f}{c['conf']:>7.2f}"
+              f"{c['precision']:>7.3f}{c['recall']:>7.3f}{c['f1']:>7.3f}")
+    print(f"\n按面积分档的召回率（conf >= {report['eval_conf']:.2f}，IoU 0.5）")
+    print(f"{'分档':<10}" + ''.join(f"{n:>16}" for n in names))
+    for bucket, v in report['size_recall'].items():
+        print(f"{bucket:<10}" + ''.join(f"{v['recall'][n]:>9.3f} ({v['instances'][n]:>4})" for n in names))
+    labels = report['confusion_matrix']['labels']
+    print(f"\n混淆矩阵（行 = 预测，列 = 真实，conf >= {report['eval_conf']:.2f}，IoU 0.5）")
+    print(f"{'':<12}" + ''.join(f"{n:>12}" for n in labels))
+    for label, row in zip(labels, report['confusion_matrix']['matrix']):
+        print(f"{label:<12}" + ''.join(f"{v:>12}" for v in row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="缓存预测的离线评估：mAP、PR 曲线、阈值扫描、混淆矩阵、分档召回率")
+    parser.add_argument('--weights', default=DEFAULT_WEIGHTS)
+    parser.add_argument('--backend', default=None, help='推理后端（默认读取 YOLO_BACKEND）')
+    parser.add_argument('--data', default='./data/data.yaml')
+    parser.add_argument('--split', default='test', choices=('train', 'val', 'test'))
+    parser.add_argument('--imgsz', type=int, default=MODEL_IMGSZ)
+    parser.add_argument('--nms-iou', type=float, default=0.7, help='预测阶段的 NMS IoU 阈值')
+    parser.add_argument('--batch', type=int, default=16)
+    parser.add_argument('--conf-grid', default='0.05:0.95:0.05', help='置信度阈值网格 start:stop:step 或逗号分隔')
+    parser.add_argument('--eval-conf', type=float, default=None, help='混淆矩阵和分档召回率的置信度阈值（默认取推荐阈值）')
+    parser.add_argument('--target-precision', type=float, default=None, help='推荐阈值取精度达到该值的最低置信度')
+    parser.add_argument('--eval-dir', default=DEFAULT_EVAL_DIR, help='预测缓存目录')
+    parser.add_argument('--refresh', action='store_true', help='忽略缓存重新推理')
+    parser.add_argument('--out', default=None, help='把完整报告（含 PR 曲线和阈值扫描）写到该 JSON 文件')
+    args = parser.parse_args()
+
+    splits, _ = split_images(args.data)
+    if args.split not in splits:
+        raise SystemExit(f"{args.data} 中没有 {args.split}")
+    files = splits[args.split]
+    params = {'imgsz': args.imgsz, 'conf': 0.001, 'iou': args.nms_iou, 'max_det': 300}
+    path = cache_path(args.weights, args.backend, args.split, files, params, args.eval_dir)
+    if os.path.exists(path) and not args.refresh:
+        preds = Predictions.load(path)
+        print(f"读取缓存的预测: {path}")
+    else:
+        preds = predict_split(load_model(args.weights, args.backend), files, params, args.batch)
+        preds.save(path)
+        print(f"预测已缓存: {path}")
+
+    t0 = time.perf_counter()
+    report = evaluate(preds, parse_grid(args.conf_grid), args.eval_conf, args.target_precision)
+    print(f"计算指标耗时 {time.perf_counter() - t0:.2f}s\n")
+    print_report(report)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,133 +1,145 @@
+import itertools
+import os
+import queue
+import threading
+import time
 import tkinter as tk
-from tkinter import filedialog, simpledialog
-from PIL import Image, ImageTk
+from collections import OrderedDict
+from tkinter import filedialog
+
 import cv2
-import numpy as np
-import os
-import io  # 关键：必须导入 io
+from PIL import Image, ImageTk
+
+from ingest import IMAGE_EXTS, decode_image
+from location import get_gps_from_bytes, open_in_google_maps
 
-from pred import pred
-from location import get_gps_coordinates, open_in_google_maps, open_in_apple_maps
+# 窗口先显示，模型在后台线程中加载（import pred 会加载 YOLO 模型）；
+# 检测、缩放、GPS 提取都在后台线程完成，主线程只负责把结果贴到界面上（Tk 只能在主线程操作）
+T_START = time.perf_counter()
 
 # 设置最大显示尺寸
 MAX_WIDTH = 600
 MAX_HEIGHT = 600
 
+# 图库模式：预先检测当前图片之后的 PREFETCH 张；最多缓存 CACHE_SIZE 张的显示结果
+PREFETCH = 3
+CACHE_SIZE = 16
+
 current_image_path = None
 current_gps = None
 
-def resize_image(img, max_width, max_height):
-    """调整 PIL Image 大小，保持宽高比"""
-    width, height = img.size
-    aspect_ratio = width / height
-    if aspect_ratio > 1:
-        new_width = min(width, max_width)
-        new_height = int(new_width / aspect_ratio)
-    else:
-        new_height = min(height, max_height)
-        new_width = int(new_height * aspect_ratio)
-    img.thumbnail((new_width, new_height), Image.Resampling.LANCZOS)
-    return img
+gallery = []            # 当前文件夹中的图片路径
+gallery_index = 0
+cache = OrderedDict()   # 路径 -> (原图 PIL, 结果 PIL, GPS)，LRU
+pending = {}            # 已提交、尚未完成的路径 -> 队列中的优先级（RUNNING = 后台线程正在检测）
+# cache / pending 由主线程和后台线程共用，读写都持有此锁
+state_lock = threading.Lock()
+RUNNING = -1
+requested_at = {}       # 路径 -> 用户要求显示的时间（统计感知延迟）
+tasks = queue.PriorityQueue()   # (优先级, 序号, 路径)：0 = 当前图片，1 = 预取
+results = queue.Queue()         # 后台线程 → 主线程
+_seq = itertools.count()
 
-def load_image():
-    global current_image_path, current_gps
-    file_path = filedialog.askopenfilename()
-    if not file_path:
-        return
 
-    try:
-        current_image_path = file_path
+def fit_display(img_bgr):
+    """BGR 数组 → 不超过显示尺寸的 PIL Image（保持宽高比，只缩小）"""
+    height, width = img_bgr.shape[:2]
+    scale = min(MAX_WIDTH / width, MAX_HEIGHT / height, 1.0)
+    if scale < 1.0:
+        img_bgr = cv2.resize(img_bgr, (max(1, round(width * scale)), max(1, round(height * scale))),
+                             interpolation=cv2.INTER_AREA)
+    return Image.fromarray(cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB))
 
-        # 读取文件字节
-        with open(file_path, 'rb') as f:
-            img_bytes = f.read()
-        if len(img_bytes) == 0:
-            print("❌ 文件为空")
-            return
-
-        file_ext = file_path.lower().split('.')[-1]
-        img = None
-
-        # 处理 HEIC/HEIF 格式
-        if file_ext in ['heic', 'heif']:
-            try:
-                import pillow_heif
-                pillow_heif.register_heif_opener()
-                pil_img = Image.open(io.BytesIO(img_bytes))
-                # 转换为 RGB（确保）
-                if pil_img.mode != 'RGB':
-                    pil_img = pil_img.convert('RGB')
-                img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
-                print("✅ HEIC 解码成功")
-            except Exception as e:
-                print(f"❌ HEIC 解码失败: {e}")
-                # HEIC 解码失败后不再尝试其他方法，因为 OpenCV 不支持 HEIC
-                return
-        else:
-            # 非 HEIC：先用 OpenCV 解码
-            nparr = np.frombuffer(img_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            if img is None:
-                # OpenCV 失败，尝试用 PIL
-                try:
-                    pil_img = Image.open(io.BytesIO(img_bytes))
-                    if pil_img.mode != 'RGB':
-                        pil_img = pil_img.convert('RGB')
-                    img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
-                    print("✅ PIL 解码成功（OpenCV 后备）")
-                except Exception as e:
-                    print(f"❌ PIL 解码也失败: {e}")
-                    return
-
-        if img is None:
-            print("❌ 无法解码图片")
-            return
+def detect_file(pred, file_path):
+    """后台线程：读取、解码、检测、提取 GPS，返回 (原图 PIL, 结果 PIL, GPS)"""
+    with open(file_path, 'rb') as f:
+        img_bytes = f.read()
+    if len(img_bytes) == 0:
+        raise ValueError("文件为空")
 
-        # 进行缺陷检测
-        process_frame(img)
+    # 解码（HEIC 自动识别；界面只显示 600px，按显示尺寸缩小解码）
+    decoded = decode_image(img_bytes, max(MAX_WIDTH, MAX_HEIGHT))
+    if decoded is None:
+        raise ValueError("无法解码图片")
 
-        # 提取 GPS 坐标
-        try:
-            gps = get_gps_coordinates(file_path)
-            if gps:
-                current_gps = gps
-                location_btn.config(state=tk.NORMAL)
-                print(f"✅ GPS 坐标: {gps[0]:.6f}, {gps[1]:.6f}")
-            else:
-                current_gps = None
-                location_btn.config(state=tk.DISABLED)
-                print("ℹ️ 图片无 GPS 信息")
-        except Exception as e:
-            print(f"⚠️ GPS 提取失败: {e}")
-            current_gps = None
-            location_btn.config(state=tk.DISABLED)
+    # 进行缺陷检测
+    orig, result = pred(decoded.image, stream=False)
+    if orig is None or result is None:
+        raise ValueError("检测返回空结果")
 
+    # 提取 GPS 坐标（失败不影响显示）
+    try:
+        gps = get_gps_from_bytes(img_bytes)
     except Exception as e:
-        print(f"❌ 加载图片时出错: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"⚠️ GPS 提取失败: {e}")
+        gps = None
+    return fit_display(orig), fit_display(result), gps
 
-def process_frame(img_bgr):
-    """调用 pred 进行检测，并更新界面"""
+def inference_worker():
+    """后台线程：加载模型，然后按优先级处理检测任务，结果放入 results 队列"""
+    t0 = time.perf_counter()
     try:
-        orig, result = pred(img_bgr, stream=False)
+        from pred import pred
     except Exception as e:
-        print(f"❌ 检测失败: {e}")
+        results.put(('model', f"模型加载失败: {e}"))
         return
+    results.put(('model', f"模型就绪（{time.perf_counter() - t0:.1f}s）"))
 
-    if orig is None or result is None:
-        print("❌ 检测返回空结果")
-        return
+    while True:
+        priority, _, path = tasks.get()
+        if path is None:
+            break
+        with state_lock:
+            # 已缓存、已完成，或同一路径已按更高优先级重新提交（这是旧的预取任务）时跳过
+            if path in cache or pending.get(path) != priority:
+                continue
+            pending[path] = RUNNING
+        try:
+            entry = detect_file(pred, path)
+        except Exception as e:
+            results.put(('error', path, str(e)))
+            continue
+        results.put(('done', path, entry))
 
-    # 转换为 RGB 用于显示
-    orig_rgb = cv2.cvtColor(orig, cv2.COLOR_BGR2RGB)
-    result_rgb = cv2.cvtColor(result, cv2.COLOR_BGR2RGB)
+def request(path, priority):
+    """
+    提交检测任务：已缓存、正在检测或已按相同 / 更高优先级排队的跳过；
+    已在队列中的预取任务被打开时按新优先级重新提交（旧任务出队时跳过）
+    """
+    with state_lock:
+        if path in cache or pending.get(path, priority + 1) <= priority:
+            return
+        pending[path] = priority
+    tasks.put((priority, next(_seq), path))
+
+def prefetch():
+    """预先检测图库中当前图片之后的几张"""
+    for i in range(gallery_index + 1, min(len(gallery), gallery_index + 1 + PREFETCH)):
+        request(gallery[i], 1)
 
-    orig_pil = Image.fromarray(orig_rgb)
-    result_pil = Image.fromarray(result_rgb)
+def open_image(path):
+    global current_image_path
+    current_image_path = path
+    requested_at[path] = time.perf_counter()
+    name = os.path.basename(path)
+    if len(gallery) > 1:
+        name = f"{name}  ({gallery_index + 1}/{len(gallery)})"
+    root.title(f"IntelliRoad Detect - {name}")
+    with state_lock:
+        cached = path in cache
+    if cached:
+        show(path)
+    else:
+        status_label.config(text=f"⏳ 检测中: {name}")
+        request(path, 0)
+    prefetch()
 
-    orig_pil = resize_image(orig_pil, MAX_WIDTH, MAX_HEIGHT)
-    result_pil = resize_image(result_pil, MAX_WIDTH, MAX_HEIGHT)
+def show(path):
+    """主线程：显示缓存中的结果"""
+    global current_gps
+    with state_lock:
+        cache.move_to_end(path)
+        orig_pil, result_pil, gps = cache[path]
 
     orig_tk = ImageTk.PhotoImage(orig_pil)
     result_tk = ImageTk.PhotoImage(result_pil)
@@ -140,11 +152,81 @@ def process_frame(img_bgr):
     pred_label.configure(image=result_tk, text="")
     pred_label.image = result_tk
 
+    current_gps = gps
+    location_btn.config(state=tk.NORMAL if gps else tk.DISABLED)
+    text = f"✅ {os.path.basename(path)}"
+    if path in requested_at:
+        text += f"  {(time.perf_counter() - requested_at.pop(path)) * 1000:.0f} ms"
+    text += f"  GPS: {gps[0]:.6f}, {gps[1]:.6f}" if gps else "  无 GPS 信息"
+    status_label.config(text=text)
+    print(text)
+
+def poll_results():
+    """主线程：定时取出后台线程的结果"""
+    while True:
+        try:
+            msg = results.get_nowait()
+        except queue.Empty:
+            break
+        if msg[0] == 'model':
+            model_label.config(text=msg[1])
+            print(msg[1])
+        elif msg[0] == 'done':
+            _, path, entry = msg
+            with state_lock:
+                pending.pop(path, None)
+                cache[path] = entry
+                while len(cache) > CACHE_SIZE:
+                    cache.popitem(last=False)
+            if path == current_image_path:
+                show(path)
+        else:
+            _, path, error = msg
+            with state_lock:
+                pending.pop(path, None)
+            if path == current_image_path:
+                status_label.config(text=f"❌ {os.path.basename(path)}: {error}")
+            print(f"❌ {path}: {error}")
+    root.after(30, poll_results)
+
+def load_image():
+    global gallery, gallery_index
+    file_path = filedialog.askopenfilename()
+    if not file_path:
+        return
+    gallery, gallery_index = [file_path], 0
+    open_image(file_path)
+
+def open_folder():
+    global gallery, gallery_index
+    folder = filedialog.askdirectory()
+    if not folder:
+        return
+    paths = sorted(os.path.join(folder, n) for n in os.listdir(folder) if n.lower().endswith(IMAGE_EXTS))
+    if not paths:
+        status_label.config(text="ℹ️ 文件夹中没有图片")
+        return
+    gallery, gallery_index = paths, 0
+    open_image(paths[0])
+
+def step(delta):
+    global gallery_index
+    if not gallery:
+        return
+    index = min(len(gallery) - 1, max(0, gallery_index + delta))
+    if index != gallery_index:
+        gallery_index = index
+        open_image(gallery[index])
+
 def go_to_location():
     if current_gps:
         lat, lon = current_gps
         open_in_google_maps(lat, lon)
 
+def on_exit():
+    tasks.put((-1, -1, None))
+    root.quit()
+
 # 创建主窗口
 root = tk.Tk()
 root.title("IntelliRoad Detect")
@@ -156,12 +238,28 @@ btn_frame.pack(side=tk.TOP, fill=tk.X)
 load_img_btn = tk.Button(btn_frame, text="Upload image", command=load_image)
 load_img_btn.pack(side=tk.LEFT, padx=10, pady=5)
 
+open_folder_btn = tk.Button(btn_frame, text="Open folder", command=open_folder)
+open_folder_btn.pack(side=tk.LEFT, padx=10, pady=5)
+
+prev_btn = tk.Button(btn_frame, text="◀ Prev", command=lambda: step(-1))
+prev_btn.pack(side=tk.LEFT, padx=5, pady=5)
+
+next_btn = tk.Button(btn_frame, text="Next ▶", command=lambda: step(1))
+next_btn.pack(side=tk.LEFT, padx=5, pady=5)
+
 location_btn = tk.Button(btn_frame, text="Go to location", command=go_to_location, state=tk.DISABLED)
 location_btn.pack(side=tk.LEFT, padx=10, pady=5)
 
-exit_btn = tk.Button(btn_frame, text="Exit", command=root.quit)
+exit_btn = tk.Button(btn_frame, text="Exit", command=on_exit)
 exit_btn.pack(side=tk.LEFT, padx=10, pady=5)
 
+model_label = tk.Label(btn_frame, text="⏳ 正在加载模型...", fg="#666666")
+model_label.pack(side=tk.RIGHT, padx=10, pady=5)
+
+# 状态栏
+status_label = tk.Label(root, text="", anchor="w", fg="#333333")
+status_label.pack(side=tk.BOTTOM, fill=tk.X, padx=5)
+
 # 显示区域
 show_frame = tk.Frame(root)
 show_frame.pack(side=tk.BOTTOM, fill=tk.BOTH, expand=True)
@@ -172,4 +270,13 @@ orig_label.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5, pady=5)
 pred_label = tk.Label(show_frame, text="Results", justify="center", anchor="center", bg="#f0f0f0")
 pred_label.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=5, pady=5)
 
-root.mainloop()
\ No newline at end of file
+# 左右方向键切换图库中的图片
+root.bind('<Left>', lambda e: step(-1))
+root.bind('<Right>', lambda e: step(1))
+root.protocol("WM_DELETE_WINDOW", on_exit)
+
+threading.Thread(target=inference_worker, name="inference", daemon=True).start()
+root.after(30, poll_results)
+root.after_idle(lambda: print(f"窗口就绪 {time.perf_counter() - T_START:.2f}s"))
+
+root.mainloop()
@@ -0,0 +1,348 @@
+"""
+推理路径：模型注册表、检测选项、单张图片检测和结果缓存（app.py 和 serve.py 的工作进程共用）
+
+只包含模型、动态批处理和结果缓存，不创建 Flask 应用、任务队列、解码线程池或缺陷位置库：
+serve.py 的每个工作进程只导入本模块，缺陷位置由前端进程统一写入（见 detect_bytes 的 recorder）。
+start() 在后台线程加载并预热模型，ready 表示就绪。
+"""
+import json
+import os
+import threading
+
+import cv2
+import numpy as np
+
+import metrics
+from ingest import MODEL_IMGSZ, decode_image, probe_size, scale_to_original
+from location import get_gps_from_bytes
+from metrics import BATCH_SIZE, DETECTIONS, ERRORS, STAGE_SECONDS
+from model_registry import ModelRegistry, parse_models
+from policy import batch_key, model_kwargs, parse_policy
+from policy import resolve as resolve_policy
+from profiling import maybe_profile
+from render import render, result_to_numpy
+from result_cache import ResultCache, make_key
+from tiling import DEFAULT_TILE, tiled_predict
+
+# ---------- 加载你的 YOLO 模型 ----------
+# 后端由环境变量 YOLO_BACKEND 选择（pytorch / onnx / onnx-int8 / openvino / openvino-int8）
+# 模型在后台线程中加载并预热（见 startup），HTTP 服务立即可用，/ready 报告是否就绪
+# MODELS="名称=权重路径[@后端],..." 加载多个模型，请求用 ?model=名称 选择（默认第一个）；
+# POST /models/<名称> 在线热切换权重（见 model_registry.py）。类别名称从模型读取
+WEIGHTS = "./runs/detect/yolov8n_v8_200e/weights/best.pt"
+MODELS = parse_models(os.environ.get('MODELS'), WEIGHTS)
+
+# ---------- 动态批处理配置（环境变量）----------
+# BATCH_MAX_SIZE=1 时关闭批处理，退回逐请求推理
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', '8'))
+BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', '5'))
+
+
+# ---------- 结果缓存配置（环境变量）----------
+# RESULT_CACHE_MB=0 时关闭缓存；RESULT_CACHE_DIR 设置后启用磁盘层
+RESULT_CACHE_MB = float(os.environ.get('RESULT_CACHE_MB', '256'))
+RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR') or None
+result_cache = ResultCache(int(RESULT_CACHE_MB * 1024 * 1024), RESULT_CACHE_DIR) if RESULT_CACHE_MB > 0 else None
+
+
+# ---------- 标注图片输出格式（环境变量，可被查询参数覆盖）----------
+# PNG 无损但编码慢、体积大；JPEG / WebP 按 OUTPUT_QUALITY 有损压缩
+OUTPUT_FORMAT = os.environ.get('OUTPUT_FORMAT', 'png')
+OUTPUT_QUALITY = int(os.environ.get('OUTPUT_QUALITY', '85'))
+OUTPUT_FORMATS = {
+    'png': ('.png', 'image/png'),
+    'jpeg': ('.jpg', 'image/jpeg'),
+    'webp': ('.webp', 'image/webp'),
+}
+
+
+def infer_batch(entry, imgs, **kwargs):
+    """用 entry（model_registry.ModelEntry）的模型一次前向推理一批图像，返回每张图像对应的 Results"""
+    if entry.serving:
+        # 预热时的推理不计入
+        BATCH_SIZE.observe(len(imgs))
+    with entry.lock:
+        return entry.model(imgs, stream=False, verbose=False, **kwargs)
+
+
+def run_model(entry, img, tiled=False, kwargs=None):
+    """
+    对单张图像推理：启用批处理时交给该模型的调度器（参数相同的请求才合并），否则直接调用模型
+    tiled=True 时切片推理（切片本身已批量送入模型，不经过调度器）
+    kwargs: 推理参数（imgsz、conf 等，见 policy.model_kwargs）
+    """
+    kwargs = kwargs or {}
+    if tiled:
+        with entry.lock:
+            return tiled_predict(entry.model, img, **kwargs)
+    if entry.batcher is not None:
+        return entry.batcher.predict(img, key=batch_key(kwargs))
+    with entry.lock:
+        return entry.model(img, stream=False, **kwargs)[0]
+
+def detections_to_json(dets, names, sx=1.0, sy=1.0):
+    """
+    把 (N,6) 检测数组（见 render.result_to_numpy）转为紧凑的检测列表
+    names: 类别名称列表；sx, sy: 坐标缩放到原图的系数（缩小解码时使用）
+    """
+    dets = dets.astype(float)
+    xyxy = (dets[:, :4] * (sx, sy, sx, sy)).round(1).tolist()
+    confs = dets[:, 4].round(3).tolist()
+    clss = dets[:, 5].astype(int).tolist()
+    return [
+        {'class': names[c], 'class_id': c, 'confidence': conf, 'box': box}
+        for box, conf, c in zip(xyxy, confs, clss)
+    ]
+
+def detect_options(args):
+    """
+    从查询参数解析检测选项：
+    resolution=full|reduced  标注图片的分辨率
+    tiled=1                  高分辨率切片推理（用于细小裂缝）
+    output=png|jpeg|webp     标注图片格式（默认 OUTPUT_FORMAT）
+    quality=1~100            JPEG / WebP 质量（默认 OUTPUT_QUALITY）
+    policy / imgsz / conf / iou / max_det / classes / half / budget_ms  推理策略（见 policy.py）
+    model=名称               使用的模型（默认 MODELS 中的第一个）
+    模型未知或推理参数无效时抛出 ValueError
+    """
+    model = args.get('model') or MODELS[0][0]
+    if model in registry:
+        names = registry.get(model).names
+    elif any(model == name for name, _, _ in MODELS):
+        # 启动期间提交的任务：模型还没加载，classes 只能用编号
+        names = None
+    else:
+        raise ValueError(f"未知模型: {model}")
+    output = args.get('output', OUTPUT_FORMAT).lower().replace('jpg', 'jpeg')
+    try:
+        quality = min(100, max(1, int(args.get('quality', OUTPUT_QUALITY))))
+    except ValueError:
+        quality = OUTPUT_QUALITY
+    return {
+        'resolution': args.get('resolution', 'full'),
+        'tiled': args.get('tiled', '0').lower() in ('1', 'true', 'yes'),
+        'output': output if output in OUTPUT_FORMATS else OUTPUT_FORMAT,
+        'quality': quality,
+        'model': model,
+        'policy': parse_policy(args, names),
+    }
+
+def resolve_options(img_bytes, options, entry):
+    """imgsz=auto 时按原图尺寸（只读文件头）、该模型的延迟统计和延迟预算确定输入尺寸"""
+    if options['policy'].get('imgsz') != 'auto':
+        return options
+    tile = DEFAULT_TILE if options['tiled'] else None
+    return {**options, 'policy': resolve_policy(options['policy'], probe_size(img_bytes), entry.latency, tile)}
+
+def encode_image(img, options):
+    """
+    编码标注图片，返回 memoryview：直接引用 imencode 的输出数组，不再 tobytes() 复制
+    """
+    ext = OUTPUT_FORMATS[options['output']][0]
+    params = []
+    if ext == '.jpg':
+        params = [cv2.IMWRITE_JPEG_QUALITY, options['quality']]
+    elif ext == '.webp':
+        params = [cv2.IMWRITE_WEBP_QUALITY, options['quality']]
+    _, encoded = cv2.imencode(ext, img, params)
+    return memoryview(encoded.reshape(-1))
+
+def output_mimetype(options):
+    return OUTPUT_FORMATS[options['output']][1]
+
+def decode_target(as_json, options):
+    """
+    解码分辨率：JSON 模式只需模型输入尺寸（策略指定的 imgsz，默认训练尺寸）；
+    图片模式默认全分辨率标注，resolution=reduced 时按模型输入尺寸缩小解码；
+    切片推理需要全分辨率
+    """
+    if options['tiled']:
+        return None
+    if as_json or options['resolution'] == 'reduced':
+        return options.get('policy', {}).get('imgsz') or MODEL_IMGSZ
+    return None
+
+def observe_speed(r, tracker, imgsz=MODEL_IMGSZ):
+    """记录 ultralytics 报告的单张图片预处理 / 推理 / NMS 耗时（毫秒），并计入 tracker 中该输入尺寸的延迟统计"""
+    speed = getattr(r, 'speed', None) or {}
+    total = 0.0
+    for key, stage in (('preprocess', 'preprocess'), ('inference', 'inference'), ('postprocess', 'nms')):
+        if speed.get(key) is None:
+            total = None
+            continue
+        STAGE_SECONDS.observe(speed[key] / 1000, stage=stage)
+        if total is not None:
+            total += speed[key]
+    if total is not None:
+        tracker.observe(imgsz, total)
+
+def collect_detections(entry, decoded, r, kwargs, tiled=False):
+    """模型输出 → ((N,6) 检测数组, 原图坐标下的检测列表)，并记录耗时和检测数指标"""
+    if not tiled:
+        observe_speed(r, entry.latency, kwargs.get('imgsz', MODEL_IMGSZ))
+    dets = result_to_numpy(r)
+    detections = detections_to_json(dets, entry.names, *scale_to_original(decoded))
+    for d in detections:
+        DETECTIONS.inc(**{'class': d['class']})
+    return dets, detections
+
+def run_detection(entry, decoded, as_json=False, options=None):
+    """
+    用 entry 的模型执行 YOLO 检测（decoded 为 ingest.DecodedImage），返回 (payload, detections)：
+    as_json=True 时 payload 为检测结果 dict（跳过绘图和编码），否则为编码后的标注图片（memoryview，
+    格式见 detect_options）；detections 为原图坐标下的检测列表
+    """
+    options = options or detect_options({})
+    tiled = options['tiled']
+    kwargs = model_kwargs(options['policy'], entry.half)
+    img = decoded.image
+    # model: 含批处理排队等待的总耗时；preprocess / inference / nms 为模型内部各阶段
+    with STAGE_SECONDS.time(stage='model'):
+        r = run_model(entry, img, tiled, kwargs)
+    dets, detections = collect_detections(entry, decoded, r, kwargs, tiled)
+    if as_json:
+        width, height = decoded.original_size
+        # policy: 实际使用的推理参数（auto 已确定尺寸，不支持的 half 已去掉）
+        return {'width': width, 'height': height, 'model': entry.name, 'policy': kwargs,
+                'detections': detections}, detections
+    # 解码出的图像只属于本次请求，直接在上面绘制
+    with STAGE_SECONDS.time(stage='render'):
+        result_img = render(img, dets, entry.names)
+    with STAGE_SECONDS.time(stage='encode'):
+        encoded = encode_image(result_img, options)
+    return encoded, detections
+
+def error_body(message):
+    return json.dumps({'error': message}).encode()
+
+def detect_bytes(img_bytes, filename, as_json, options, recorder=None, profile=None):
+    """
+    同步检测一张上传图片（/detect、异步任务和 serve.py 的工作进程共用）
+    recorder(gps, detections, source): 记录带 GPS 的检测结果（见 record_defects），为 None 时不记录
+    profile: 为 dict 时按 PROFILE_SAMPLE 抽样或 profile['header']（X-Profile 请求头）剖析本次检测，
+             剖析结果的文件前缀写入 profile['path']；None 时不剖析
+    返回 (http 状态码, mimetype, body)
+    """
+    # 注册表只会替换模型、不会删除，检查之后 acquire 不会失败
+    if options['model'] not in registry:
+        return 400, 'application/json', error_body(f"Model not loaded: {options['model']}")
+    # 整个请求使用同一个模型版本；期间发生热切换时旧版本等本请求结束才释放
+    with registry.acquire(options['model']) as entry:
+        if profile is None:
+            return detect_with_model(entry, img_bytes, filename, as_json, options, recorder)
+        # 剖析本请求实际持有的模型版本；动态批处理时推理在它的调度线程中执行，一并采样
+        threads = [entry.batcher.thread_id] if entry.batcher is not None else []
+        with maybe_profile('detect', profile.get('header'), threads) as profiled:
+            result = detect_with_model(entry, img_bytes, filename, as_json, options, recorder)
+        profile.update(profiled)
+        return result
+
+def detect_with_model(entry, img_bytes, filename, as_json, options, recorder=None):
+    """detect_bytes 的实现，entry 为本次请求持有的模型版本"""
+    options = resolve_options(img_bytes, options, entry)
+    target_size = decode_target(as_json, options)
+
+    # ---------- 重复上传直接命中缓存，跳过解码和推理 ----------
+    cache_key = None
+    if result_cache is not None:
+        cache_key = make_key(img_bytes, entry.version, {'json': as_json, 'target_size': target_size, **options})
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            metrics.CACHE_HITS.inc()
+            return (200, *cached)
+
+    # ---------- 图像解码（按需缩小分辨率）----------
+    decoded = decode_image(img_bytes, target_size)
+    if decoded is None:
+        # 此时图片彻底无法解析
+        return 400, 'application/json', error_body('Invalid image file - cannot decode with both PIL and OpenCV')
+
+    try:
+        payload, detections = run_detection(entry, decoded, as_json, options)
+    except Exception as e:
+        print(f"YOLO 检测失败: {e}")
+        ERRORS.inc(type='inference')
+        return 500, 'application/json', error_body(f'Detection failed: {str(e)}')
+
+    # 直接从上传字节中读取 GPS（只解析 GPS IFD），并记录缺陷位置
+    with STAGE_SECONDS.time(stage='gps'):
+        gps = record_defects(img_bytes, detections, filename, recorder)
+
+    if as_json:
+        payload['gps'] = gps
+        mimetype, body = 'application/json', json.dumps(payload).encode()
+    else:
+        mimetype, body = output_mimetype(options), payload
+    if cache_key is not None:
+        result_cache.put(cache_key, mimetype, body)
+    return 200, mimetype, body
+
+def record_defects(img_bytes, detections, source=None, recorder=None):
+    """
+    提取上传图片的 GPS，有检测结果时交给 recorder(gps, detections, source) 记录
+    （app.py 为 DefectStore.add_detections；serve.py 的工作进程收集后由前端进程写入）；返回 GPS 或 None
+    """
+    gps = get_gps_from_bytes(img_bytes)
+    if gps and detections and recorder is not None:
+        recorder(gps, detections, source)
+    return gps
+
+# ---------- 启动：后台加载模型并预热 ----------
+# 首次推理要初始化计算图、分配内存、选择算子实现，预热后第一个真实请求就是正常速度
+# WARMUP_RUNS=0 时跳过预热；WARMUP_SIZES 为预热输入尺寸（宽x高），
+# 默认覆盖方图和手机横拍/竖拍/16:9 缩放到 416 后的输入形状
+WARMUP_RUNS = int(os.environ.get('WARMUP_RUNS', '2'))
+WARMUP_SIZES = os.environ.get('WARMUP_SIZES', '416x416,416x312,312x416,416x234')
+
+ready = threading.Event()
+startup_info = {'state': 'starting'}
+metrics.MODEL_READY.set(0)
+
+def warmup(entry):
+    """预热一个模型（启动和热切换时在发布前调用）"""
+    if WARMUP_RUNS <= 0:
+        return
+    sizes = [tuple(int(v) for v in size.split('x')) for size in WARMUP_SIZES.split(',') if size]
+    for width, height in sizes:
+        img = np.zeros((height, width, 3), dtype=np.uint8)
+        for _ in range(WARMUP_RUNS):
+            r = infer_batch(entry, [img])[0]
+        # 预热的耗时作为 imgsz=auto 的初始估计
+        speed = [(getattr(r, 'speed', None) or {}).get(k) for k in ('preprocess', 'inference', 'postprocess')]
+        if None not in speed:
+            entry.latency.observe(MODEL_IMGSZ, sum(speed))
+        if entry.batcher is not None:
+            # 动态批处理的满批形状
+            infer_batch(entry, [img] * BATCH_MAX_SIZE)
+
+    # 解码、绘制、PNG 编码路径也各走一遍（PIL 插件加载、字体尺寸缓存等）
+    img = np.full((MODEL_IMGSZ, MODEL_IMGSZ, 3), 127, dtype=np.uint8)
+    _, jpeg = cv2.imencode('.jpg', img)
+    decode_image(jpeg.tobytes(), MODEL_IMGSZ)
+    render(img, np.array([[10, 10, 100, 100, 0.5, c] for c in range(len(entry.names))]), entry.names)
+    cv2.imencode('.png', img)
+
+
+registry = ModelRegistry(infer_batch, warmup, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
+
+def startup():
+    try:
+        entries = [registry.load(name, weights, backend) for name, weights, backend in MODELS]
+    except Exception as e:
+        startup_info.update(state='failed', error=str(e))
+        print(f"模型加载失败: {e}")
+        return
+    load_s = sum(e.stats['load_s'] for e in entries)
+    warmup_s = sum(e.stats['warmup_s'] for e in entries)
+    startup_info.update(state='ready', load_s=round(load_s, 2), warmup_s=round(warmup_s, 2),
+                        models=[e.name for e in entries])
+    print(f"模型就绪（{', '.join(e.name for e in entries)}）：加载 {load_s:.2f}s，预热 {warmup_s:.2f}s")
+    metrics.MODEL_READY.set(1)
+    ready.set()
+
+
+def start():
+    """在后台线程加载并预热 MODELS 中的所有模型，返回该线程"""
+    thread = threading.Thread(target=startup, name="model-startup", daemon=True)
+    thread.start()
+    return thread
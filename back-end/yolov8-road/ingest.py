@@ -0,0 +1,130 @@
+"""
+图像解码（服务端和 GUI 共用）
+
+- JPEG 按目标分辨率缩小解码（PIL draft，DCT 域 1/2、1/4、1/8 缩放），YOLO 只需要 416px 输入，
+  没必要先解出 12MP 全图再缩小
+- 仅在遇到 HEIC/HEIF 时才导入 pillow_heif
+- 按 EXIF Orientation 旋转
+- 直接输出 BGR（模型和 OpenCV 绘图使用的顺序），就地转换颜色通道，不产生额外的全图副本
+"""
+import io
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+from metrics import DECODE_SECONDS, ERRORS
+
+# 模型训练输入尺寸（train.py 中 imgsz=416）
+MODEL_IMGSZ = 416
+
+# 目录 / zip 压缩包中按扩展名识别的图片文件
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.heic', '.heif', '.tif', '.tiff')
+
+# image: BGR 数组；original_size: 原图 (宽, 高)（已考虑 EXIF 旋转）
+DecodedImage = namedtuple('DecodedImage', ['image', 'original_size'])
+
+_HEIF_BRANDS = (b'heic', b'heix', b'hevc', b'hevx', b'heim', b'heis', b'mif1', b'msf1', b'avif')
+_heif_registered = False
+
+
+def is_heif(buf):
+    """根据 ftyp 文件头判断是否为 HEIC/HEIF"""
+    head = bytes(buf[:12])
+    return len(head) >= 12 and head[4:8] == b'ftyp' and head[8:12] in _HEIF_BRANDS
+
+
+def register_heif():
+    """按需注册 pillow_heif（只在遇到 HEIC/HEIF 时调用）"""
+    global _heif_registered
+    if not _heif_registered:
+        import pillow_heif
+        pillow_heif.register_heif_opener()
+        _heif_registered = True
+
+
+def _draft_size(width, height, target_size):
+    """让长边不小于 target_size 的 draft 请求尺寸（PIL 会取满足条件的最大缩放倍数）"""
+    if width >= height:
+        return target_size, max(1, round(target_size * height / width))
+    return max(1, round(target_size * width / height)), target_size
+
+
+def _swapped(orientation):
+    # EXIF Orientation 5~8 表示旋转 90/270 度，宽高互换
+    return orientation in (5, 6, 7, 8)
+
+
+def decode_image(buf, target_size=None):
+    """
+    字节（bytes / memoryview）→ DecodedImage
+    target_size: 解码后长边的最小值；None 表示全分辨率解码
+    无法解码时返回 None
+    """
+    t0 = time.perf_counter()
+    try:
+        if is_heif(buf):
+            register_heif()
+        pil_image = Image.open(io.BytesIO(buf))
+
+        width, height = pil_image.size
+        orientation = pil_image.getexif().get(0x0112, 1)
+        original_size = (height, width) if _swapped(orientation) else (width, height)
+
+        # 缩小解码（仅 JPEG 支持，其他格式 draft 无效果）
+        if target_size and max(width, height) > target_size:
+            pil_image.draft('RGB', _draft_size(width, height, target_size))
+
+        # EXIF 方向校正（不需要旋转时不会复制）
+        ImageOps.exif_transpose(pil_image, in_place=True)
+
+        if pil_image.mode != 'RGB':
+            pil_image = pil_image.convert('RGB')
+
+        # RGB → BGR 就地转换，只有 np.array 这一次拷贝
+        img = np.array(pil_image)
+        pil_image.close()
+        cv2.cvtColor(img, cv2.COLOR_RGB2BGR, dst=img)
+        DECODE_SECONDS.observe(time.perf_counter() - t0, decoder='pil')
+        return DecodedImage(img, original_size)
+
+    except Exception as e:
+        print(f"PIL 解码失败: {e}")
+        ERRORS.inc(type='pil_decode')
+
+    # 回退方案：直接使用 OpenCV 的 imdecode
+    t0 = time.perf_counter()
+    img = cv2.imdecode(np.frombuffer(buf, np.uint8), cv2.IMREAD_COLOR)
+    DECODE_SECONDS.observe(time.perf_counter() - t0, decoder='opencv')
+    if img is None:
+        ERRORS.inc(type='decode')
+        return None
+    return DecodedImage(img, (img.shape[1], img.shape[0]))
+
+
+def probe_size(buf):
+    """只读文件头获取原图 (宽, 高)（已考虑 EXIF 旋转），不解码像素；无法识别时返回 None"""
+    try:
+        if is_heif(buf):
+            register_heif()
+        with Image.open(io.BytesIO(buf)) as pil_image:
+            width, height = pil_image.size
+            orientation = pil_image.getexif().get(0x0112, 1)
+    except Exception:
+        return None
+    return (height, width) if _swapped(orientation) else (width, height)
+
+
+def decode_file(path, target_size=None):
+    """从文件解码，参数同 decode_image"""
+    with open(path, 'rb') as f:
+        return decode_image(f.read(), target_size)
+
+
+def scale_to_original(decoded):
+    """解码图像坐标 → 原图坐标的缩放系数 (sx, sy)"""
+    h, w = decoded.image.shape[:2]
+    ow, oh = decoded.original_size
+    return ow / w, oh / h
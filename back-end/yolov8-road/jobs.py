@@ -0,0 +1,250 @@
+"""
+异步检测任务队列
+
+- 提交后立即返回任务 id，后台工作线程逐张图片处理
+- 每个客户端一个 FIFO 队列，工作线程轮流从各客户端取图片，
+  一次提交几十张图片的客户端不会让其他用户一直排队
+- 排队图片总数超过 max_queued，或单个客户端超过 max_per_client 时拒绝（HTTP 429）
+- 已完成的任务保留 ttl 秒后清理；结果（标注图片等）总大小超过 max_result_bytes 时
+  提前清理最早完成的任务。提交、查询任务时和工作线程空闲时（每 purge_interval 秒）都会清理，
+  空闲的服务也会释放内存
+"""
+import collections
+import json
+import statistics
+import threading
+import time
+import uuid
+
+
+class QueueFull(Exception):
+    """队列已满，调用方应稍后重试"""
+
+
+def result_size(result):
+    """一张图片结果 (状态码, mimetype, body) 的字节数；body 为 bytes 或 memoryview"""
+    body = result[2]
+    return body.nbytes if isinstance(body, memoryview) else len(body)
+
+
+class Job:
+    """一次提交（一张或多张图片）"""
+
+    def __init__(self, client, items, options):
+        self.id = uuid.uuid4().hex
+        self.client = client
+        self.files = [name for name, _ in items]
+        self.options = options
+        self.status = 'queued'
+        self.results = [None] * len(items)   # 每张图片: (http 状态码, mimetype, body)
+        self.completed = 0
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.version = 0
+        # 已完成图片的结果总字节数
+        self.result_bytes = 0
+
+    def to_dict(self):
+        items = []
+        for i, name in enumerate(self.files):
+            res = self.results[i]
+            if res is None:
+                items.append({'file': name, 'status': 'pending'})
+            else:
+                items.append({'file': name, 'status': 'done' if res[0] == 200 else 'error', 'code': res[0]})
+        return {
+            'id': self.id,
+            'status': self.status,
+            'total': len(self.files),
+            'completed': self.completed,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'items': items,
+        }
+
+
+class JobQueue:
+    """
+    有界任务队列 + 工作线程
+    process_fn(filename, img_bytes, options) -> (http 状态码, mimetype, body)
+    """
+
+    def __init__(self, process_fn, workers=2, max_queued=64, max_per_client=16, ttl=600,
+                 max_result_bytes=256 * 1024 * 1024, purge_interval=10.0):
+        self.process_fn = process_fn
+        self.max_queued = max_queued
+        self.max_per_client = max_per_client
+        self.ttl = ttl
+        self.max_result_bytes = max_result_bytes
+        self.purge_interval = purge_interval
+        self._jobs = {}
+        # 所有保留中任务的结果总字节数
+        self._result_bytes = 0
+        self._clients = collections.OrderedDict()   # client -> deque[(job, index, bytes, 入队时间)]
+        self._queued = 0
+        self._running = 0
+        self._cond = threading.Condition()
+        self._updates = threading.Condition()
+        self._closed = False
+        self._counters = collections.Counter()
+        self._wait_ms = collections.deque(maxlen=1000)
+        self._run_ms = collections.deque(maxlen=1000)
+        self._threads = [threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+        for t in self._threads:
+            t.start()
+
+    # ---------- 提交 / 查询 ----------
+
+    def submit(self, client, items, options=None):
+        """items: [(filename, img_bytes)]；队列已满时抛出 QueueFull"""
+        if not items:
+            raise ValueError("no images")
+        with self._cond:
+            self._purge()
+            pending = len(self._clients.get(client, ()))
+            if self._queued + len(items) > self.max_queued or pending + len(items) > self.max_per_client:
+                self._counters['rejected'] += 1
+                raise QueueFull()
+            job = Job(client, items, options or {})
+            self._jobs[job.id] = job
+            now = time.perf_counter()
+            q = self._clients.setdefault(client, collections.deque())
+            q.extend((job, i, buf, now) for i, (_, buf) in enumerate(items))
+            self._queued += len(items)
+            self._counters['jobs_submitted'] += 1
+            self._counters['images_submitted'] += len(items)
+            self._cond.notify(len(items))
+        return job
+
+    def get(self, job_id):
+        with self._cond:
+            self._purge()
+            return self._jobs.get(job_id)
+
+    def wait_update(self, job, version, timeout=15.0):
+        """阻塞到 job.version 变化或超时，返回当前 version（用于状态推送）"""
+        with self._updates:
+            self._updates.wait_for(lambda: job.version != version, timeout)
+            return job.version
+
+    def position(self, job):
+        """任务第一张未处理图片前还有多少张图片在排队（轮询调度下的近似值）"""
+        with self._cond:
+            q = self._clients.get(job.client)
+            if not q:
+                return 0
+            ahead = next((k for k, (j, _, _, _) in enumerate(q) if j is job), None)
+            if ahead is None:
+                return 0
+            # 其他客户端每轮各处理一张
+            others = sum(min(len(oq), ahead + 1) for c, oq in self._clients.items() if c != job.client)
+            return ahead + others
+
+    def metrics(self):
+        with self._cond:
+            states = collections.Counter(j.status for j in self._jobs.values())
+            out = {
+                'queued_images': self._queued,
+                'running_images': self._running,
+                'max_queued': self.max_queued,
+                'result_bytes': self._result_bytes,
+                'max_result_bytes': self.max_result_bytes,
+                'clients_waiting': len(self._clients),
+                'workers': len(self._threads),
+                'jobs': dict(states),
+                **self._counters,
+            }
+            waits, runs = list(self._wait_ms), list(self._run_ms)
+        for name, values in (('queue_wait_ms', waits), ('run_ms', runs)):
+            if values:
+                values.sort()
+                out[name] = {
+                    'mean': round(statistics.mean(values), 1),
+                    'p95': round(values[min(len(values) - 1, int(len(values) * 0.95))], 1),
+                    'max': round(values[-1], 1),
+                }
+        return out
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout=5)
+
+    # ---------- 内部 ----------
+
+    def _purge(self):
+        """
+        清理超过 ttl 的已完成任务；结果总大小仍超过 max_result_bytes 时，
+        按完成时间从早到晚继续清理已完成的任务（调用方持有 _cond）
+        """
+        cutoff = time.time() - self.ttl
+        finished = sorted((j for j in self._jobs.values() if j.finished), key=lambda j: j.finished)
+        for job in finished:
+            if job.finished >= cutoff and self._result_bytes <= self.max_result_bytes:
+                break
+            if job.finished >= cutoff:
+                self._counters['jobs_evicted'] += 1
+            del self._jobs[job.id]
+            self._result_bytes -= job.result_bytes
+
+    def _next(self):
+        """轮询各客户端取下一张图片（调用方持有 _cond）"""
+        client, q = next(iter(self._clients.items()))
+        item = q.popleft()
+        del self._clients[client]
+        if q:
+            # 该客户端还有图片，排到队尾
+            self._clients[client] = q
+        self._queued -= 1
+        self._running += 1
+        return item
+
+    def _notify(self, job):
+        with self._updates:
+            job.version += 1
+            self._updates.notify_all()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                if not self._cond.wait_for(lambda: self._clients or self._closed, self.purge_interval):
+                    # 空闲时定期清理过期的结果
+                    self._purge()
+                    continue
+                if self._closed:
+                    return
+                job, index, buf, queued_at = self._next()
+                if job.started is None:
+                    job.started = time.time()
+                    job.status = 'running'
+            self._notify(job)
+
+            t0 = time.perf_counter()
+            self._wait_ms.append((t0 - queued_at) * 1000)
+            try:
+                result = self.process_fn(job.files[index], buf, job.options)
+            except Exception as e:
+                result = (500, 'application/json', json.dumps({'error': f'Detection failed: {e}'}).encode())
+            self._run_ms.append((time.perf_counter() - t0) * 1000)
+
+            with self._cond:
+                job.results[index] = result
+                size = result_size(result)
+                job.result_bytes += size
+                self._result_bytes += size
+                job.completed += 1
+                self._running -= 1
+                self._counters['images_completed'] += 1
+                if result[0] != 200:
+                    self._counters['images_failed'] += 1
+                if job.completed == len(job.files):
+                    job.status = 'done'
+                    job.finished = time.time()
+                    self._counters['jobs_completed'] += 1
+                    self._purge()
+            self._notify(job)
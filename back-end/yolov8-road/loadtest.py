@@ -0,0 +1,143 @@
+"""
+压力测试：向 /detect 并发发送图片，统计 req/s 与 p50/p95/p99 延迟
+
+用法:
+  对已有服务测试:  python loadtest.py --url http://127.0.0.1:5001 --concurrency 8
+  对比不同进程数:  python loadtest.py --spawn-workers 1,2,4 --concurrency 8
+"""
+import argparse
+import glob
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+
+def encode_multipart(filename, data):
+    """构造只含一个 file 字段的 multipart/form-data 请求体"""
+    boundary = uuid.uuid4().hex
+    head = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f'Content-Type: application/octet-stream\r\n\r\n'
+    ).encode()
+    body = head + data + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def percentile(values, q):
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+def wait_for_server(url, timeout=300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            # /ready 在所有推理进程预热完成后才返回 200
+            with urllib.request.urlopen(f'{url}/ready', timeout=2) as resp:
+                if resp.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.5)
+    return False
+
+
+def run_load(url, payloads, concurrency, total, as_json):
+    """concurrency 个线程共发送 total 个请求"""
+    endpoint = f'{url}/detect' + ('?format=json' if as_json else '')
+    latencies, errors = [], []
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            body, ctype = payloads[i % len(payloads)]
+            req = urllib.request.Request(endpoint, data=body, headers={'Content-Type': ctype})
+            t0 = time.perf_counter()
+            try:
+                with urllib.request.urlopen(req, timeout=300) as resp:
+                    resp.read()
+                ok = True
+            except urllib.error.HTTPError as e:
+                ok = False
+                err = e.code
+            except urllib.error.URLError as e:
+                ok = False
+                err = str(e.reason)
+            dt = time.perf_counter() - t0
+            with lock:
+                if ok:
+                    latencies.append(dt)
+                else:
+                    errors.append(err)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, latencies, errors
+
+
+def report(label, elapsed, latencies, errors):
+    if not latencies:
+        print(f"{label:<12} 全部请求失败: {errors[:5]}")
+        return
+    ms = [x * 1000 for x in latencies]
+    print(f"{label:<12} {len(ms) / elapsed:8.2f} req/s   p50 {percentile(ms, 50):7.1f} ms   "
+          f"p95 {percentile(ms, 95):7.1f} ms   p99 {percentile(ms, 99):7.1f} ms   errors {len(errors)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/detect 压力测试")
+    parser.add_argument('--url', default='http://127.0.0.1:5001')
+    parser.add_argument('--images', default='./data/test/images/*.jpg')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--json', action='store_true', help='请求 JSON 结果而不是 PNG')
+    parser.add_argument('--spawn-workers', default='', help='逗号分隔的进程数列表，逐个启动 serve.py 进行对比')
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(args.images))[:32]
+    if not paths:
+        print(f"没有找到测试图片: {args.images}")
+        return
+    payloads = []
+    for p in paths:
+        with open(p, 'rb') as f:
+            payloads.append(encode_multipart(p.split('/')[-1], f.read()))
+
+    if not args.spawn_workers:
+        if not wait_for_server(args.url, timeout=10):
+            print(f"服务不可用: {args.url}")
+            return
+        report('server', *run_load(args.url, payloads, args.concurrency, args.requests, args.json))
+        return
+
+    port = args.url.rsplit(':', 1)[-1]
+    for n in [int(x) for x in args.spawn_workers.split(',') if x.strip()]:
+        proc = subprocess.Popen([sys.executable, 'serve.py', '--workers', str(n), '--port', port])
+        try:
+            if not wait_for_server(args.url):
+                print(f"workers={n} 启动超时")
+                continue
+            # 预热每个进程
+            run_load(args.url, payloads, n, n * 2, args.json)
+            report(f'workers={n}', *run_load(args.url, payloads, args.concurrency, args.requests, args.json))
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,37 @@
-import webbrowser
-import exifread
+import io
 import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
 
+from PIL import Image
 
-def get_gps_coordinates(image_path):
+from ingest import is_heif, register_heif
+
+# EXIF 中 GPS IFD 的标签号及其中的经纬度字段
+GPS_IFD = 0x8825
+GPS_LATITUDE_REF, GPS_LATITUDE, GPS_LONGITUDE_REF, GPS_LONGITUDE = 1, 2, 3, 4
+
+# JPEG 的 EXIF 位于文件开头的 APP1 段，批量读取文件时只读这么多字节
+JPEG_HEAD_BYTES = 256 * 1024
+
+
+def get_gps_coordinates(image_path, verbose=True):
     """
     从图片中提取GPS坐标信息
+    image_path 可以是文件路径，也可以是已打开的二进制文件对象（如 io.BytesIO）
+    verbose=False 时不打印提示（批量处理时使用）
     """
-    with open(image_path, 'rb') as f:
-        tags = exifread.process_file(f)
+    import exifread
+
+    if hasattr(image_path, 'read'):
+        tags = exifread.process_file(image_path)
+    else:
+        with open(image_path, 'rb') as f:
+            tags = exifread.process_file(f)
 
     if not tags:
-        print("无法读取图片的EXIF信息")
+        if verbose:
+            print("无法读取图片的EXIF信息")
         return None
 
     # 提取GPS信息
@@ -21,7 +41,8 @@ def get_gps_coordinates(image_path):
     gps_longitude_ref = tags.get('GPS GPSLongitudeRef')
 
     if not all([gps_latitude, gps_latitude_ref, gps_longitude, gps_longitude_ref]):
-        print("图片中未找到GPS坐标信息")
+        if verbose:
+            print("图片中未找到GPS坐标信息")
         return None
 
     # 将度分秒格式转换为十进制
@@ -45,10 +66,130 @@ def get_gps_coordinates(image_path):
     return lat, lon
 
 
+def _dms_to_decimal(dms, ref):
+    degrees, minutes, seconds = (float(v) for v in dms)
+    decimal = degrees + minutes / 60 + seconds / 3600
+    return -decimal if ref in ('S', 'W') else decimal
+
+
+def _jpeg_exif(buf):
+    """
+    在 JPEG 标记段中查找 APP1 Exif，返回其中的 TIFF 数据；没有 EXIF 返回 None
+    在图像数据 (SOS) 之前数据就不完整时抛出 ValueError
+    """
+    pos, n = 2, len(buf)
+    while pos + 4 <= n:
+        if buf[pos] != 0xFF:
+            return None
+        marker = buf[pos + 1]
+        if marker == 0xFF:  # 填充字节
+            pos += 1
+            continue
+        if marker in (0xDA, 0xD9):  # SOS / EOI：EXIF 只会出现在这之前
+            return None
+        length = int.from_bytes(buf[pos + 2:pos + 4], 'big')
+        if marker == 0xE1 and bytes(buf[pos + 4:pos + 10]) == b'Exif\0\0':
+            if pos + 2 + length > n:
+                raise ValueError("EXIF 段不完整")
+            return buf[pos + 10:pos + 2 + length]
+        pos += 2 + length
+    raise ValueError("JPEG 文件头不完整")
+
+
+def _tiff_gps(tiff):
+    """只遍历 IFD0 找到 GPS IFD，再读取其中的经纬度，不解析其他标签"""
+    if bytes(tiff[:2]) == b'II':
+        endian = '<'
+    elif bytes(tiff[:2]) == b'MM':
+        endian = '>'
+    else:
+        raise ValueError("无效的 TIFF 头")
+    entry = struct.Struct(endian + 'HHII')  # tag, type, count, value/offset
+
+    def entries(offset):
+        count = struct.unpack_from(endian + 'H', tiff, offset)[0]
+        for i in range(count):
+            yield offset + 2 + 12 * i, entry.unpack_from(tiff, offset + 2 + 12 * i)
+
+    ifd0 = struct.unpack_from(endian + 'I', tiff, 4)[0]
+    gps_offset = next((value for _, (tag, _, _, value) in entries(ifd0) if tag == GPS_IFD), None)
+    if gps_offset is None:
+        return None
+
+    fields = {}
+    for pos, (tag, typ, count, value) in entries(gps_offset):
+        if tag in (GPS_LATITUDE_REF, GPS_LONGITUDE_REF) and typ == 2:
+            # 'N'/'S'/'E'/'W'，长度不超过 4 字节时直接存放在条目中
+            fields[tag] = chr(tiff[pos + 8])
+        elif tag in (GPS_LATITUDE, GPS_LONGITUDE) and typ == 5 and count == 3:
+            nums = struct.unpack_from(endian + '6I', tiff, value)
+            fields[tag] = [n / d if d else 0.0 for n, d in zip(nums[::2], nums[1::2])]
+    return fields
+
+
+def _read_gps(buf):
+    """解析 GPS IFD；没有 GPS 信息返回 None，文件无法解析时抛出异常"""
+    if bytes(buf[:2]) == b'\xff\xd8':
+        # JPEG：直接解析 APP1 段，不经过 PIL
+        tiff = _jpeg_exif(buf)
+        gps = _tiff_gps(tiff) if tiff is not None else None
+    else:
+        if is_heif(buf):
+            register_heif()
+        with Image.open(io.BytesIO(buf)) as img:
+            gps = img.getexif().get_ifd(GPS_IFD)
+    if not gps:
+        return None
+    lat = gps.get(GPS_LATITUDE)
+    lat_ref = gps.get(GPS_LATITUDE_REF)
+    lon = gps.get(GPS_LONGITUDE)
+    lon_ref = gps.get(GPS_LONGITUDE_REF)
+    if not all([lat, lat_ref, lon, lon_ref]):
+        return None
+    return _dms_to_decimal(lat, lat_ref.strip()), _dms_to_decimal(lon, lon_ref.strip())
+
+
+def get_gps_from_bytes(buf):
+    """
+    从内存中的图片字节提取GPS坐标（快速版本）
+    JPEG 直接解析 APP1 段中的 GPS IFD，不解码图像、不解析其他 EXIF 标签；
+    HEIC 等其他格式通过 PIL 读取 EXIF
+    返回 (lat, lon)，没有 GPS 信息时返回 None
+    """
+    try:
+        return _read_gps(buf)
+    except Exception:
+        return None
+
+
+def get_gps_from_file(image_path):
+    """从文件提取GPS坐标；JPEG 只读取文件开头部分"""
+    with open(image_path, 'rb') as f:
+        head = f.read(JPEG_HEAD_BYTES)
+        if head[:2] == b'\xff\xd8':
+            try:
+                return _read_gps(head)
+            except Exception:
+                pass
+        # 非 JPEG，或 EXIF 段超出了开头部分
+        return get_gps_from_bytes(head + f.read())
+
+
+def get_gps_batch(image_paths, workers=None, chunksize=64):
+    """并行提取大量图片的GPS坐标，返回与输入顺序一致的列表"""
+    image_paths = list(image_paths)
+    if len(image_paths) < chunksize:
+        return [get_gps_from_file(p) for p in image_paths]
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(get_gps_from_file, image_paths, chunksize=chunksize))
+
+
 def open_in_google_maps(lat, lon):
     """
     在Google Maps中打开位置
     """
+    import webbrowser
+
     url = f"https://www.google.com/maps?q={lat},{lon}"
     webbrowser.open(url)
     print(f"在Google Maps中打开位置: {lat}, {lon}")
@@ -58,6 +199,8 @@ def open_in_apple_maps(lat, lon):
     """
     在Apple Maps中打开位置
     """
+    import webbrowser
+
     url = f"https://maps.apple.com/?q={lat},{lon}"
     webbrowser.open(url)
     print(f"在Apple Maps中打开位置: {lat}, {lon}")
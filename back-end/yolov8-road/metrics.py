@@ -0,0 +1,201 @@
+"""
+Prometheus 文本格式指标（不依赖 prometheus_client）
+
+- Counter / Gauge / Histogram，支持标签
+- Gauge 可以设置回调，在抓取时读取当前值（队列深度等）
+- render() 输出 /metrics 的文本（text/plain; version=0.0.4）
+- instrument(app) 为 Flask 应用统计每个接口的请求数和耗时，并注册 GET /metrics
+
+服务中用到的指标在本模块末尾统一定义，ingest / app / serve 直接导入使用。
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 秒：覆盖 1ms 的解码/绘制到数秒的大图切片推理
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _fmt_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _fmt_value(v):
+    if v == math.inf:
+        return '+Inf'
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}，收到 {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}' for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+        self._functions = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, fn, **labels):
+        """抓取时调用 fn() 取值"""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+            functions = list(self._functions.items())
+        for key, fn in functions:
+            try:
+                items.append((key, fn()))
+            except Exception:
+                continue
+        return [f'{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}' for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}   # key -> [各桶计数..., +Inf 计数, sum]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            v = self._values.get(key)
+            if v is None:
+                v = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            v[i] += 1
+            v[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = []
+        for key, v in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), v[:-1]):
+                cumulative += count
+                le = f'le="{_fmt_value(float(bound)) if bound != math.inf else "+Inf"}"'
+                lines.append(f'{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {cumulative}')
+            labels = _fmt_labels(self.labelnames, key)
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+            lines.append(f'{self.name}_sum{labels} {_fmt_value(v[-1])}')
+        return lines
+
+
+def render():
+    """所有指标的 Prometheus 文本"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.header())
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+def instrument(app):
+    """统计 Flask 应用每个接口的请求数和耗时，并注册 GET /metrics"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        endpoint = request.endpoint or 'unknown'
+        if endpoint != 'metrics' and 'metrics_start' in g:
+            REQUESTS.inc(endpoint=endpoint, code=response.status_code)
+            REQUEST_SECONDS.observe(time.perf_counter() - g.metrics_start, endpoint=endpoint)
+        return response
+
+    @app.route('/metrics', endpoint='metrics')
+    def _metrics():
+        return Response(render(), mimetype=CONTENT_TYPE)
+
+
+# ---------- 服务指标 ----------
+
+REQUESTS = Counter('road_requests_total', '按接口和状态码统计的请求数', ['endpoint', 'code'])
+REQUEST_SECONDS = Histogram('road_request_seconds', '请求总耗时', ['endpoint'])
+# stage: read / model / preprocess / inference / nms / render / encode / gps
+STAGE_SECONDS = Histogram('road_stage_seconds', '检测各阶段耗时', ['stage'])
+DECODE_SECONDS = Histogram('road_decode_seconds', '图像解码耗时（PIL 或 OpenCV 回退）', ['decoder'])
+ERRORS = Counter('road_errors_total', '按类型统计的错误数', ['type'])
+DETECTIONS = Counter('road_detections_total', '检测到的缺陷数', ['class'])
+BATCH_SIZE = Histogram('road_inference_batch_size', '每次前向推理的图片数', buckets=(1, 2, 4, 8, 16, 32))
+BATCH_MAX = Gauge('road_inference_batch_max_size', '动态批处理的最大批量')
+MODEL_INFO = Gauge('road_model_info', '当前加载的模型（热切换后旧版本为 0）', ['model', 'version', 'backend'])
+MODEL_MEMORY = Gauge('road_model_memory_bytes', '模型加载并预热后进程 RSS 的增量', ['model'])
+# phase: load / warmup / publish / drain
+MODEL_SWAP_SECONDS = Histogram('road_model_swap_seconds', '模型热切换各阶段耗时', ['phase'])
+MODEL_READY = Gauge('road_model_ready', '模型已加载并预热完成时为 1')
+WORKERS_READY = Gauge('road_workers_ready', '已就绪的推理进程数（serve.py）')
+WORKER_RESTARTS = Counter('road_worker_restarts_total', '意外退出后重启的推理进程数（serve.py）')
+QUEUE_DEPTH = Gauge('road_queue_depth', '排队中的图片数', ['queue'])
+CACHE_HITS = Counter('road_cache_hits_total', '结果缓存命中数（命中时跳过解码和推理）')
@@ -0,0 +1,250 @@
+"""
+模型注册表：按名称加载多个模型，请求按名称路由，在线热切换权重
+
+- MODELS 环境变量配置要加载的模型："名称=权重路径[@后端],..."，第一个为默认模型；
+  未设置时只加载 default=DEFAULT_WEIGHTS
+- 类别名称从模型本身读取（见 backends.class_names），不再硬编码
+- 每个模型有自己的推理锁、动态批处理调度器和各输入尺寸的延迟统计
+- swap(name, weights)：在后台线程加载并预热新模型，完成后在锁内替换注册表中的引用（原子切换），
+  之后的请求都走新模型；已经在旧模型上的请求（acquire 计数）照常完成，
+  全部结束后才关闭旧模型的调度器并释放模型（drain）
+- 内存：加载 + 预热前后的进程 RSS 增量（同时有请求在处理时只是近似值），
+  PyTorch 后端另外报告参数占用；切换耗时按 load / warmup / publish / drain 分阶段记录
+
+用法: MODELS="default=./runs/detect/yolov8n_v8_200e/weights/best.pt,v300=./runs/detect/yolov8n_v8_300e/weights/best.pt@onnx"
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+
+import metrics
+from backends import DEFAULT_WEIGHTS, class_names, load_model, model_version, supports_half
+from batcher import MicroBatcher
+from policy import LatencyTracker
+
+
+def parse_models(spec, default_weights=DEFAULT_WEIGHTS):
+    """MODELS 配置 → [(名称, 权重路径, 后端或 None)]；为空时只有 default"""
+    models = []
+    for item in (spec or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, target = item.partition('=')
+        if not sep or not name.strip() or not target.strip():
+            raise ValueError(f"MODELS 配置无效: {item}（应为 名称=权重路径[@后端]）")
+        weights, _, backend = target.strip().partition('@')
+        models.append((name.strip(), weights, backend or None))
+    if len({name for name, _, _ in models}) != len(models):
+        raise ValueError("MODELS 中有重复的模型名称")
+    return models or [('default', default_weights, None)]
+
+
+def rss_bytes():
+    """当前进程的常驻内存（Linux /proc），不可用时返回 None"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def param_bytes(model):
+    """PyTorch 模型参数占用的字节数；导出的后端返回 None"""
+    try:
+        return sum(p.numel() * p.element_size() for p in model.model.parameters())
+    except (AttributeError, TypeError):
+        return None
+
+
+class ModelEntry:
+    """一个已加载的模型版本"""
+
+    def __init__(self, name, weights, backend, model):
+        self.name = name
+        self.weights = weights
+        self.backend = backend or os.environ.get('YOLO_BACKEND', 'pytorch')
+        self.version = model_version(weights, self.backend)
+        self.model = model
+        # 服务 API 和缺陷位置库一直使用小写类别名
+        self.names = [n.lower() for n in class_names(model)]
+        # YOLO 预测器不是线程安全的，直接调用该模型的地方都持有此锁
+        self.lock = threading.Lock()
+        self.batcher = None
+        # 各输入尺寸的实测耗时，供 imgsz=auto 在延迟预算内选择尺寸
+        self.latency = LatencyTracker()
+        self.half = supports_half(self.backend)
+        # 发布到注册表之后为 True（预热时的推理不计入指标）
+        self.serving = False
+        # 正在使用该模型的请求数（由 ModelRegistry 的锁保护）
+        self.inflight = 0
+        self.stats = {}
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.close()
+        self.model = None
+
+    def info(self):
+        return {
+            'name': self.name, 'weights': self.weights, 'backend': self.backend, 'version': self.version,
+            'classes': self.names, 'half_supported': self.half, 'inflight': self.inflight,
+            'latency_ms': self.latency.snapshot(), **self.stats,
+        }
+
+
+class ModelRegistry:
+    """
+    名称 → ModelEntry
+    infer_fn(entry, imgs, **kwargs): 一次前向推理；warmup_fn(entry): 发布前的预热（可为 None）
+    """
+
+    def __init__(self, infer_fn, warmup_fn=None, batch_max_size=1, batch_max_wait_ms=5.0):
+        self.infer_fn = infer_fn
+        self.warmup_fn = warmup_fn
+        self.batch_max_size = batch_max_size
+        self.batch_max_wait_ms = batch_max_wait_ms
+        self.default = None
+        self._models = {}
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+        # 名称 → 最近一次切换的状态（/models 报告）
+        self.swaps = {}
+
+    def __contains__(self, name):
+        with self._lock:
+            return name in self._models
+
+    def names(self):
+        with self._lock:
+            return list(self._models)
+
+    def entries(self):
+        with self._lock:
+            return list(self._models.values())
+
+    def get(self, name=None):
+        """当前版本的模型；name 为空时为默认模型，未加载时抛出 KeyError"""
+        with self._lock:
+            return self._models[name or self.default]
+
+    @contextmanager
+    def acquire(self, name=None):
+        """在请求期间持有当前版本的模型：切换后旧模型要等这些请求结束才释放"""
+        with self._lock:
+            entry = self._models[name or self.default]
+            entry.inflight += 1
+        try:
+            yield entry
+        finally:
+            with self._lock:
+                entry.inflight -= 1
+                if entry.inflight == 0:
+                    self._drained.notify_all()
+
+    def build(self, name, weights, backend=None):
+        """加载并预热一个模型（不发布），记录耗时和内存增量"""
+        rss0 = rss_bytes()
+        t0 = time.perf_counter()
+        entry = ModelEntry(name, weights, backend, load_model(weights, backend))
+        if self.batch_max_size > 1:
+            entry.batcher = MicroBatcher(partial(self.infer_fn, entry), self.batch_max_size, self.batch_max_wait_ms)
+        t1 = time.perf_counter()
+        if self.warmup_fn is not None:
+            try:
+                self.warmup_fn(entry)
+            except Exception:
+                entry.close()
+                raise
+        t2 = time.perf_counter()
+        rss1 = rss_bytes()
+        params = param_bytes(entry.model)
+        entry.stats = {
+            'load_s': round(t1 - t0, 3),
+            'warmup_s': round(t2 - t1, 3),
+            'rss_mb': round(max(0, rss1 - rss0) / 2**20, 1) if rss0 is not None and rss1 is not None else None,
+            'param_mb': round(params / 2**20, 1) if params is not None else None,
+        }
+        metrics.MODEL_SWAP_SECONDS.observe(t1 - t0, phase='load')
+        metrics.MODEL_SWAP_SECONDS.observe(t2 - t1, phase='warmup')
+        if rss0 is not None and rss1 is not None:
+            metrics.MODEL_MEMORY.set(max(0, rss1 - rss0), model=name)
+        return entry
+
+    def publish(self, entry):
+        """
+        原子替换同名模型，之后等待旧版本上的请求全部结束再释放它
+        返回 (publish 耗时秒, drain 耗时秒)
+        """
+        t0 = time.perf_counter()
+        with self._lock:
+            old = self._models.get(entry.name)
+            entry.serving = True
+            entry.stats['loaded_at'] = time.time()
+            self._models[entry.name] = entry
+            if self.default is None:
+                self.default = entry.name
+        t1 = time.perf_counter()
+        metrics.MODEL_SWAP_SECONDS.observe(t1 - t0, phase='publish')
+        metrics.MODEL_INFO.set(1, model=entry.name, version=entry.version, backend=entry.backend)
+        if old is None:
+            return t1 - t0, 0.0
+
+        old.serving = False
+        with self._lock:
+            while old.inflight:
+                self._drained.wait()
+        old.close()
+        t2 = time.perf_counter()
+        metrics.MODEL_SWAP_SECONDS.observe(t2 - t1, phase='drain')
+        if old.version != entry.version:
+            metrics.MODEL_INFO.set(0, model=old.name, version=old.version, backend=old.backend)
+        return t1 - t0, t2 - t1
+
+    def load(self, name, weights, backend=None):
+        """同步加载、预热并发布（启动时使用），返回 ModelEntry"""
+        entry = self.build(name, weights, backend)
+        self.publish(entry)
+        return entry
+
+    def swap(self, name, weights, backend=None):
+        """
+        后台热切换：加载并预热新权重后替换 name（不存在时新增），返回切换状态 dict
+        同名模型已在切换中时抛出 RuntimeError
+        """
+        with self._lock:
+            if self.swaps.get(name, {}).get('state') == 'loading':
+                raise RuntimeError(f"模型 {name} 正在切换中")
+            status = {'state': 'loading', 'weights': weights, 'backend': backend, 'started_at': time.time()}
+            self.swaps[name] = status
+        threading.Thread(target=self._swap, args=(name, weights, backend, status),
+                         name=f"model-swap-{name}", daemon=True).start()
+        return dict(status)
+
+    def _swap(self, name, weights, backend, status):
+        t0 = time.perf_counter()
+        try:
+            entry = self.build(name, weights, backend)
+        except Exception as e:
+            print(f"模型 {name} 切换失败: {e}")
+            status.update(state='failed', error=str(e))
+            return
+        publish_s, drain_s = self.publish(entry)
+        status.update(
+            state='done', version=entry.version, load_s=entry.stats['load_s'], warmup_s=entry.stats['warmup_s'],
+            publish_ms=round(publish_s * 1000, 3), drain_s=round(drain_s, 3),
+            total_s=round(time.perf_counter() - t0, 3), rss_mb=entry.stats['rss_mb'],
+        )
+        print(f"模型 {name} 已切换到 {weights}：加载 {entry.stats['load_s']}s，预热 {entry.stats['warmup_s']}s，"
+              f"切换 {publish_s * 1000:.3f}ms，排空旧请求 {drain_s:.3f}s")
+
+    def info(self):
+        with self._lock:
+            entries = list(self._models.values())
+            swaps = {name: dict(s) for name, s in self.swaps.items()}
+        return {'default': self.default, 'models': [e.info() for e in entries], 'swaps': swaps}
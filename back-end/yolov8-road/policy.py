@@ -0,0 +1,187 @@
+"""
+每个请求的推理策略：输入尺寸、置信度 / IoU 阈值、最大检测数、类别过滤、半精度
+
+- parse_policy 把查询参数（或命令行参数）解析为策略 dict，未指定的项使用模型默认值
+- 预设 policy=preview（快速预览）/ accurate（精确），单独指定的参数覆盖预设
+- imgsz=auto：按原图尺寸和延迟预算（budget_ms）选择输入尺寸——小图不放大，
+  大图在预算内取尽量大的尺寸。各尺寸的推理耗时由 LatencyTracker 在线统计，
+  没有该尺寸的统计时按像素数（尺寸平方）从最接近的已知尺寸外推
+- half=1 只在 PyTorch 后端 + CUDA 时生效，CPU 和导出的后端忽略
+
+用法（API）: /detect?policy=preview  /detect?imgsz=auto&budget_ms=500&conf=0.3&classes=pothole
+"""
+import os
+import threading
+
+from ingest import MODEL_IMGSZ
+
+STRIDE = 32
+MAX_IMGSZ = int(os.environ.get('POLICY_MAX_IMGSZ', '1280'))
+# imgsz=auto 且未指定 budget_ms 时的单张推理延迟预算（毫秒）
+DEFAULT_BUDGET_MS = float(os.environ.get('POLICY_BUDGET_MS', '250'))
+AUTO_SIZES = (320, 416, 512, 640, 800, 960, 1280)
+
+PRESETS = {
+    # 现场 App 的快速预览：小输入、只保留较确定的框
+    'preview': {'imgsz': 320, 'conf': 0.4, 'max_det': 50},
+    # 精确模式：在较宽松的预算内尽量用大输入，降低置信度阈值
+    'accurate': {'imgsz': 'auto', 'budget_ms': 1000.0, 'conf': 0.15},
+}
+
+# 直接作为关键字参数传给模型的项（budget_ms 只用于选择 imgsz）
+MODEL_ARGS = ('imgsz', 'conf', 'iou', 'max_det', 'classes', 'half')
+
+
+def round_size(size):
+    """向上取整到 STRIDE 的倍数，并限制在 [STRIDE, MAX_IMGSZ]"""
+    return min(MAX_IMGSZ, max(STRIDE, -(-int(size) // STRIDE) * STRIDE))
+
+
+def _fraction(name, value):
+    v = float(value)
+    if not 0.0 <= v <= 1.0:
+        raise ValueError(f"{name} 必须在 0~1 之间")
+    return v
+
+
+def _classes(value, names):
+    ids = set()
+    for item in str(value).split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if item.isdigit():
+            c = int(item)
+        else:
+            lowered = [n.lower() for n in names or ()]
+            if item.lower() not in lowered:
+                raise ValueError(f"未知类别: {item}")
+            c = lowered.index(item.lower())
+        if names and not 0 <= c < len(names):
+            raise ValueError(f"类别编号超出范围: {c}")
+        ids.add(c)
+    return tuple(sorted(ids)) or None
+
+
+def parse_policy(args, names=None):
+    """
+    查询参数 dict → 策略 dict（只包含指定了的项）
+    names: 类别名称列表，classes 可以用名称或编号（逗号分隔）
+    参数无效时抛出 ValueError
+    """
+    preset = args.get('policy') or None
+    if preset is not None and preset not in PRESETS:
+        raise ValueError(f"未知策略: {preset}，可选: {', '.join(PRESETS)}")
+    policy = dict(PRESETS.get(preset, {}))
+    try:
+        if args.get('imgsz'):
+            imgsz = str(args['imgsz']).lower()
+            policy['imgsz'] = 'auto' if imgsz == 'auto' else round_size(int(imgsz))
+        if args.get('budget_ms'):
+            policy['budget_ms'] = max(1.0, float(args['budget_ms']))
+        if args.get('conf') not in (None, ''):
+            policy['conf'] = _fraction('conf', args['conf'])
+        if args.get('iou') not in (None, ''):
+            policy['iou'] = _fraction('iou', args['iou'])
+        if args.get('max_det'):
+            policy['max_det'] = max(1, int(args['max_det']))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"推理参数无效: {e}") from None
+    if args.get('classes'):
+        policy['classes'] = _classes(args['classes'], names)
+        if policy['classes'] is None:
+            del policy['classes']
+    if str(args.get('half', '')).lower() in ('1', 'true', 'yes'):
+        policy['half'] = True
+    if 'budget_ms' in policy and policy.get('imgsz') != 'auto':
+        del policy['budget_ms']
+    return policy
+
+
+def add_policy_arguments(parser):
+    """命令行工具共用的推理策略参数（解析结果交给 parse_policy(vars(args))）"""
+    parser.add_argument('--policy', choices=sorted(PRESETS), default=None, help='推理策略预设')
+    parser.add_argument('--imgsz', default=None, help=f'输入尺寸（{STRIDE} 的倍数）或 auto')
+    parser.add_argument('--budget-ms', type=float, default=None, help='imgsz=auto 时的单张推理延迟预算')
+    parser.add_argument('--conf', type=float, default=None, help='置信度阈值（默认 0.25）')
+    parser.add_argument('--iou', type=float, default=None, help='NMS IoU 阈值（默认 0.7）')
+    parser.add_argument('--max-det', type=int, default=None, help='每张图片最多保留的检测数')
+    parser.add_argument('--classes', default=None, help='只保留这些类别（名称或编号，逗号分隔）')
+    parser.add_argument('--half', action='store_true', help='半精度推理（仅 PyTorch + CUDA）')
+
+
+def model_kwargs(policy, half_supported=False):
+    """策略 → 模型调用的关键字参数（imgsz 必须已确定，见 resolve）"""
+    kwargs = {k: policy[k] for k in MODEL_ARGS if k in policy}
+    if 'classes' in kwargs:
+        kwargs['classes'] = list(kwargs['classes'])
+    if kwargs.get('half') and not half_supported:
+        del kwargs['half']
+    return kwargs
+
+
+def batch_key(kwargs):
+    """相同关键字参数的请求才能合并为一次前向推理"""
+    return tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in kwargs.items()))
+
+
+class LatencyTracker:
+    """每个输入尺寸的单张推理耗时（预处理 + 推理 + NMS，指数滑动平均，毫秒）"""
+
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self._ms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, imgsz, ms):
+        with self._lock:
+            old = self._ms.get(imgsz)
+            self._ms[imgsz] = ms if old is None else old + self.alpha * (ms - old)
+
+    def estimate(self, imgsz):
+        """估计该尺寸的耗时；还没有任何统计时返回 None"""
+        with self._lock:
+            if imgsz in self._ms:
+                return self._ms[imgsz]
+            if not self._ms:
+                return None
+            known = min(self._ms, key=lambda s: abs(s - imgsz))
+            return self._ms[known] * (imgsz / known) ** 2
+
+    def snapshot(self):
+        with self._lock:
+            return {s: round(ms, 1) for s, ms in sorted(self._ms.items())}
+
+
+def choose_imgsz(long_side, budget_ms, tracker):
+    """
+    不超过原图长边（不放大）的候选尺寸中，取估计耗时在预算内的最大值；
+    没有耗时统计时不超过训练尺寸；都超出预算时取最小候选
+    """
+    limit = round_size(long_side)
+    candidates = sorted({s for s in AUTO_SIZES if s < limit} | {limit})
+    best = candidates[0]
+    for size in candidates:
+        est = tracker.estimate(size)
+        if est is None:
+            if size <= MODEL_IMGSZ:
+                best = size
+        elif est <= budget_ms:
+            best = size
+    return best
+
+
+def resolve(policy, image_size, tracker, tile=None):
+    """
+    确定 imgsz=auto 的实际尺寸，返回新的策略 dict（其他情况原样返回）
+    image_size: 原图 (宽, 高)，未知时为 None；tile: 切片推理时的切片大小（模型实际看到的长边）
+    """
+    if policy.get('imgsz') != 'auto':
+        return policy
+    policy = dict(policy)
+    budget = policy.pop('budget_ms', DEFAULT_BUDGET_MS)
+    long_side = max(image_size) if image_size else MODEL_IMGSZ
+    if tile:
+        long_side = min(long_side, tile)
+    policy['imgsz'] = choose_imgsz(long_side, budget, tracker)
+    return policy
@@ -1,45 +1,11 @@
-import numpy as np
-from ultralytics import YOLO
 import cv2
-import math
 
-# 设置字体样式
-font = cv2.FONT_HERSHEY_DUPLEX
-
-# 在图像上添加带背景的文本
-def add_text_with_background(
-    image,
-    text,
-    position,
-    font_face,
-    font_scale,
-    text_color,
-    bg_color,
-    thickness=1,
-    padding=5,
-):
-    # 获取文本大小
-    (text_width, text_height), baseline = cv2.getTextSize(
-        text, font_face, font_scale, thickness
-    )
-
-    # 计算文本框的大小（包括内边距）
-    box_width = text_width + 2 * padding
-    box_height = text_height + 2 * padding + baseline
-
-    # 确保文本框不会超出图像边界
-    x, y = position
-    x = max(0, min(x, image.shape[1] - box_width))
-    y = max(box_height, min(y, image.shape[0]))
-
-    # 绘制背景矩形
-    cv2.rectangle(image, (x, y - box_height), (x + box_width, y), bg_color, -1)
-
-    # 绘制文本
-    text_position = (x + padding, y - padding - baseline)
-    cv2.putText(
-        image, text, text_position, font_face, font_scale, text_color, thickness
-    )
+from backends import DEFAULT_WEIGHTS, class_names, load_model, supports_half
+from ingest import MODEL_IMGSZ
+from policy import LatencyTracker, model_kwargs, resolve
+from profiling import maybe_profile
+from render import render, result_to_numpy
+from tiling import tiled_predict
 
 # 获取适合文本宽度的最优字体大小
 def get_optimal_font_scale(text, width):
@@ -52,14 +18,18 @@ def get_optimal_font_scale(text, width):
             return scale / 10
     return 1
 
-# 加载YOLO模型
-model = YOLO("./runs/detect/yolov8n_v8_200e/weights/best.pt")
+# 加载YOLO模型（后端由环境变量 YOLO_BACKEND 选择）
+model = load_model(DEFAULT_WEIGHTS)
+
+# 类别名称从模型读取（训练时 data.yaml 的 names）
+classNames = class_names(model)
 
-# 定义类别名称
-classNames = ['cracks', 'pothole']
+# imgsz=auto 时各输入尺寸的实测耗时
+latency = LatencyTracker()
 
-# 进行预测
-def pred(img_path, stream=False):
+# 进行预测（tiled=True 时对高分辨率图像切片推理，用于细小裂缝）
+# policy: 推理策略 dict（见 policy.parse_policy），例如 {'imgsz': 'auto', 'conf': 0.3}
+def pred(img_path, stream=False, tiled=False, policy=None):
     # 新增：检查输入类型，如果是字符串则读取图片
     if isinstance(img_path, str):
         # 尝试读取图片
@@ -73,68 +43,43 @@ def pred(img_path, stream=False):
         img = img_path
 
     orig = img.copy()
-    img_height, img_width, _ = img.shape
-    # 使用YOLO模型进行预测
-    results = model(img, stream=stream)
-    for r in results:
-        boxes = r.boxes
-        for box in boxes:
-            # 获取边界框的坐标
-            x1, y1, x2, y2 = box.xyxy[0]
-            x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-            w, h = x2 - x1, y2 - y1
-
-            # 获取置信度并进行四舍五入
-            conf = math.ceil((box.conf[0] * 100)) / 100
-
-            # 获取类别索引并转换为类别名称
-            cls = box.cls[0]
-            name = classNames[int(cls)]
-            print(f"{name} " f"{conf}")
-
-            # 获取适合文本的最优字体大小
-            #font_scale = get_optimal_font_scale(f"{name} {conf}", w)
-            thick = 1 if w < 210 else 2
-
-            cv2.rectangle(
-                img=img,
-                pt1=(x1, y1),
-                pt2=(x1 + w, y1 + h),
-                color=(0, 0, 255),  #bgr
-                thickness=2,
-            )
-            if img_height < img_width:
-                if img_width < 600:
-                    font_scale = 0.5
-                else:
-                    font_scale = 0.7
-            else:
-                if img_height < 600:
-                    font_scale = 0.5
-                else:
-                    font_scale = 0.7
-            add_text_with_background(
-                img,
-                f"{name} {conf}",
-                (x1, y1),
-                font,
-                font_scale,
-                (255, 255, 255),
-                (0, 0, 255), #bgr
-                thick,
-                5,
-            )
+    kwargs = model_kwargs(resolve(policy or {}, (img.shape[1], img.shape[0]), latency), supports_half())
+    # PROFILE_SAMPLE=1 时剖析每次预测，结果写入 PROFILE_DIR（见 profiling.py）
+    with maybe_profile('pred'):
+        # 使用YOLO模型进行预测
+        if tiled:
+            results = [tiled_predict(model, img, **kwargs)]
+        else:
+            results = model(img, stream=stream, **kwargs)
+        for r in results:
+            speed = [r.speed.get(k) for k in ('preprocess', 'inference', 'postprocess')]
+            if not tiled and None not in speed:
+                latency.observe(kwargs.get('imgsz', MODEL_IMGSZ), sum(speed))
+            # 所有框一次性取到 NumPy，再统一绘制
+            dets = result_to_numpy(r)
+            for conf, cls in dets[:, 4:6]:
+                print(f"{classNames[int(cls)]} {round(float(conf), 2)}")
+            render(img, dets, classNames)
 
     return orig, img
 
 # 主程序入口
 if __name__ == "__main__":
     # 修改：添加文件存在性检查
+    import argparse
     import os
 
-    test_path = "./test_images/2.jpg"
+    from policy import add_policy_arguments, parse_policy
+
+    parser = argparse.ArgumentParser(description="检测单张图片并显示结果")
+    parser.add_argument('image', nargs='?', default="./test_images/2.jpg")
+    parser.add_argument('--tiled', action='store_true', help='高分辨率切片推理')
+    add_policy_arguments(parser)
+    args = parser.parse_args()
+
+    test_path = args.image
     if os.path.exists(test_path):
-        orig, result = pred(test_path)
+        orig, result = pred(test_path, tiled=args.tiled, policy=parse_policy(vars(args), classNames))
         if orig is not None and result is not None:
             # 显示结果
             cv2.imshow("Original", orig)
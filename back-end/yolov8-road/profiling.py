@@ -0,0 +1,240 @@
+"""
+检测热路径的可选性能剖析
+
+按 PROFILE_SAMPLE 比例抽样（或 PROFILE_ALLOW_HEADER=1 时请求头 X-Profile: 1 强制）剖析单次检测，每次写出：
+  <时间>_<名称>.prof       cProfile 原始数据（snakeviz / pstats 查看）
+  <时间>_<名称>.txt        按累计耗时排序的函数表 + torch 算子耗时表
+  <时间>_<名称>.collapsed  采样调用栈（折叠格式，可直接交给 flamegraph.pl / speedscope）
+目录中最多保留 PROFILE_KEEP 次剖析，旧文件自动删除。
+写文件和清理旧文件失败只打印警告，不影响被剖析的请求。
+
+cProfile 只覆盖调用线程；动态批处理时推理在调度线程中执行，
+因此栈采样器同时采样 extra_threads（例如批处理线程），torch 算子表覆盖所有线程。
+
+汇总多次剖析的自身耗时热点: python profiling.py ./profiles --top 30
+"""
+import argparse
+import cProfile
+import collections
+import glob
+import io
+import itertools
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+PROFILE_SAMPLE = float(os.environ.get('PROFILE_SAMPLE', '0'))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', './profiles')
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', '50'))
+# 为 1 时允许客户端用 X-Profile 请求头强制剖析；默认关闭，只在内部 / 调试环境打开
+PROFILE_ALLOW_HEADER = os.environ.get('PROFILE_ALLOW_HEADER', '0') in ('1', 'true', 'yes')
+PROFILE_HEADER = 'X-Profile'
+SAMPLE_INTERVAL = 0.001
+
+_seq = itertools.count()
+# cProfile（3.12 起基于 sys.monitoring）和 torch 剖析器同一时间只能有一个在运行
+_busy = threading.Lock()
+
+
+def should_profile(header_value=None):
+    """请求头要求剖析，或按 PROFILE_SAMPLE 比例抽中"""
+    if PROFILE_ALLOW_HEADER and header_value and header_value.lower() in ('1', 'true', 'yes'):
+        return True
+    return PROFILE_SAMPLE > 0 and random.random() < PROFILE_SAMPLE
+
+
+class StackSampler:
+    """后台线程定时采样指定线程的调用栈，统计折叠栈出现次数"""
+
+    def __init__(self, thread_ids, interval=SAMPLE_INTERVAL):
+        self.thread_ids = [t for t in thread_ids if t is not None]
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for tid in self.thread_ids:
+                frame = frames.get(tid)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(tid, str(tid)))
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _torch_profiler():
+    """torch 已加载时返回算子级剖析器，否则返回 None（不为剖析单独导入 torch）"""
+    torch = sys.modules.get('torch')
+    if torch is None:
+        return None
+    try:
+        from torch.profiler import ProfilerActivity, profile as torch_profile
+        return torch_profile(activities=[ProfilerActivity.CPU])
+    except Exception:
+        return None
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        # 已被其他进程删除
+        return 0.0
+
+
+def _rotate(directory, keep):
+    """
+    只保留最近 keep 次剖析的文件（按修改时间）；多个进程共用同一目录时，
+    其他进程同时删除的文件直接跳过
+    """
+    runs = sorted(glob.glob(os.path.join(directory, '*.prof')), key=_mtime)
+    for prof_path in runs[:max(0, len(runs) - keep)]:
+        for p in glob.glob(glob.escape(prof_path[:-len('.prof')]) + '.*'):
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+
+
+def _dump(stem, name, elapsed, prof, sampler, torch_prof):
+    """写出一次剖析的 .prof / .collapsed / .txt"""
+    prof.dump_stats(stem + '.prof')
+    with open(stem + '.collapsed', 'w') as f:
+        f.write(sampler.collapsed())
+    out = io.StringIO()
+    out.write(f"{name}: {elapsed * 1000:.1f} ms\n\n")
+    pstats.Stats(prof, stream=out).sort_stats('cumulative').print_stats(30)
+    if torch_prof is not None:
+        out.write("\ntorch 算子耗时:\n")
+        out.write(torch_prof.key_averages().table(sort_by='self_cpu_time_total', row_limit=25))
+    with open(stem + '.txt', 'w') as f:
+        f.write(out.getvalue())
+
+
+@contextmanager
+def profile(name, extra_threads=(), directory=None, keep=None):
+    """
+    剖析 with 块内的代码并写出结果文件，返回的 dict 在退出后包含 'path'（文件前缀）；
+    写文件或生成摘要失败时只打印警告，dict 中没有 'path'
+    """
+    directory = directory or PROFILE_DIR
+    info = {}
+    sampler = StackSampler([threading.get_ident(), *extra_threads])
+    torch_prof = _torch_profiler()
+    prof = cProfile.Profile()
+
+    start = time.perf_counter()
+    sampler.start()
+    if torch_prof is not None:
+        torch_prof.__enter__()
+    prof.enable()
+    try:
+        yield info
+    finally:
+        prof.disable()
+        if torch_prof is not None:
+            try:
+                torch_prof.__exit__(None, None, None)
+            except Exception as e:
+                print(f"停止 torch.profiler 失败: {e}")
+                torch_prof = None
+        sampler.stop()
+        elapsed = time.perf_counter() - start
+
+        stem = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_seq)}_{name}")
+        # 剖析是附带的：写文件、生成摘要（pstats / torch.profiler）或清理失败都不能让已经完成的请求失败，
+        # 也不能掩盖请求本身的异常
+        try:
+            os.makedirs(directory, exist_ok=True)
+            _dump(stem, name, elapsed, prof, sampler, torch_prof)
+            info.update(path=stem, ms=elapsed * 1000)
+        except Exception as e:
+            print(f"写出剖析结果失败: {e}")
+        try:
+            _rotate(directory, keep or PROFILE_KEEP)
+        except Exception as e:
+            print(f"清理旧剖析结果失败: {e}")
+
+
+@contextmanager
+def _exclusive(name, extra_threads):
+    try:
+        with profile(name, extra_threads) as info:
+            yield info
+    finally:
+        _busy.release()
+
+
+def maybe_profile(name, header_value=None, extra_threads=()):
+    """抽中且当前没有其他剖析在进行时返回 profile 上下文，否则返回空上下文"""
+    if should_profile(header_value) and _busy.acquire(blocking=False):
+        return _exclusive(name, extra_threads)
+    return nullcontext({})
+
+
+def merge_collapsed(directory):
+    """合并目录下所有折叠栈"""
+    merged = collections.Counter()
+    for path in glob.glob(os.path.join(directory, '*.collapsed')):
+        with open(path) as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack:
+                    merged[stack] += int(count)
+    return merged
+
+
+def summarize(directory, top=30):
+    """按自身采样数（栈顶函数）统计热点，返回 (总采样数, [(函数, 采样数)])"""
+    self_counts = collections.Counter()
+    for stack, count in merge_collapsed(directory).items():
+        self_counts[stack.rsplit(';', 1)[-1]] += count
+    return sum(self_counts.values()), self_counts.most_common(top)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="汇总剖析结果中的热点函数")
+    parser.add_argument('directory', nargs='?', default=PROFILE_DIR)
+    parser.add_argument('--top', type=int, default=30)
+    parser.add_argument('--merge', default=None, help='把所有折叠栈合并写入该文件（用于生成整体火焰图）')
+    args = parser.parse_args()
+
+    total, hot = summarize(args.directory, args.top)
+    if not total:
+        print(f"{args.directory} 中没有剖析结果")
+        return
+    print(f"共 {total} 个采样")
+    for func, count in hot:
+        print(f"{count / total * 100:6.1f}%  {func}")
+
+    if args.merge:
+        merged = merge_collapsed(args.directory)
+        with open(args.merge, 'w') as f:
+            f.write(''.join(f"{s} {c}\n" for s, c in merged.most_common()))
+        print(f"已写入 {args.merge}（flamegraph.pl {args.merge} > flame.svg）")
+
+
+if __name__ == '__main__':
+    main()
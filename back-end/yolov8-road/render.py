@@ -0,0 +1,70 @@
+"""
+检测结果绘制（服务端、GUI、批量工具、视频共用）
+
+- 所有框/置信度/类别一次性取到 NumPy（一次设备到主机拷贝），不再逐框索引张量
+- 标签文字及其尺寸按 (类别, 置信度百分位, 字号, 线宽) 缓存，不重复调用 cv2.getTextSize
+- 坐标取整、线宽、标签位置裁剪全部向量化计算，然后单次循环绘制
+"""
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+font = cv2.FONT_HERSHEY_DUPLEX
+BOX_COLOR = (0, 0, 255)      # bgr
+TEXT_COLOR = (255, 255, 255)  # bgr
+PADDING = 5
+
+
+def result_to_numpy(r):
+    """Results → (N,6) [x1, y1, x2, y2, conf, cls]，一次拷贝到主机"""
+    return r.boxes.data.cpu().numpy()[:, :6]
+
+
+def font_scale_for(height, width):
+    """根据图像尺寸选择字号"""
+    return 0.5 if height < 600 or width < 600 else 0.7
+
+
+@lru_cache(maxsize=None)
+def _label(name, conf_pct, font_scale, thickness):
+    """缓存标签文字和尺寸：返回 (text, box_w, box_h, baseline)"""
+    text = f"{name} {conf_pct / 100}"
+    (tw, th), baseline = cv2.getTextSize(text, font, font_scale, thickness)
+    return text, tw + 2 * PADDING, th + 2 * PADDING + baseline, baseline
+
+
+def render(img, dets, names, track_ids=None):
+    """
+    在 img 上就地绘制检测结果并返回 img
+    dets: (N,6) 数组 [x1, y1, x2, y2, conf, cls]（见 result_to_numpy）
+    names: 类别名称（list 或 {id: name}）
+    track_ids: 可选，每个框的跟踪编号，显示为 "#id"
+    """
+    if len(dets) == 0:
+        return img
+    height, width = img.shape[:2]
+    font_scale = font_scale_for(height, width)
+
+    xyxy = dets[:, :4].astype(np.int32)
+    conf_pct = np.rint(dets[:, 4] * 100).astype(np.int32)
+    cls = dets[:, 5].astype(np.int32)
+    thick = np.where(xyxy[:, 2] - xyxy[:, 0] < 210, 1, 2)
+
+    labels = [_label(names[c], p, font_scale, t) for c, p, t in zip(cls.tolist(), conf_pct.tolist(), thick.tolist())]
+    box_w = np.array([lb[1] for lb in labels])
+    box_h = np.array([lb[2] for lb in labels])
+    # 标签背景框不超出图像边界
+    lx = np.clip(np.minimum(xyxy[:, 0], width - box_w), 0, None)
+    ly = np.maximum(box_h, np.minimum(xyxy[:, 1], height))
+
+    rows = zip(xyxy.tolist(), labels, lx.tolist(), ly.tolist(), thick.tolist())
+    for i, ((x1, y1, x2, y2), (text, bw, bh, baseline), x, y, t) in enumerate(rows):
+        cv2.rectangle(img, (x1, y1), (x2, y2), BOX_COLOR, 2)
+        if track_ids is not None:
+            text = f"#{track_ids[i]} {text}"
+            (tw, _), _ = cv2.getTextSize(text, font, font_scale, t)
+            bw = tw + 2 * PADDING
+        cv2.rectangle(img, (x, y - bh), (x + bw, y), BOX_COLOR, -1)
+        cv2.putText(img, text, (x + PADDING, y - PADDING - baseline), font, font_scale, TEXT_COLOR, t)
+    return img
@@ -0,0 +1,111 @@
+"""
+检测结果缓存：按 (上传字节哈希 + 模型版本 + 推理设置) 缓存响应，重复上传直接命中，跳过解码和推理
+
+内存层按字节大小做 LRU 淘汰；可选磁盘层（淘汰的条目仍可从磁盘命中）。
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+def make_key(img_bytes, model_version, settings):
+    """缓存键：上传内容、模型版本和推理设置共同决定"""
+    h = hashlib.sha256()
+    h.update(img_bytes)
+    h.update(b'\0' + str(model_version).encode())
+    h.update(b'\0' + repr(sorted(settings.items())).encode())
+    return h.hexdigest()
+
+
+class ResultCache:
+    """线程安全的两级缓存，值为 (mimetype, bytes)"""
+
+    def __init__(self, max_bytes, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item
+        item = self._disk_get(key)
+        with self._lock:
+            if item is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._put_memory(key, item)
+        return item
+
+    def put(self, key, mimetype, data):
+        item = (mimetype, bytes(data))
+        with self._lock:
+            self._put_memory(key, item)
+        self._disk_put(key, item)
+
+    def _put_memory(self, key, item):
+        size = len(item[1])
+        if size > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self._size -= len(old[1])
+        self._items[key] = item
+        self._size += size
+        while self._size > self.max_bytes:
+            _, (_, evicted) = self._items.popitem(last=False)
+            self._size -= len(evicted)
+            self.evictions += 1
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                mimetype = f.readline().decode().strip()
+                return mimetype, f.read()
+        except OSError:
+            return None
+
+    def _disk_put(self, key, item):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再改名，避免并发读到半个文件
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(item[0].encode() + b'\n')
+            f.write(item[1])
+        os.replace(tmp, path)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._items),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+            }
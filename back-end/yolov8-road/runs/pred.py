@@ -55,8 +55,8 @@ def get_optimal_font_scale(text, width):
 # 加载YOLO模型
 model = YOLO("./runs/detect/yolov8n_v8_300e/weights/best.pt")
 
-# 定义类别名称
-classNames = ["Fire", "Smoke"]
+# 定义类别名称（从模型读取，与权重对应的 data.yaml 一致）
+classNames = [model.names[i] for i in sorted(model.names)]
 
 # 进行预测
 def pred(img, stream=False):
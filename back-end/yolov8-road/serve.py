@@ -0,0 +1,323 @@
+"""
+生产部署模式：HTTP 前端 + N 个推理工作进程
+
+每个工作进程各自加载一份模型，绑定到一部分 CPU 核心，并设置对应的 torch 线程数，
+从前端的任务队列中逐个取请求；前端进程只负责收发数据，不做解码和推理，因此保持响应。
+工作进程只导入 inference.py（模型、检测和结果缓存，缓存容量按进程数平分），
+带 GPS 的检测结果随响应返回，由前端进程唯一的 DefectStore 写入缺陷位置库。
+进程数不超过可用核心数，每个进程独占自己的核心。
+处理请求时的异常返回 500 而不会让进程退出；进程意外退出（段错误、OOM 等）时，
+它正在处理的请求返回 500，并用同样的核心和线程数重启一个新进程。
+
+用法: python serve.py --workers 4 --port 5001
+"""
+import argparse
+import itertools
+import json
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as ResultTimeout
+
+from flask import Flask, request, jsonify
+from flask_cors import CORS
+
+import metrics
+from defect_store import DefectStore, create_blueprint
+
+
+def available_cores():
+    """当前进程允许使用的 CPU 核心列表"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def split_cores(cores, n):
+    """把核心尽量平均地分成 n 组；n 超过核心数时只分成 len(cores) 组（每组一个核心），避免线程争抢"""
+    n = max(1, min(n, len(cores)))
+    size, extra = divmod(len(cores), n)
+    groups, start = [], 0
+    for i in range(n):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(cores[start:end])
+        start = end
+    return groups
+
+
+def _worker_main(cores, threads, cache_mb, conn):
+    """工作进程入口：绑核、设置线程数、加载模型，然后循环处理前端经 conn 发来的任务"""
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    # 进程内串行处理任务，关闭动态批处理；结果缓存按进程数平分
+    os.environ['BATCH_MAX_SIZE'] = '1'
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.environ['RESULT_CACHE_MB'] = str(cache_mb)
+
+    import torch
+    torch.set_num_threads(threads)
+
+    import inference as detector
+    # 等模型加载和预热完成后再接收任务
+    detector.start().join()
+    if not detector.ready.is_set():
+        conn.send(('failed', detector.startup_info.get('error')))
+        return
+    conn.send(('ready', None))
+
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        img_bytes, as_json, args, source = task
+        try:
+            options = detector.detect_options(args)
+        except ValueError as e:
+            conn.send((400, 'application/json', detector.error_body(str(e)), []))
+            continue
+        # 缺陷位置不在工作进程写库，随结果交给前端进程
+        records = []
+        try:
+            status, mimetype, body = detector.detect_bytes(
+                img_bytes, source, as_json, options, lambda *record: records.append(record))
+            # 编码后的图片是 memoryview，跨进程传递前转为 bytes
+            body = bytes(body)
+        except Exception as e:
+            print(f"推理进程 pid={os.getpid()} 处理请求失败: {e}")
+            status, mimetype, body = 500, 'application/json', detector.error_body(f'Detection failed: {e}')
+            records = []
+        conn.send((status, mimetype, body, records))
+
+
+class WorkerPool:
+    """
+    推理工作进程池：前端任务队列 + 每个工作进程一个管道和一个收发线程
+    每个进程同时只处理一个任务，收发线程取任务、等结果，因此知道每个进程在处理哪个请求；
+    进程意外退出时管道读到 EOF，该请求返回 500，之后重启进程（管道是进程独占的，
+    进程被杀掉不会留下其他进程共用的锁）
+    defect_store: 写入工作进程返回的缺陷位置（None 时丢弃）
+    """
+
+    def __init__(self, workers, threads_per_worker=None, queue_size=64, defect_store=None):
+        self._ctx = mp.get_context('spawn')
+        self.tasks = queue.Queue(maxsize=queue_size)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._ready = threading.Semaphore(0)
+        # 已就绪的进程 pid（由 _lock 保护）
+        self._ready_pids = set()
+        self.defect_store = defect_store
+
+        groups = split_cores(available_cores(), workers)
+        if len(groups) < workers:
+            print(f"只有 {len(groups)} 个可用核心，推理进程数从 {workers} 降为 {len(groups)}")
+        cache_mb = float(os.environ.get('RESULT_CACHE_MB', '256')) / len(groups)
+        self.procs = [None] * len(groups)
+        self._threads = []
+        for i, cores in enumerate(groups):
+            # 每个进程的启动参数，重启时沿用
+            slot = (cores, threads_per_worker or max(1, len(cores)), cache_mb)
+            t = threading.Thread(target=self._run_slot, args=(i, slot), name=f"worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    @property
+    def ready_workers(self):
+        with self._lock:
+            return len(self._ready_pids)
+
+    def _spawn(self, i, cores, threads, cache_mb):
+        conn, child_conn = self._ctx.Pipe()
+        p = self._ctx.Process(target=_worker_main, args=(cores, threads, cache_mb, child_conn), daemon=True)
+        p.start()
+        # 关闭本进程中的子进程端，子进程退出时 recv 才会得到 EOF
+        child_conn.close()
+        self.procs[i] = p
+        print(f"启动推理进程 pid={p.pid} cores={cores} threads={threads}")
+        return p, conn
+
+    def _run_slot(self, i, slot):
+        """第 i 个工作进程的收发线程：启动进程，转发任务；就绪后意外退出时重启（启动失败的不重启）"""
+        while True:
+            p, conn = self._spawn(i, *slot)
+            try:
+                state, error = conn.recv()
+            except (EOFError, OSError):
+                p.join()
+                state, error = 'failed', f'exitcode={p.exitcode}'
+            if state != 'ready':
+                print(f"推理进程 pid={p.pid} 启动失败: {error}")
+                self._ready.release()
+                return
+            with self._lock:
+                self._ready_pids.add(p.pid)
+            self._ready.release()
+
+            if self._serve(p, conn):
+                return
+            print(f"推理进程 pid={p.pid} 意外退出（exitcode={p.exitcode}），重启")
+            metrics.WORKER_RESTARTS.inc()
+
+    def _serve(self, p, conn):
+        """把任务逐个发给进程并分发结果；正常关闭时返回 True，进程意外退出时返回 False"""
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                conn.send(None)
+                p.join(timeout=10)
+                return True
+            req_id, *payload = task
+            try:
+                conn.send(payload)
+                status, mimetype, body, records = conn.recv()
+            except (EOFError, OSError):
+                p.join()
+                with self._lock:
+                    self._ready_pids.discard(p.pid)
+                self._finish(req_id, 500, 'application/json',
+                             json.dumps({'error': 'Inference worker exited unexpectedly'}).encode())
+                return False
+            self._finish(req_id, status, mimetype, body)
+            if self.defect_store is not None:
+                for gps, detections, source in records:
+                    self.defect_store.add_detections(gps, detections, source)
+
+    def _finish(self, req_id, status, mimetype, body):
+        with self._lock:
+            fut = self._pending.pop(req_id, None)
+        if fut is not None:
+            fut.set_result((status, mimetype, body))
+
+    def wait_ready(self, timeout=None):
+        """等待所有工作进程加载并预热完模型，全部成功时返回 True"""
+        for _ in self.procs:
+            if not self._ready.acquire(timeout=timeout):
+                return False
+        return self.ready_workers == len(self.procs)
+
+    def submit(self, img_bytes, as_json, args=None, source=None, timeout=1.0):
+        """
+        提交任务，返回 Future[(status, mimetype, body)]（fut.req_id 供 cancel 使用）；队列已满时抛出 queue.Full
+        args: 请求的查询参数 dict，由工作进程中的 inference.detect_options 解析
+        source: 上传文件名，写入缺陷位置库
+        """
+        req_id = next(self._ids)
+        fut = Future()
+        fut.req_id = req_id
+        with self._lock:
+            self._pending[req_id] = fut
+        try:
+            self.tasks.put((req_id, img_bytes, as_json, args or {}, source), timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self._pending.pop(req_id, None)
+            raise
+        return fut
+
+    def cancel(self, req_id):
+        """放弃等待一个任务（请求超时）：之后到达的结果直接丢弃"""
+        with self._lock:
+            self._pending.pop(req_id, None)
+
+    def close(self):
+        for t in self._threads:
+            if t.is_alive():
+                self.tasks.put(None)
+        for t in self._threads:
+            t.join(timeout=15)
+
+
+def create_app(pool, defect_store=None, request_timeout=120):
+    app = Flask(__name__)
+    CORS(app)
+
+    # 前端进程的指标：各接口请求数/耗时、任务队列深度、就绪进程数
+    # （解码、推理等阶段耗时在工作进程中，单进程运行 app.py 时可见）
+    metrics.instrument(app)
+    metrics.QUEUE_DEPTH.set_function(pool.tasks.qsize, queue='workers')
+    metrics.WORKERS_READY.set_function(lambda: pool.ready_workers)
+
+    # 缺陷位置库只在前端进程打开：写入工作进程返回的记录（见 WorkerPool），并提供查询接口
+    if defect_store is not None:
+        app.register_blueprint(create_blueprint(defect_store))
+
+    @app.route('/ping')
+    def ping():
+        return 'pong'
+
+    @app.route('/ready')
+    def ready():
+        """所有推理进程都加载并预热完成后返回 200（/ping 只表示前端进程存活）"""
+        ok = pool.ready_workers == len(pool.procs)
+        return jsonify({'ready': ok, 'ready_workers': pool.ready_workers, 'workers': len(pool.procs)}), 200 if ok else 503
+
+    @app.route('/detect', methods=['POST'])
+    def detect():
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file uploaded'}), 400
+
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'error': 'Empty filename'}), 400
+
+        img_bytes = file.read()
+        if len(img_bytes) == 0:
+            return jsonify({'error': 'Empty file content'}), 400
+
+        fmt = request.args.get('format', '').lower()
+        if fmt:
+            as_json = fmt == 'json'
+        else:
+            as_json = request.accept_mimetypes.best_match(['image/png', 'application/json']) == 'application/json'
+
+        try:
+            fut = pool.submit(img_bytes, as_json, request.args.to_dict(), file.filename)
+        except queue.Full:
+            metrics.ERRORS.inc(type='queue_full')
+            return jsonify({'error': 'Server busy, try again later'}), 503
+        try:
+            status, mimetype, body = fut.result(timeout=request_timeout)
+        except ResultTimeout:
+            pool.cancel(fut.req_id)
+            metrics.ERRORS.inc(type='timeout')
+            return jsonify({'error': f'Detection timed out after {request_timeout}s'}), 504
+        return app.response_class(body, status=status, mimetype=mimetype)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程 YOLO 检测服务")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--workers', type=int, default=max(1, len(available_cores()) // 2),
+                        help='推理进程数（不超过可用核心数）')
+    parser.add_argument('--threads', type=int, default=None, help='每个进程的 torch 线程数（默认=分到的核心数）')
+    parser.add_argument('--queue-size', type=int, default=64)
+    args = parser.parse_args()
+
+    db_path = os.environ.get('DEFECT_DB', 'defects.db')
+    defect_store = DefectStore(db_path) if db_path else None
+    pool = WorkerPool(args.workers, args.threads, args.queue_size, defect_store)
+
+    # HTTP 服务立即启动（/ping 可用），推理进程就绪情况由 /ready 报告；
+    # 启动期间提交的请求在任务队列中等待
+    def report_ready():
+        start = time.perf_counter()
+        ok = pool.wait_ready()
+        print(f"{pool.ready_workers}/{len(pool.procs)} 个推理进程已就绪，耗时 {time.perf_counter() - start:.1f}s"
+              + ("" if ok else "（部分进程启动失败）"))
+
+    threading.Thread(target=report_ready, name="ready-reporter", daemon=True).start()
+
+    try:
+        create_app(pool, defect_store).run(host=args.host, port=args.port, threaded=True)
+    finally:
+        pool.close()
+
+
+if __name__ == '__main__':
+    main()
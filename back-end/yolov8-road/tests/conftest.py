@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 服务模块是平铺的脚本（import batcher、import policy …），测试时把项目目录加入搜索路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,29 @@
+import os
+
+from backends import artifact_path, export, is_stale
+
+
+def test_artifact_is_stale_after_retraining(tmp_path):
+    weights = tmp_path / 'best.pt'
+    weights.write_bytes(b'w')
+    target = tmp_path / 'best.onnx'
+    assert is_stale(str(weights), str(target))
+    target.write_bytes(b'm')
+    os.utime(weights, (1000, 1000))
+    os.utime(target, (2000, 2000))
+    assert not is_stale(str(weights), str(target))
+    os.utime(weights, (3000, 3000))
+    assert is_stale(str(weights), str(target))
+    # 只分发了导出文件、没有权重时照常使用
+    assert not is_stale(str(tmp_path / 'missing.pt'), str(target))
+
+
+def test_export_reuses_fresh_artifact(tmp_path):
+    weights = tmp_path / 'best.pt'
+    weights.write_bytes(b'w')
+    target = tmp_path / 'best_openvino_model'
+    target.mkdir()
+    assert artifact_path(str(weights), 'openvino') == str(target)
+    os.utime(weights, (1000, 1000))
+    assert export(str(weights), 'openvino') == str(target)
+    assert export(str(weights), 'pytorch') == str(weights)
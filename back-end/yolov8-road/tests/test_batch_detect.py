@@ -0,0 +1,45 @@
+import csv
+
+from batch_detect import load_done, prune_csv, truncate_partial
+
+
+def test_truncate_partial_drops_incomplete_last_line(tmp_path):
+    path = tmp_path / 'detections.jsonl'
+    path.write_text('{"file": "a"}\n{"file": "b"}\n{"file": "c", "wid')
+    truncate_partial(str(path), chunk=4)
+    assert path.read_text() == '{"file": "a"}\n{"file": "b"}\n'
+    # 续写的记录从新行开始，文件保持可解析
+    with open(path, 'a') as f:
+        f.write('{"file": "d"}\n')
+    assert load_done(str(path)) == {'a', 'b', 'd'}
+
+
+def test_truncate_partial_complete_file_unchanged(tmp_path):
+    path = tmp_path / 'detections.jsonl'
+    path.write_text('{"file": "a"}\n')
+    truncate_partial(str(path))
+    assert path.read_text() == '{"file": "a"}\n'
+
+
+def test_truncate_partial_without_newline_empties_file(tmp_path):
+    path = tmp_path / 'detections.jsonl'
+    path.write_text('{"file": "a"')
+    truncate_partial(str(path))
+    assert path.read_text() == ''
+    truncate_partial(str(tmp_path / 'missing.jsonl'))
+
+
+def test_prune_csv_drops_rows_of_unfinished_images(tmp_path):
+    path = tmp_path / 'detections.csv'
+    with open(path, 'w', newline='') as f:
+        csv.writer(f).writerows([['file', 'class'], ['a', 'pothole'], ['b', 'cracks'], ['a', 'cracks']])
+    assert prune_csv(str(path), {'a'}) == 1
+    with open(path, newline='') as f:
+        assert list(csv.reader(f)) == [['file', 'class'], ['a', 'pothole'], ['a', 'cracks']]
+    assert prune_csv(str(path), {'a'}) == 0
+
+
+def test_load_done_retries_failed_images(tmp_path):
+    path = tmp_path / 'detections.jsonl'
+    path.write_text('{"file": "a", "detections": []}\n{"file": "b", "error": "cannot decode"}\n[1]\n')
+    assert load_done(str(path)) == {'a'}
@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+
+from batcher import MicroBatcher
+
+
+def echo(calls):
+    def infer(imgs, **kwargs):
+        calls.append((list(imgs), kwargs))
+        return [(img, kwargs) for img in imgs]
+    return infer
+
+
+def submit_all(batcher, items):
+    """同时提交 [(img, key)]，返回各自的 Future"""
+    futures = [None] * len(items)
+    start = threading.Barrier(len(items))
+
+    def run(i, img, key):
+        start.wait()
+        futures[i] = batcher.submit(img, key)
+
+    threads = [threading.Thread(target=run, args=(i, *item)) for i, item in enumerate(items)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return futures
+
+
+def test_concurrent_requests_share_a_batch():
+    calls = []
+    batcher = MicroBatcher(echo(calls), max_batch_size=4, max_wait_ms=200)
+    try:
+        futures = submit_all(batcher, [(i, ()) for i in range(4)])
+        assert sorted(f.result(5)[0] for f in futures) == [0, 1, 2, 3]
+    finally:
+        batcher.close()
+    assert len(calls) == 1 and len(calls[0][0]) == 4
+
+
+def test_batch_size_is_capped():
+    calls = []
+    batcher = MicroBatcher(echo(calls), max_batch_size=2, max_wait_ms=50)
+    try:
+        futures = submit_all(batcher, [(i, ()) for i in range(5)])
+        assert sorted(f.result(5)[0] for f in futures) == list(range(5))
+    finally:
+        batcher.close()
+    assert max(len(imgs) for imgs, _ in calls) <= 2
+
+
+def test_different_keys_are_not_merged():
+    calls = []
+    batcher = MicroBatcher(echo(calls), max_batch_size=8, max_wait_ms=100)
+    small, large = (('imgsz', 320),), (('imgsz', 640),)
+    try:
+        futures = submit_all(batcher, [(0, small), (1, large), (2, small), (3, large)])
+        results = [f.result(5) for f in futures]
+    finally:
+        batcher.close()
+    assert [r[1] for r in results] == [{'imgsz': 320}, {'imgsz': 640}, {'imgsz': 320}, {'imgsz': 640}]
+    for imgs, kwargs in calls:
+        assert {i % 2 for i in imgs} == {0 if kwargs['imgsz'] == 320 else 1}
+
+
+def test_inference_error_fails_the_whole_batch():
+    def fail(imgs, **kwargs):
+        raise RuntimeError('boom')
+
+    batcher = MicroBatcher(fail, max_batch_size=4, max_wait_ms=1)
+    try:
+        with pytest.raises(RuntimeError, match='boom'):
+            batcher.predict('img', timeout=5)
+    finally:
+        batcher.close()
+
+
+def test_result_count_mismatch_is_an_error():
+    batcher = MicroBatcher(lambda imgs, **kwargs: [], max_batch_size=4, max_wait_ms=1)
+    try:
+        with pytest.raises(RuntimeError):
+            batcher.predict('img', timeout=5)
+    finally:
+        batcher.close()
+
+
+def test_close_finishes_queued_requests_and_rejects_new_ones():
+    calls = []
+    batcher = MicroBatcher(echo(calls), max_batch_size=2, max_wait_ms=1)
+    futures = [batcher.submit(i) for i in range(3)]
+    batcher.close()
+    assert [f.result(5)[0] for f in futures] == [0, 1, 2]
+    with pytest.raises(RuntimeError):
+        batcher.submit(3)
+
+
+def test_public_thread_id_and_qsize():
+    batcher = MicroBatcher(echo([]), max_batch_size=2, max_wait_ms=1)
+    try:
+        assert batcher.thread_id in {t.ident for t in threading.enumerate() if t.name == 'micro-batcher'}
+        assert batcher.qsize() == 0
+    finally:
+        batcher.close()
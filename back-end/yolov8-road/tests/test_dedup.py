@@ -0,0 +1,68 @@
+import cv2
+import numpy as np
+
+from dedup import clusters, near_pairs, phash, prune, report, source_name
+
+SPLITS = ['train', 'train', 'train', 'val', 'val', 'test', 'val', 'val']
+CLUSTERS = np.array([0, 0, 0, 0, 1, 1, 2, 2])
+PATHS = [f'{i}.jpg' for i in range(len(SPLITS))]
+
+
+def test_phash_matches_flipped_copy(tmp_path):
+    rng = np.random.default_rng(0)
+    img = cv2.resize(rng.integers(0, 255, (8, 8, 3), dtype=np.uint8), (128, 96), interpolation=cv2.INTER_CUBIC)
+    cv2.imwrite(str(tmp_path / 'a.png'), img)
+    cv2.imwrite(str(tmp_path / 'b.png'), cv2.flip(img, 1))
+    a, b = phash(str(tmp_path / 'a.png')), phash(str(tmp_path / 'b.png'))
+    assert a.shape == (8,) and a.dtype == np.uint64
+    pairs = near_pairs(np.stack([a, b]), threshold=4)
+    assert pairs.tolist() == [[0, 1]]
+    (tmp_path / 'broken.jpg').write_bytes(b'not an image')
+    assert phash(str(tmp_path / 'broken.jpg')) is None
+
+
+def test_near_pairs_uses_min_distance_over_variants():
+    far = np.uint64(0xFFFF_FFFF_FFFF_FFFF)
+    hashes = np.full((4, 8), far, dtype=np.uint64)
+    hashes[0, 0] = 0
+    hashes[1, 0] = 0b111               # 与 0 距离 3
+    hashes[2, 0] = 0xFFFF_0000         # 原图相差很远，变换后与 0 相同
+    hashes[2, 5] = 0
+    hashes[3, 0] = 0xFFFF_FFFF_0000_0000
+    assert near_pairs(hashes, threshold=3, chunk=2).tolist() == [[0, 1], [0, 2], [1, 2]]
+    assert near_pairs(hashes, threshold=2).tolist() == [[0, 2]]
+    assert near_pairs(np.zeros((0, 8), np.uint64)).shape == (0, 2)
+
+
+def test_clusters_merge_pairs_and_source_names():
+    names = [source_name(p) for p in ('173_png_jpg.rf.0ed585.jpg', 'x.jpg', '173_png_jpg.rf.5fa954.jpg',
+                                      'y.rf.ab.jpg', 'z.jpg')]
+    assert names == ['173_png_jpg', None, '173_png_jpg', 'y', None]
+    assert clusters(5, np.array([[1, 3]])).tolist() == [0, 1, 2, 1, 4]
+    assert clusters(5, np.array([[1, 3]]), names).tolist() == [0, 1, 0, 1, 4]
+
+
+def test_prune_caps_train_and_keeps_eval_splits():
+    # 簇 0 跨 train/val：归入 val，train 的 3 张全部去掉；簇 1 归入 test；簇 2 只在 val，不裁剪
+    assert prune(SPLITS, CLUSTERS, PATHS, keep=1) == [3, 5, 6, 7]
+    assert prune(SPLITS, CLUSTERS, PATHS, keep=0) == [3, 5, 6, 7]
+
+
+def test_prune_keep_limits_train_only_clusters():
+    splits = ['train'] * 4 + ['val'] * 2
+    cids = np.array([0, 0, 0, 1, 2, 2])
+    paths = ['c.jpg', 'a.jpg', 'b.jpg', 'd.jpg', 'e.jpg', 'f.jpg']
+    assert prune(splits, cids, paths, keep=1) == [1, 3, 4, 5]
+    assert prune(splits, cids, paths, keep=2) == [1, 2, 3, 4, 5]
+    assert prune(splits, cids, paths, keep=0) == [0, 1, 2, 3, 4, 5]
+
+
+def test_report_counts_leaked_images():
+    kept = prune(SPLITS, CLUSTERS, PATHS, keep=1)
+    summary = report(PATHS, SPLITS, CLUSTERS, kept, threshold=10)
+    assert summary['images'] == {'train': 3, 'val': 4, 'test': 1}
+    assert summary['kept'] == {'train': 0, 'val': 3, 'test': 1}
+    assert summary['leaked'] == {'train': 3, 'val': 1, 'test': 0}
+    assert summary['duplicates'] == {'train': 2, 'val': 1, 'test': 0}
+    assert summary['leakage_clusters'] == {'train/val': 1, 'val/test': 1}
+    assert summary['clusters'] == 3
@@ -0,0 +1,80 @@
+import pytest
+
+from defect_store import DefectStore, haversine, meters_to_degrees
+
+
+@pytest.fixture
+def store():
+    s = DefectStore(':memory:')
+    yield s
+    s.close()
+
+
+def test_nearby_reports_of_same_class_are_merged(store):
+    first = store.add_report(30.0, 120.0, 'pothole', 0.6)
+    dlat, _ = meters_to_degrees(3.0, 30.0)
+    assert store.add_report(30.0 + dlat, 120.0, 'pothole', 0.9) == first
+    assert store.add_report(30.0, 120.0, 'cracks', 0.5) != first
+    far, _ = meters_to_degrees(50.0, 30.0)
+    assert store.add_report(30.0 + far, 120.0, 'pothole', 0.5) != first
+    row = store.query_radius(30.0, 120.0, 1.0, cls='pothole')[0]
+    assert row['report_count'] == 2 and row['confidence'] == 0.9
+
+
+def test_add_detections_keeps_best_confidence_per_class(store):
+    detections = [{'class': 'pothole', 'confidence': 0.4}, {'class': 'pothole', 'confidence': 0.8},
+                  {'class': 'cracks', 'confidence': 0.5}]
+    assert len(store.add_detections((30.0, 120.0), detections, 'a.jpg')) == 2
+    rows = {r['class']: r for r in store.query_bbox(29.9, 119.9, 30.1, 120.1)}
+    assert rows['pothole']['confidence'] == 0.8 and rows['pothole']['source'] == 'a.jpg'
+
+
+def test_bbox_includes_points_on_the_edge(store):
+    # R-tree 存 float32：包含条件会漏掉边界上的点
+    lat, lon = 30.123456789, 120.987654321
+    store.bulk_insert([(lat, lon, 'pothole', 0.9)])
+    assert len(store.query_bbox(lat, lon, lat, lon)) == 1
+    assert len(store.query_bbox(lat, lon, lat + 1, lon + 1)) == 1
+    assert len(store.query_bbox(lat - 1, lon - 1, lat, lon)) == 1
+
+
+def test_bbox_excludes_points_just_outside(store):
+    lat, lon = 30.123456789, 120.987654321
+    store.bulk_insert([(lat, lon, 'pothole', 0.9)])
+    # 与边界相差远小于 float32 精度：R-tree 预筛选命中，精确过滤排除
+    assert store.query_bbox(lat + 1e-9, lon, lat + 1, lon + 1) == []
+    assert store.query_bbox(lat - 1, lon - 1, lat, lon - 1e-9) == []
+
+
+def test_bbox_class_filter_and_limit(store):
+    store.bulk_insert([(30.0, 120.0 + i * 0.001, 'pothole', 0.9) for i in range(5)]
+                      + [(30.0, 120.0, 'cracks', 0.5)])
+    assert len(store.query_bbox(29, 119, 31, 121, cls='pothole')) == 5
+    assert len(store.query_bbox(29, 119, 31, 121, limit=2)) == 2
+
+
+def test_radius_query_sorted_by_distance(store):
+    d50, _ = meters_to_degrees(50.0, 30.0)
+    d10, _ = meters_to_degrees(10.0, 30.0)
+    store.bulk_insert([(30.0 + d50, 120.0, 'pothole', 0.9), (30.0 + d10, 120.0, 'pothole', 0.9),
+                       (30.0 + 3 * d50, 120.0, 'pothole', 0.9)])
+    rows = store.query_radius(30.0, 120.0, 60.0)
+    assert [round(r['distance_m']) for r in rows] == [10, 50]
+
+
+def test_radius_query_includes_point_exactly_at_center(store):
+    store.bulk_insert([(30.0, 120.0, 'pothole', 0.9)])
+    assert len(store.query_radius(30.0, 120.0, 0.0)) == 1
+
+
+def test_grid_counts(store):
+    store.bulk_insert([(30.0001, 120.0001, 'pothole', 0.9), (30.0002, 120.0002, 'pothole', 0.9),
+                       (30.0051, 120.0001, 'pothole', 0.9), (30.0001, 120.0001, 'cracks', 0.9)])
+    cells = store.grid_counts(30.0, 120.0, 30.01, 120.01, cell_deg=0.005)
+    counts = {(c['cell_min_lat'], c['class']): c['defects'] for c in cells}
+    assert counts == {(30.0, 'pothole'): 2, (30.005, 'pothole'): 1, (30.0, 'cracks'): 1}
+
+
+def test_haversine():
+    assert haversine(0, 0, 0, 0) == 0
+    assert round(haversine(0, 0, 1, 0) / 1000) == 111
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from evaluate import IOU_THRESHOLDS, Predictions, ap_per_class, confusion_matrix, iou_matrix, match, sweep
+
+
+def make_preds(images, names=('cracks', 'pothole')):
+    """images: [(预测 [[x1, y1, x2, y2, conf, cls]], 标注 [[cls, x1, y1, x2, y2]])]"""
+    pred = [np.array(p, dtype=np.float32).reshape(-1, 6) for p, _ in images]
+    gt = [np.array(g, dtype=np.float32).reshape(-1, 5) for _, g in images]
+    offsets = lambda arrays: np.cumsum([0] + [len(a) for a in arrays])
+    return Predictions([f'{i}.jpg' for i in range(len(images))], np.full((len(images), 2), 640),
+                       np.concatenate(pred), offsets(pred), np.concatenate(gt), offsets(gt), names, {})
+
+
+def test_iou_matrix():
+    a = np.array([[0, 0, 10, 10], [20, 20, 30, 30]], dtype=np.float32)
+    b = np.array([[0, 0, 10, 5], [0, 0, 10, 10]], dtype=np.float32)
+    assert iou_matrix(a, b) == pytest.approx(np.array([[0.5, 1.0], [0.0, 0.0]]))
+
+
+def test_match_is_greedy_by_confidence():
+    preds = make_preds([([[0, 0, 10, 10, 0.5, 0], [0, 0, 10, 9, 0.9, 0]], [[0, 0, 0, 10, 10]])])
+    matched = match(preds)
+    # 置信度高的预测先匹配，即使另一个预测的 IoU 更大
+    assert matched['tp'][:, 0].tolist() == [False, True]
+    assert matched['gt_conf'][0].tolist() == [pytest.approx(0.9)]
+
+
+def test_match_requires_same_class():
+    preds = make_preds([([[0, 0, 10, 10, 0.9, 1]], [[0, 0, 0, 10, 10]])])
+    matched = match(preds)
+    assert not matched['tp'].any()
+    assert not matched['gt_conf'].any()
+
+
+def test_match_per_iou_threshold():
+    # IoU = 0.72：阈值 0.5~0.7 为 TP，0.75 以上为 FP
+    preds = make_preds([([[0, 0, 10, 7.2, 0.8, 0]], [[0, 0, 0, 10, 10]])])
+    tp = match(preds)['tp'][0]
+    assert tp.tolist() == (IOU_THRESHOLDS <= 0.72).tolist()
+    assert tp.sum() == 5
+
+
+def test_match_prefers_highest_iou_available_box():
+    gt = [[0, 0, 0, 10, 10], [0, 0, 0, 10, 6]]
+    preds = make_preds([([[0, 0, 10, 9, 0.9, 0], [0, 0, 10, 6, 0.8, 0]], gt)])
+    matched = match(preds, thresholds=np.array([0.5]))
+    assert matched['tp'][:, 0].tolist() == [True, True]
+    assert matched['gt_conf'][0] == pytest.approx([0.9, 0.8])
+
+
+def test_ap_perfect_predictions():
+    preds = make_preds([([[0, 0, 10, 10, 0.9, 0]], [[0, 0, 0, 10, 10]]),
+                        ([[5, 5, 20, 20, 0.6, 1]], [[1, 5, 5, 20, 20]])])
+    ap, curves = ap_per_class(preds, match(preds), 2)
+    assert ap == pytest.approx(np.ones((2, len(IOU_THRESHOLDS))))
+    assert curves[0][1].tolist() == [1.0] and curves[0][2].tolist() == [1.0]
+
+
+def test_ap_with_false_positive():
+    # 按置信度：TP、FP、TP，共 2 个标注框；召回率 0.5 之前精度包络为 1，之后为 2/3
+    preds = make_preds([([[0, 0, 10, 10, 0.9, 0], [50, 50, 60, 60, 0.8, 0], [20, 20, 30, 30, 0.7, 0]],
+                         [[0, 0, 0, 10, 10], [0, 20, 20, 30, 30]])])
+    ap, _ = ap_per_class(preds, match(preds), 2)
+    assert ap[0, 0] == pytest.approx((51 + 50 * 2 / 3) / 101)
+    # 没有预测或没有标注的类别 AP 为 0
+    assert ap[1].tolist() == [0.0] * len(IOU_THRESHOLDS)
+
+
+def test_ap_missed_ground_truth_caps_recall():
+    preds = make_preds([([[0, 0, 10, 10, 0.9, 0]], [[0, 0, 0, 10, 10], [0, 20, 20, 30, 30]])])
+    ap, _ = ap_per_class(preds, match(preds), 1)
+    assert ap[0, 0] == pytest.approx(51 / 101)
+
+
+def test_sweep():
+    preds = make_preds([([[0, 0, 10, 10, 0.9, 0], [50, 50, 60, 60, 0.8, 0], [20, 20, 30, 30, 0.3, 0]],
+                         [[0, 0, 0, 10, 10], [0, 20, 20, 30, 30]])])
+    P, R, F1 = sweep(preds, match(preds), 2, [0.25, 0.5, 0.85, 0.95])
+    assert P[0] == pytest.approx([2 / 3, 0.5, 1.0, 0.0])
+    assert R[0] == pytest.approx([1.0, 0.5, 0.5, 0.0])
+    assert F1[0] == pytest.approx([0.8, 0.5, 2 / 3, 0.0])
+    assert not P[1].any() and not R[1].any()
+
+
+def test_confusion_matrix():
+    preds = make_preds([([[0, 0, 10, 10, 0.9, 1], [50, 50, 60, 60, 0.8, 0], [20, 20, 30, 30, 0.1, 0]],
+                         [[0, 0, 0, 10, 10], [1, 70, 70, 80, 80]])])
+    matrix = confusion_matrix(preds, 2, conf=0.25)
+    # 行：预测类别，列：真实类别，最后一行 / 列为背景
+    assert matrix.tolist() == [[0, 0, 1], [1, 0, 0], [0, 1, 0]]
@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+from jobs import JobQueue, QueueFull
+
+
+def wait_done(queue, job, timeout=5.0):
+    deadline = time.time() + timeout
+    while job.status != 'done':
+        assert time.time() < deadline, 'job did not finish'
+        queue.wait_update(job, job.version, timeout=0.1)
+
+
+class Gate:
+    """处理函数：记录处理顺序，open 之前阻塞"""
+
+    def __init__(self):
+        self.order = []
+        self.opened = threading.Event()
+
+    def __call__(self, filename, img_bytes, options):
+        self.opened.wait(5)
+        self.order.append(filename)
+        return 200, 'application/json', img_bytes
+
+
+def test_clients_are_served_round_robin():
+    gate = Gate()
+    q = JobQueue(gate, workers=1, max_queued=100, max_per_client=100)
+    try:
+        # 唯一的工作线程先取走 a0 并阻塞，之后各客户端轮流
+        a = q.submit('a', [(f'a{i}', b'x') for i in range(4)])
+        time.sleep(0.05)
+        b = q.submit('b', [('b0', b'x'), ('b1', b'x')])
+        c = q.submit('c', [('c0', b'x')])
+        gate.opened.set()
+        for job in (a, b, c):
+            wait_done(q, job)
+    finally:
+        q.close()
+    assert gate.order == ['a0', 'a1', 'b0', 'c0', 'a2', 'b1', 'a3']
+
+
+def test_backpressure_limits():
+    gate = Gate()
+    q = JobQueue(gate, workers=1, max_queued=3, max_per_client=2)
+    try:
+        q.submit('a', [('a0', b'x')])
+        time.sleep(0.05)   # a0 已在处理，不计入排队
+        q.submit('a', [('a1', b'x'), ('a2', b'x')])
+        with pytest.raises(QueueFull):
+            q.submit('a', [('a3', b'x')])
+        q.submit('b', [('b0', b'x')])
+        with pytest.raises(QueueFull):
+            q.submit('c', [('c0', b'x')])
+        assert q.metrics()['rejected'] == 2
+        with pytest.raises(ValueError):
+            q.submit('a', [])
+    finally:
+        gate.opened.set()
+        q.close()
+
+
+def test_processing_error_becomes_500():
+    def fail(filename, img_bytes, options):
+        raise RuntimeError('boom')
+
+    q = JobQueue(fail, workers=1)
+    try:
+        job = q.submit('a', [('a0', b'x')])
+        wait_done(q, job)
+    finally:
+        q.close()
+    assert job.results[0][0] == 500
+    assert job.to_dict()['items'][0] == {'file': 'a0', 'status': 'error', 'code': 500}
+
+
+def test_finished_jobs_expire_without_new_submissions():
+    q = JobQueue(lambda f, b, o: (200, 'image/png', b), workers=1, ttl=0.2, purge_interval=0.05)
+    try:
+        job = q.submit('a', [('a0', b'x')])
+        wait_done(q, job)
+        time.sleep(0.5)
+        # 空闲的工作线程定期清理，不依赖新的提交或查询
+        assert q.metrics()['jobs'] == {}
+        assert q.get(job.id) is None
+    finally:
+        q.close()
+
+
+def test_result_bytes_limit_evicts_oldest_finished_job():
+    q = JobQueue(lambda f, b, o: (200, 'image/png', memoryview(b * 100)), workers=1, max_result_bytes=250)
+    try:
+        jobs = []
+        for name in ('a', 'b', 'c'):
+            jobs.append(q.submit('x', [(name, b'z')]))
+            wait_done(q, jobs[-1])
+        assert q.get(jobs[0].id) is None
+        assert q.get(jobs[1].id) is not None and q.get(jobs[2].id) is not None
+        metrics = q.metrics()
+        assert metrics['result_bytes'] == 200 and metrics['jobs_evicted'] == 1
+    finally:
+        q.close()
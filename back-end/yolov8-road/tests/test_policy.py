@@ -0,0 +1,94 @@
+import pytest
+
+from policy import (LatencyTracker, MAX_IMGSZ, PRESETS, batch_key, choose_imgsz, model_kwargs,
+                    parse_policy, resolve, round_size)
+
+NAMES = ['Cracks', 'Pothole', 'Manhole']
+
+
+def test_round_size():
+    assert round_size(1) == 32
+    assert round_size(416) == 416
+    assert round_size(417) == 448
+    assert round_size(10 ** 6) == MAX_IMGSZ
+
+
+def test_empty_args_give_empty_policy():
+    assert parse_policy({}) == {}
+
+
+def test_preset_with_override():
+    assert parse_policy({'policy': 'preview'}) == PRESETS['preview']
+    policy = parse_policy({'policy': 'preview', 'conf': '0.1', 'imgsz': '500'})
+    assert policy['conf'] == 0.1 and policy['imgsz'] == 512 and policy['max_det'] == 50
+    with pytest.raises(ValueError):
+        parse_policy({'policy': 'fastest'})
+
+
+def test_budget_only_kept_for_auto():
+    assert parse_policy({'imgsz': 'AUTO', 'budget_ms': '0'}) == {'imgsz': 'auto', 'budget_ms': 1.0}
+    assert parse_policy({'imgsz': '640', 'budget_ms': '300'}) == {'imgsz': 640}
+    # 预设的 budget_ms 在显式指定尺寸后同样丢弃
+    assert 'budget_ms' not in parse_policy({'policy': 'accurate', 'imgsz': '640'})
+
+
+@pytest.mark.parametrize('args', [{'conf': '1.5'}, {'iou': '-0.1'}, {'imgsz': 'big'}, {'max_det': 'x'}])
+def test_invalid_values(args):
+    with pytest.raises(ValueError):
+        parse_policy(args)
+
+
+def test_classes_by_name_or_id():
+    assert parse_policy({'classes': 'pothole, 0,POTHOLE'}, NAMES) == {'classes': (0, 1)}
+    assert parse_policy({'classes': ' , '}, NAMES) == {}
+    with pytest.raises(ValueError):
+        parse_policy({'classes': 'puddle'}, NAMES)
+    with pytest.raises(ValueError):
+        parse_policy({'classes': '3'}, NAMES)
+
+
+def test_model_kwargs_and_batch_key():
+    policy = parse_policy({'imgsz': '640', 'classes': '1,0', 'half': 'true', 'conf': '0.3'}, NAMES)
+    kwargs = model_kwargs(policy)
+    assert kwargs == {'imgsz': 640, 'conf': 0.3, 'classes': [0, 1]}
+    assert model_kwargs(policy, half_supported=True)['half'] is True
+    key = batch_key(kwargs)
+    assert hash(key) == hash(batch_key(dict(reversed(list(kwargs.items())))))
+    assert key != batch_key(model_kwargs(parse_policy({'imgsz': '640', 'classes': '1', 'conf': '0.3'}, NAMES)))
+
+
+def test_tracker_extrapolates_by_pixels():
+    tracker = LatencyTracker(alpha=0.5)
+    assert tracker.estimate(416) is None
+    tracker.observe(320, 100.0)
+    tracker.observe(320, 200.0)
+    assert tracker.estimate(320) == 150.0
+    assert tracker.estimate(640) == pytest.approx(600.0)
+    assert tracker.snapshot() == {320: 150.0}
+
+
+def test_choose_imgsz_without_stats_stays_at_training_size():
+    assert choose_imgsz(4000, 1000, LatencyTracker()) == 416
+    # 小图不放大
+    assert choose_imgsz(300, 1000, LatencyTracker()) == 320
+
+
+def test_choose_imgsz_within_budget():
+    tracker = LatencyTracker()
+    tracker.observe(640, 100.0)
+    assert choose_imgsz(4000, 100.0, tracker) == 640
+    assert choose_imgsz(4000, 160.0, tracker) == 800
+    assert choose_imgsz(600, 1000.0, tracker) == 608
+    # 都超出预算时取最小候选
+    assert choose_imgsz(4000, 1.0, tracker) == 320
+
+
+def test_resolve():
+    tracker = LatencyTracker()
+    tracker.observe(640, 100.0)
+    fixed = {'imgsz': 512}
+    assert resolve(fixed, (4000, 3000), tracker) is fixed
+    policy = {'imgsz': 'auto', 'budget_ms': 100.0, 'conf': 0.2}
+    assert resolve(policy, (4000, 3000), tracker) == {'imgsz': 640, 'conf': 0.2}
+    assert resolve(policy, (4000, 3000), tracker, tile=512)['imgsz'] == 512
+    assert policy['imgsz'] == 'auto'
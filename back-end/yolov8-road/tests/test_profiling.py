@@ -0,0 +1,30 @@
+import os
+
+import profiling
+
+
+def test_profile_writes_files(tmp_path):
+    with profiling.profile('detect', directory=str(tmp_path), keep=5) as info:
+        sum(range(1000))
+    assert info['ms'] >= 0
+    assert os.path.exists(info['path'] + '.txt')
+
+
+def test_profile_summary_failure_does_not_fail_request(tmp_path, monkeypatch):
+    def broken(*args, **kwargs):
+        raise TypeError('bad stats')
+
+    monkeypatch.setattr(profiling.pstats, 'Stats', broken)
+    with profiling.profile('detect', directory=str(tmp_path)) as info:
+        result = 42
+    assert result == 42 and 'path' not in info
+
+
+def test_rotate_keeps_newest_runs(tmp_path):
+    for i in range(4):
+        for ext in ('.prof', '.txt'):
+            path = tmp_path / f'{i}_detect{ext}'
+            path.write_text('x')
+            os.utime(path, (i, i))
+    profiling._rotate(str(tmp_path), 2)
+    assert sorted(os.listdir(tmp_path)) == ['2_detect.prof', '2_detect.txt', '3_detect.prof', '3_detect.txt']
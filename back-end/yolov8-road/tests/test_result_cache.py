@@ -0,0 +1,46 @@
+from result_cache import ResultCache, make_key
+
+
+def test_key_depends_on_bytes_model_and_settings():
+    key = make_key(b'img', 'v1', {'json': True, 'imgsz': 416})
+    assert key == make_key(b'img', 'v1', {'imgsz': 416, 'json': True})
+    assert key != make_key(b'img2', 'v1', {'json': True, 'imgsz': 416})
+    assert key != make_key(b'img', 'v2', {'json': True, 'imgsz': 416})
+    assert key != make_key(b'img', 'v1', {'json': False, 'imgsz': 416})
+
+
+def test_lru_eviction_by_bytes():
+    cache = ResultCache(max_bytes=10)
+    cache.put('a', 'image/png', b'aaaa')
+    cache.put('b', 'image/png', b'bbbb')
+    assert cache.get('a') == ('image/png', b'aaaa')   # a 变为最近使用
+    cache.put('c', 'image/png', b'cccc')
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    stats = cache.stats()
+    assert stats['bytes'] <= 10 and stats['evictions'] == 1
+
+
+def test_oversized_item_is_not_cached():
+    cache = ResultCache(max_bytes=4)
+    cache.put('big', 'image/png', b'12345')
+    assert cache.get('big') is None
+    assert cache.stats()['bytes'] == 0
+
+
+def test_memoryview_values_are_copied():
+    cache = ResultCache(max_bytes=100)
+    buf = bytearray(b'abc')
+    cache.put('k', 'application/json', memoryview(buf))
+    buf[0] = ord('x')
+    assert cache.get('k') == ('application/json', b'abc')
+
+
+def test_disk_layer_survives_memory_eviction(tmp_path):
+    cache = ResultCache(max_bytes=4, disk_dir=str(tmp_path))
+    cache.put('a', 'image/png', b'aaaa')
+    cache.put('b', 'image/png', b'bbbb')
+    assert cache.get('a') == ('image/png', b'aaaa')
+    assert cache.stats()['disk_hits'] == 1
+    # 新实例（重启）也能从磁盘命中
+    assert ResultCache(max_bytes=4, disk_dir=str(tmp_path)).get('b') == ('image/png', b'bbbb')
@@ -0,0 +1,15 @@
+from serve import split_cores
+
+
+def test_split_cores_evenly():
+    assert split_cores(list(range(5)), 2) == [[0, 1, 2], [3, 4]]
+    assert split_cores(list(range(4)), 4) == [[0], [1], [2], [3]]
+
+
+def test_split_cores_never_exceeds_core_count():
+    # 进程数多于核心数时不让多个进程共用核心（torch 线程会互相争抢）
+    assert split_cores([0, 1, 2], 8) == [[0], [1], [2]]
+
+
+def test_split_cores_at_least_one_group():
+    assert split_cores([0, 1], 0) == [[0, 1]]
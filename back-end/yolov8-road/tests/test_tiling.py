@@ -0,0 +1,78 @@
+import numpy as np
+
+from ingest import MODEL_IMGSZ
+from tiling import DEFAULT_TILE, make_tiles, nms
+
+
+def covered(tiles, height, width):
+    mask = np.zeros((height, width), dtype=bool)
+    for x0, y0, x1, y1 in tiles:
+        mask[y0:y1, x0:x1] = True
+    return mask.all()
+
+
+def test_small_image_is_a_single_tile():
+    assert make_tiles(300, 500, tile=640) == [(0, 0, 500, 300)]
+
+
+def test_tiles_cover_the_image_without_overflow():
+    height, width, tile = 1500, 2000, 640
+    tiles = make_tiles(height, width, tile, overlap=0.2)
+    assert covered(tiles, height, width)
+    for x0, y0, x1, y1 in tiles:
+        assert 0 <= x0 < x1 <= width and 0 <= y0 < y1 <= height
+        assert x1 - x0 == tile and y1 - y0 == tile
+    # 最后一列 / 一行贴边
+    assert max(x1 for _, _, x1, _ in tiles) == width
+    assert max(y1 for _, _, _, y1 in tiles) == height
+
+
+def test_adjacent_tiles_overlap():
+    tiles = make_tiles(640, 2000, tile=640, overlap=0.25)
+    xs = sorted({x0 for x0, _, _, _ in tiles})
+    assert all(b - a <= 480 for a, b in zip(xs, xs[1:]))
+
+
+def test_nms_suppresses_same_class_only():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [0, 0, 10, 10]], dtype=float)
+    scores = np.array([0.9, 0.8, 0.7])
+    classes = np.array([0, 0, 1])
+    assert sorted(nms(boxes, scores, classes, 0.5, metric='iou').tolist()) == [0, 2]
+
+
+def test_nms_ios_merges_box_cut_by_tile_edge():
+    # 被切片边界截断的半个框：IoU 只有 0.5，按“交集 / 较小框面积”为 1
+    full = [0, 0, 100, 50]
+    half = [50, 0, 100, 50]
+    boxes = np.array([full, half], dtype=float)
+    scores = np.array([0.9, 0.6])
+    classes = np.array([0, 0])
+    assert nms(boxes, scores, classes, 0.6, metric='iou').tolist() == [0, 1]
+    assert nms(boxes, scores, classes, 0.6, metric='ios').tolist() == [0]
+
+
+def test_default_tile_is_training_size():
+    assert DEFAULT_TILE == MODEL_IMGSZ
+
+
+def test_nms_full_image_box_does_not_swallow_tile_box():
+    # 整图推理的大框包含切片中的细裂缝：IoS 为 1，但两者之间只按 IoU 比较
+    big = [0, 0, 400, 400]
+    crack = [100, 100, 140, 120]
+    cut = [100, 100, 120, 120]
+    boxes = np.array([big, crack, cut], dtype=float)
+    scores = np.array([0.9, 0.8, 0.7])
+    classes = np.array([0, 0, 0])
+    full = np.array([True, False, False])
+    assert nms(boxes, scores, classes, 0.5, metric='ios').tolist() == [0]
+    # 切片之间仍按 IoS 合并被截断的框
+    assert nms(boxes, scores, classes, 0.5, metric='ios', full=full).tolist() == [0, 1]
+
+
+def test_nms_keeps_highest_score_first():
+    boxes = np.array([[0, 0, 10, 10], [0, 0, 10, 10]], dtype=float)
+    assert nms(boxes, np.array([0.3, 0.95]), np.array([0, 0])).tolist() == [1]
+
+
+def test_nms_empty():
+    assert nms(np.zeros((0, 4)), np.zeros(0), np.zeros(0)).tolist() == []
@@ -0,0 +1,93 @@
+"""
+切片推理：把高分辨率图像切成带重叠的小块，一次批量送入模型，再做跨切片 NMS 合并
+
+模型训练输入为 416px（train.py），4000px 的整图缩小后细裂缝几乎消失；
+默认切片大小等于训练尺寸，每块按原分辨率送入模型。另外附加一次整图推理，保留大目标（大坑洞）。
+跨切片合并时切片之间按 IoS 合并被边界截断的框；整图推理的框与其他框之间只按 IoU 比较，
+避免一个包含细裂缝的整图大框把切片中更精确的小框抑制掉。
+"""
+import numpy as np
+
+from ingest import MODEL_IMGSZ
+
+DEFAULT_TILE = MODEL_IMGSZ
+DEFAULT_OVERLAP = 0.2
+
+
+def make_tiles(height, width, tile=DEFAULT_TILE, overlap=DEFAULT_OVERLAP):
+    """返回覆盖整图的切片坐标列表 [(x0, y0, x1, y1), ...]，相邻切片按 overlap 比例重叠"""
+    step = max(1, int(tile * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile:
+            return [0]
+        s = list(range(0, length - tile, step))
+        s.append(length - tile)  # 最后一块贴边，避免越界
+        return s
+
+    return [(x, y, min(x + tile, width), min(y + tile, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def nms(boxes, scores, classes, iou_thr=0.5, metric='ios', full=None):
+    """
+    按类别的 NMS（NumPy 实现），返回保留的下标
+    metric='ios' 时用“交集 / 较小框面积”，能合并被切片边界截断的半个框
+    full: 可选的布尔数组，标记整图推理得到的框；涉及这些框的比较总是用 IoU
+    """
+    order = np.argsort(-scores)
+    areas = np.prod(np.clip(boxes[:, 2:] - boxes[:, :2], 0, None), axis=1)
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        tl = np.maximum(boxes[i, :2], boxes[rest, :2])
+        br = np.minimum(boxes[i, 2:], boxes[rest, 2:])
+        inter = np.prod(np.clip(br - tl, 0, None), axis=1)
+        overlap = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        if metric == 'ios':
+            ios = inter / (np.minimum(areas[i], areas[rest]) + 1e-9)
+            overlap = ios if full is None else np.where(full[i] | full[rest], overlap, ios)
+        suppressed = (overlap > iou_thr) & (classes[rest] == classes[i])
+        order = rest[~suppressed]
+    return np.array(keep, dtype=int)
+
+
+def tiled_predict(model, img, tile=DEFAULT_TILE, overlap=DEFAULT_OVERLAP, batch=8,
+                  merge_iou=0.5, include_full=True, **kwargs):
+    """
+    对单张 BGR 图像做切片推理，返回与 model(img)[0] 相同类型的 Results
+    kwargs 透传给模型（conf、iou、imgsz 等）
+    """
+    height, width = img.shape[:2]
+    tiles = make_tiles(height, width, tile, overlap)
+    if len(tiles) == 1:
+        return model(img, verbose=False, **kwargs)[0]
+
+    # 切片只是原图的视图（切片索引不复制数据）
+    crops = [img[y0:y1, x0:x1] for x0, y0, x1, y1 in tiles]
+    offsets = [(x0, y0) for x0, y0, _, _ in tiles]
+    if include_full:
+        crops.append(img)
+        offsets.append((0, 0))
+
+    parts, from_full = [], []
+    for start in range(0, len(crops), batch):
+        results = model(crops[start:start + batch], verbose=False, **kwargs)
+        for k, (r, (dx, dy)) in enumerate(zip(results, offsets[start:start + batch])):
+            data = r.boxes.data.cpu().numpy()
+            if len(data):
+                data[:, [0, 2]] += dx
+                data[:, [1, 3]] += dy
+                parts.append(data)
+                from_full.append(np.full(len(data), include_full and start + k == len(tiles)))
+
+    data = np.concatenate(parts) if parts else np.zeros((0, 6), dtype=np.float32)
+    if len(data):
+        data = data[nms(data[:, :4], data[:, 4], data[:, 5], merge_iou, full=np.concatenate(from_full))]
+    # 延迟导入：服务启动时不在主线程加载 torch / ultralytics
+    import torch
+    from ultralytics.engine.results import Results
+
+    return Results(orig_img=img, path='', names=model.names, boxes=torch.from_numpy(data))
@@ -1,22 +1,76 @@
-from ultralytics import YOLO
+"""
+训练启动脚本
+
+- 训练图片按 imgsz 缩小后缓存到内存映射文件（见 train_cache.py），300 个 epoch 只解码一次
+- DataLoader 工作进程数默认等于可用核心数
+- --resume 从 runs/detect/<name>/weights/last.pt 继续训练；--patience 个 epoch 验证集无提升时提前停止
+- 每个 epoch 打印耗时和等待数据的时间，并写入 runs/detect/<name>/loader_stats.jsonl
+
+用法:
+  python train.py
+  python train.py --epochs 300 --batch 32 --patience 50 --resume
+  python train.py --no-cache --workers 4
+  python train.py --data ./data/dedup/data.yaml   # 去除近重复图片后的数据集（见 dedup.py）
+"""
+import argparse
 import os
 
+from ultralytics import YOLO
+
+from train_cache import DEFAULT_CACHE_DIR, CachedDetectionTrainer, add_timing_callbacks, available_cores
+
 """
 import zipfile
 with zipfile.ZipFile(f"./road_defect_detection_UNI.v14-yolo.yolov8.zip","r") as zip_ref:
     zip_ref.extractall("data")
 """
 
-# Load the model.
-model = YOLO(f'./yolov8n.pt')
 
-# Training.
-results = model.train(
-   data=os.path.abspath(f"./data/data.yaml"),
-   imgsz=416,
-   epochs=300,
-   batch=32,
-   name='yolov8n_v8_300e'
-)
+def main():
+    parser = argparse.ArgumentParser(description="训练 YOLOv8 道路缺陷检测模型")
+    parser.add_argument('--weights', default='./yolov8n.pt', help='初始权重')
+    parser.add_argument('--data', default='./data/data.yaml')
+    parser.add_argument('--imgsz', type=int, default=416)
+    parser.add_argument('--epochs', type=int, default=300)
+    parser.add_argument('--batch', type=int, default=32)
+    parser.add_argument('--name', default='yolov8n_v8_300e')
+    parser.add_argument('--workers', type=int, default=None, help='DataLoader 工作进程数（默认=可用核心数）')
+    parser.add_argument('--patience', type=int, default=100, help='验证集指标连续多少个 epoch 无提升时停止（默认同 ultralytics）')
+    parser.add_argument('--resume', action='store_true', help='从 runs/detect/<name>/weights/last.pt 继续训练')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='缩小后训练图片的缓存目录')
+    parser.add_argument('--no-cache', action='store_true', help='每个 epoch 重新解码图片（ultralytics 默认行为）')
+    parser.add_argument('--device', default=None, help='例如 cpu、0、0,1')
+    args = parser.parse_args()
+
+    CachedDetectionTrainer.cache_dir = None if args.no_cache else args.cache_dir
+    last = os.path.join('runs', 'detect', args.name, 'weights', 'last.pt')
+
+    if args.resume:
+        if not os.path.exists(last):
+            raise SystemExit(f"找不到 {last}，无法继续训练")
+        # 继续训练时沿用 last.pt 中保存的训练参数
+        model = YOLO(last)
+        add_timing_callbacks(model)
+        model.train(resume=True, trainer=CachedDetectionTrainer)
+    else:
+        # Load the model.
+        model = YOLO(args.weights)
+        add_timing_callbacks(model)
+        # Training.
+        model.train(
+            data=os.path.abspath(args.data),
+            imgsz=args.imgsz,
+            epochs=args.epochs,
+            batch=args.batch,
+            name=args.name,
+            workers=args.workers or available_cores(),
+            patience=args.patience,
+            device=args.device,
+            trainer=CachedDetectionTrainer,
+        )
+
+    val_result = model.val()
+
 
-val_result = model.val()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""
+训练数据缓存与数据加载统计（train.py 使用）
+
+- ImageStore：把数据集图片按训练尺寸缩小（长边 = imgsz，与 ultralytics rect 模式相同）后
+  顺序写入一个 uint8 文件，用 np.memmap 读取。按 (图片列表 + 文件大小/修改时间 + imgsz) 生成键，
+  数据集或 imgsz 不变时直接复用，300 个 epoch 只解码一次 JPEG；
+  DataLoader 工作进程 fork 后共享同一份页缓存
+- CachedDetectionTrainer：数据集从 ImageStore 读取图片，其余训练流程与 ultralytics 相同
+- add_timing_callbacks：记录每个 epoch 的耗时和等待 DataLoader 的时间（数据加载停顿）
+"""
+import hashlib
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from ultralytics.data import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer
+
+from ingest import decode_file
+
+DEFAULT_CACHE_DIR = os.environ.get('TRAIN_CACHE_DIR', './data/.train_cache')
+
+
+def available_cores():
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _load_resized(path, imgsz):
+    """解码并把长边缩放到 imgsz，返回 (BGR 图像, 原图 (高, 宽))"""
+    decoded = decode_file(path, imgsz)
+    if decoded is None:
+        raise RuntimeError(f"无法解码训练图片: {path}")
+    w0, h0 = decoded.original_size
+    im = decoded.image
+    r = imgsz / max(h0, w0)
+    # 与 ultralytics BaseDataset.load_image 相同的目标尺寸和插值
+    size = (min(math.ceil(w0 * r), imgsz), min(math.ceil(h0 * r), imgsz)) if r != 1 else (w0, h0)
+    if (im.shape[1], im.shape[0]) != size:
+        im = cv2.resize(im, size, interpolation=cv2.INTER_LINEAR)
+    return np.ascontiguousarray(im), (h0, w0)
+
+
+class ImageStore:
+    """按 imgsz 缩小后的图片，存放在一个内存映射文件中"""
+
+    def __init__(self, data_path, index):
+        self.data_path = data_path
+        self.index = index
+        self._mm = np.memmap(data_path, dtype=np.uint8, mode='r') if index['offsets'] else None
+        self._pos = {f: i for i, f in enumerate(index['files'])}
+
+    def __getstate__(self):
+        # spawn 方式启动的 DataLoader 工作进程重新映射文件，不把整个缓存序列化过去
+        return self.data_path, self.index
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    @staticmethod
+    def cache_key(files, imgsz):
+        h = hashlib.sha256(f"{imgsz}\0".encode())
+        for f in files:
+            st = os.stat(f)
+            h.update(f"{os.path.abspath(f)}\0{st.st_size}\0{int(st.st_mtime)}\0".encode())
+        return f"{h.hexdigest()[:16]}_{imgsz}"
+
+    @classmethod
+    def open_or_build(cls, files, imgsz, cache_dir=DEFAULT_CACHE_DIR, workers=None):
+        """缓存存在时直接打开，否则并行解码构建（写完索引才算完成，中断后重新构建）"""
+        os.makedirs(cache_dir, exist_ok=True)
+        stem = os.path.join(cache_dir, cls.cache_key(files, imgsz))
+        if os.path.exists(stem + '.json'):
+            with open(stem + '.json') as f:
+                return cls(stem + '.u8', json.load(f))
+
+        t0 = time.perf_counter()
+        index = {'imgsz': imgsz, 'files': [], 'offsets': [], 'shapes': [], 'orig_shapes': []}
+        offset = 0
+        # cv2 / PIL 解码时释放 GIL，线程池即可并行；按块提交，限制内存中的图片数
+        with ThreadPoolExecutor(workers or available_cores()) as pool, open(stem + '.u8.tmp', 'wb') as out:
+            for start in range(0, len(files), 256):
+                chunk = files[start:start + 256]
+                for path, (im, hw0) in zip(chunk, pool.map(lambda p: _load_resized(p, imgsz), chunk)):
+                    out.write(im.data)
+                    index['files'].append(path)
+                    index['offsets'].append(offset)
+                    index['shapes'].append(im.shape[:2])
+                    index['orig_shapes'].append(hw0)
+                    offset += im.nbytes
+        os.replace(stem + '.u8.tmp', stem + '.u8')
+        with open(stem + '.json.tmp', 'w') as f:
+            json.dump(index, f)
+        os.replace(stem + '.json.tmp', stem + '.json')
+        print(f"训练缓存: {len(files)} 张图片 imgsz={imgsz}，{offset / 2**30:.2f} GB，"
+              f"耗时 {time.perf_counter() - t0:.1f}s → {stem}.u8")
+        return cls(stem + '.u8', index)
+
+    def get(self, path):
+        """返回 (缩小后图像副本, 原图 (高, 宽))；不在缓存中时返回 None"""
+        i = self._pos.get(path)
+        if i is None:
+            return None
+        h, w = self.index['shapes'][i]
+        off = self.index['offsets'][i]
+        # 复制一份：数据增强会就地修改图像，而 memmap 是只读的
+        im = np.array(self._mm[off:off + h * w * 3]).reshape(h, w, 3)
+        return im, tuple(self.index['orig_shapes'][i])
+
+
+class CachedYOLODataset(YOLODataset):
+    """load_image 从 ImageStore 读取，其余逻辑（缩放、mosaic 缓冲）与 BaseDataset.load_image 一致"""
+
+    image_store = None
+
+    def load_image(self, i, rect_mode=True):
+        if self.ims[i] is not None:
+            return self.ims[i], self.im_hw0[i], self.im_hw[i]
+        hit = self.image_store.get(self.im_files[i]) if self.image_store is not None else None
+        if hit is None:
+            return super().load_image(i, rect_mode)
+        im, (h0, w0) = hit
+        if not rect_mode and not (h0 == w0 == self.imgsz):
+            im = cv2.resize(im, (self.imgsz, self.imgsz), interpolation=cv2.INTER_LINEAR)
+
+        if self.augment:
+            self.ims[i], self.im_hw0[i], self.im_hw[i] = im, (h0, w0), im.shape[:2]
+            self.buffer.append(i)
+            if 1 < len(self.buffer) >= self.max_buffer_length:
+                j = self.buffer.pop(0)
+                if self.cache != 'ram':
+                    self.ims[j], self.im_hw0[j], self.im_hw[j] = None, None, None
+        return im, (h0, w0), im.shape[:2]
+
+
+class CachedDetectionTrainer(DetectionTrainer):
+    """数据集图片从 ImageStore 读取的检测训练器（cache_dir 为 None 时与 DetectionTrainer 相同）"""
+
+    cache_dir = DEFAULT_CACHE_DIR
+
+    def build_dataset(self, img_path, mode='train', batch=None):
+        dataset = super().build_dataset(img_path, mode, batch)
+        if self.cache_dir and type(dataset) is YOLODataset and dataset.cache != 'ram':
+            # 构造仍由 ultralytics 完成（参数随版本变化），之后只替换读图这一步
+            dataset.__class__ = CachedYOLODataset
+            dataset.image_store = ImageStore.open_or_build(dataset.im_files, dataset.imgsz, self.cache_dir)
+        return dataset
+
+
+def add_timing_callbacks(model, log_name='loader_stats.jsonl'):
+    """
+    每个 epoch 记录总耗时和等待 DataLoader 的时间（上一个 batch 结束到下一个 batch 开始），
+    打印并追加到 <训练目录>/loader_stats.jsonl
+    """
+    state = {}
+
+    def on_epoch_start(trainer):
+        now = time.perf_counter()
+        state.update(start=now, last=now, wait=0.0, batches=0)
+
+    def on_batch_start(trainer):
+        state['wait'] += time.perf_counter() - state['last']
+        state['batches'] += 1
+
+    def on_batch_end(trainer):
+        state['last'] = time.perf_counter()
+
+    def on_epoch_end(trainer):
+        epoch_s = time.perf_counter() - state['start']
+        record = {
+            'epoch': trainer.epoch + 1,
+            'epoch_s': round(epoch_s, 2),
+            'data_wait_s': round(state['wait'], 2),
+            'data_wait_pct': round(state['wait'] / epoch_s * 100, 1) if epoch_s else 0.0,
+            'batches': state['batches'],
+        }
+        print(f"epoch {record['epoch']}: {record['epoch_s']}s，等待数据 {record['data_wait_s']}s "
+              f"({record['data_wait_pct']}%)")
+        with open(os.path.join(trainer.save_dir, log_name), 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    model.add_callback('on_train_epoch_start', on_epoch_start)
+    model.add_callback('on_train_batch_start', on_batch_start)
+    model.add_callback('on_train_batch_end', on_batch_end)
+    model.add_callback('on_train_epoch_end', on_epoch_end)
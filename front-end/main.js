@@ -323,7 +323,12 @@ document.addEventListener('DOMContentLoaded', function() {
     async function handleFileUpload(files, gpsInfo = {}) {
         console.log('🚀 handleFileUpload 被调用，文件数量:', files.length);
 
-        // 只处理第一张图片
+        // 多张图片一次上传到批量接口，结果逐张流式返回
+        if (files.length > 1) {
+            await handleBatchUpload(files);
+            return;
+        }
+
         const file = files[0];
         if (!file) return;
 
@@ -375,6 +380,87 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // ---------- 多张图片：/detect/batch 返回 NDJSON，每张图片一行，收到即显示 ----------
+    async function handleBatchUpload(files) {
+        const formData = new FormData();
+        for (const file of files) {
+            formData.append('file', file);
+        }
+
+        const gallery = document.createElement('div');
+        gallery.id = 'batch-results';
+        document.getElementById('batch-results')?.remove();
+        document.body.appendChild(gallery);
+
+        try {
+            const response = await fetch('http://localhost:5001/detect/batch?images=1&output=jpeg', {
+                method: 'POST',
+                body: formData,
+                mode: 'cors',
+                credentials: 'omit'
+            });
+            if (!response.ok) {
+                const error = await response.json();
+                alert('检测失败：' + error.error);
+                return;
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let summary = null;
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+                for (const line of lines) {
+                    if (!line.trim()) continue;
+                    const record = JSON.parse(line);
+                    if (record.summary) {
+                        summary = record.summary;
+                    } else {
+                        addBatchResult(gallery, record);
+                    }
+                }
+            }
+
+            if (summary) {
+                alert(`✅ 检测完成！${summary.images} 张，失败 ${summary.failed} 张，${summary.images_per_s} 张/秒`);
+            }
+        } catch (err) {
+            console.error('❌ 批量检测失败:', err);
+            alert('网络错误，无法连接到检测服务，请确保后端已启动（http://127.0.0.1:5001）');
+        }
+    }
+
+    function addBatchResult(gallery, record) {
+        const item = document.createElement('figure');
+        item.style.margin = '10px 0';
+        const caption = document.createElement('figcaption');
+        if (record.code !== 200) {
+            caption.textContent = `${record.file}: ${record.error}`;
+            item.appendChild(caption);
+            gallery.appendChild(item);
+            return;
+        }
+        const img = document.createElement('img');
+        img.src = `data:${record.mimetype};base64,${record.image}`;
+        img.style.maxWidth = '100%';
+        caption.textContent = `${record.file}: ${record.detections.length} 处缺陷`;
+        item.appendChild(img);
+        item.appendChild(caption);
+        gallery.appendChild(item);
+        if (record.gps) {
+            const mapLink = document.createElement('a');
+            mapLink.href = `https://www.google.com/maps?q=${record.gps[0]},${record.gps[1]}`;
+            mapLink.target = '_blank';
+            mapLink.textContent = ' 📍';
+            caption.appendChild(mapLink);
+        }
+    }
+
     // 辅助函数：如果存在 GPS 信息，在指定容器中添加谷歌地图链接
     function addMapLinkIfNeeded(gpsInfo, container) {
         if (gpsInfo.latitude && gpsInfo.longitude) {